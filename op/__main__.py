@@ -0,0 +1,10 @@
+"""Запуск без графического интерфейса: python -m op <команда> (см. cli.py)"""
+import os
+import sys
+
+# Модули приложения лежат рядом с этим файлом, как и при запуске python main.py
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cli import main
+
+sys.exit(main())
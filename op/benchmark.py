@@ -0,0 +1,362 @@
+"""Нагрузочные замеры слоя данных на синтетической базе крупного салона (см. python -m op benchmark)"""
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from database import ComputerStoreDB, BackupStore
+
+# Размеры синтетической базы по умолчанию
+DEFAULT_PRODUCTS = 100_000
+DEFAULT_SUPPLIERS = 5_000
+DEFAULT_INVOICE_ITEMS = 1_000_000
+DEFAULT_DAYS = 730
+# Сколько строк записывается одним заданием при генерации
+GENERATE_BATCH = 50_000
+# Доля позиций прихода среди всех позиций накладных и средний размер накладных
+INCOME_SHARE = 0.4
+INCOME_LINES = 10
+OUTCOME_LINES = 3
+# Изменение медианы, которое считается регрессией: больше доли порога и больше абсолютного шума
+REGRESSION_THRESHOLD = 0.25
+NOISE_FLOOR_MS = 1.0
+
+MANUFACTURERS = ['ASUS', 'Acer', 'Lenovo', 'HP', 'Dell', 'MSI', 'Gigabyte', 'Samsung', 'Kingston', 'Logitech',
+                 'AMD', 'Intel', 'NVIDIA', 'Seagate', 'WD', 'Corsair', 'Crucial', 'Philips', 'BenQ', 'Microsoft']
+PRODUCT_TYPES = {
+    'Компьютеры': ['Системный блок', 'Моноблок', 'Неттоп', 'Рабочая станция'],
+    'Ноутбуки': ['Ноутбук', 'Ультрабук', 'Игровой ноутбук', 'Трансформер'],
+    'Комплектующие': ['Процессор', 'Видеокарта', 'Материнская плата', 'Память DDR5', 'SSD', 'Жесткий диск', 'Блок питания'],
+    'Периферия': ['Монитор', 'Клавиатура', 'Мышь', 'Гарнитура', 'Веб-камера', 'Принтер'],
+    'Программное обеспечение': ['Операционная система', 'Офисный пакет', 'Антивирус', 'Графический редактор'],
+}
+PRICE_RANGES = {
+    'Компьютеры': (30_000, 250_000),
+    'Ноутбуки': (35_000, 300_000),
+    'Комплектующие': (1_500, 150_000),
+    'Периферия': (500, 80_000),
+    'Программное обеспечение': (1_000, 40_000),
+}
+
+def generate_dataset(db_path, products=DEFAULT_PRODUCTS, suppliers=DEFAULT_SUPPLIERS,
+                     invoice_items=DEFAULT_INVOICE_ITEMS, days=DEFAULT_DAYS, seed=1, progress=None):
+    """Заполнить новую базу синтетическими данными; progress(этап, сделано, всего) вызывается после каждого пакета
+
+    Данные пишутся теми же таблицами и триггерами, что и в работе, поэтому журнал движения,
+    дневные обороты, счетчики и сводки по поставщикам получаются такими же, как при проведении накладных.
+    """
+    rng = random.Random(seed)
+    db = ComputerStoreDB(db_path)
+    try:
+        start = date.today() - timedelta(days=days)
+        categories = {name: category_id for category_id, name in db.reference.categories().items()}
+
+        def report(stage, done, total):
+            if progress:
+                progress(stage, done, total)
+
+        def insert_batches(stage, total, make_row, sql):
+            for offset in range(0, total, GENERATE_BATCH):
+                rows = [make_row(n) for n in range(offset, min(offset + GENERATE_BATCH, total))]
+                db.write(lambda cursor: cursor.executemany(sql, rows))
+                report(stage, offset + len(rows), total)
+
+        def last_id(table):
+            # Генератор - единственный писатель новой базы, поэтому пакет получает сплошной диапазон id
+            return db.connection().execute(f"SELECT MAX(id) FROM {table}").fetchone()[0]
+
+        category_names = list(PRODUCT_TYPES)
+
+        def product_row(n):
+            category = rng.choice(category_names)
+            manufacturer = rng.choice(MANUFACTURERS)
+            low, high = PRICE_RANGES[category]
+            # Цены распределены неравномерно: дешевых позиций больше
+            price = round(low + (high - low) * rng.random() ** 2, -1)
+            name = f"{rng.choice(PRODUCT_TYPES[category])} {manufacturer} {rng.choice('ABCDEFGHKMPRSTVXZ')}{n:06d}"
+            return (f"SKU-{n:07d}", name, categories[category], manufacturer, price,
+                    rng.randint(0, 5), f"{name}, гарантия {rng.choice((12, 24, 36))} мес.")
+
+        insert_batches('products', products, product_row, '''
+            INSERT INTO products (sku, name, category_id, manufacturer, price, min_quantity, description)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''')
+        first_product = last_id('products') - products + 1
+
+        insert_batches('suppliers', suppliers, lambda n: (
+            f"ООО «Поставщик {n + 1}»", f"Менеджер {n + 1}", f"+7 900 {n:07d}", f"sales{n + 1}@supplier.example"
+        ), "INSERT INTO suppliers (name, contact_person, phone, email) VALUES (?, ?, ?, ?)")
+        first_supplier = last_id('suppliers') - suppliers + 1
+
+        # Начальные остатки - на дату начала истории, чтобы продажи не уводили остаток в минус
+        db.write(lambda cursor: cursor.execute('''
+            INSERT INTO stock_movements (product_id, movement_date, quantity, source)
+            SELECT id, ?, 20 + id % 80, 'opening' FROM products WHERE id >= ?
+        ''', (start.isoformat(), first_product)))
+
+        def random_date():
+            return (start + timedelta(days=rng.randrange(days))).isoformat()
+
+        income_items = int(invoice_items * INCOME_SHARE)
+        outcome_items = invoice_items - income_items
+        for kind, items, lines, make_header in (
+            ('income', income_items, INCOME_LINES, lambda n: (
+                f"BENCH-IN-{n:07d}", first_supplier + rng.randrange(suppliers), random_date()
+            )),
+            ('outcome', outcome_items, OUTCOME_LINES, lambda n: (
+                f"BENCH-OUT-{n:07d}", f"Покупатель {rng.randrange(50_000)}", random_date()
+            )),
+        ):
+            invoices = max(1, items // lines)
+            party = 'supplier_id' if kind == 'income' else 'customer_name'
+            insert_batches(f'{kind}_invoices', invoices, make_header, f'''
+                INSERT INTO {kind}_invoices (invoice_number, {party}, invoice_date, total_amount)
+                VALUES (?, ?, ?, 0)
+            ''')
+            first_invoice = last_id(f'{kind}_invoices') - invoices + 1
+
+            # Приход - крупными партиями по закупочной цене, расход - штучно по розничной
+            quantity_range = (5, 50) if kind == 'income' else (1, 3)
+            price_factor = 0.8 if kind == 'income' else 1.0
+            product_prices = dict(db.connection().execute("SELECT id, price FROM products WHERE id >= ?", (first_product,)))
+            product_ids = list(product_prices)
+
+            def item_row(n):
+                product_id = rng.choice(product_ids)
+                return (first_invoice + n * invoices // items, product_id, rng.randint(*quantity_range),
+                        round(product_prices[product_id] * price_factor, 2))
+
+            insert_batches(f'{kind}_items', items, item_row, f'''
+                INSERT INTO {kind}_items (invoice_id, product_id, quantity, price) VALUES (?, ?, ?, ?)
+            ''')
+            report(f'{kind}_totals', 0, 1)
+            db.write(lambda cursor: cursor.execute(f'''
+                UPDATE {kind}_invoices
+                SET total_amount = t.amount
+                FROM (SELECT invoice_id, SUM(quantity * price) AS amount FROM {kind}_items GROUP BY invoice_id) t
+                WHERE t.invoice_id = {kind}_invoices.id AND {kind}_invoices.id >= ?
+            ''', (first_invoice,)))
+            report(f'{kind}_totals', 1, 1)
+
+        # Текущий остаток = сумма журнала движения, как после проведения накладных
+        report('stock', 0, 1)
+        db.write(lambda cursor: cursor.execute('''
+            UPDATE products
+            SET quantity = m.quantity
+            FROM (SELECT product_id, SUM(quantity) AS quantity FROM stock_movements GROUP BY product_id) m
+            WHERE m.product_id = products.id AND products.id >= ?
+        ''', (first_product,)))
+        db.refresh_stock_snapshots()
+        db.write(lambda cursor: cursor.execute("ANALYZE"))
+        report('stock', 1, 1)
+    finally:
+        db.close()
+
+def percentile(values, p):
+    """Процентиль по ближайшему рангу"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def exhaust(cursor):
+    """Прочитать курсор до конца, не накапливая строки; число строк"""
+    count = 0
+    while True:
+        rows = cursor.fetchmany(1000)
+        if not rows:
+            return count
+        count += len(rows)
+
+class BenchmarkContext:
+    """Данные для замеров: середина истории, товары для накладных, временный каталог копий"""
+
+    def __init__(self, db, work_dir):
+        self.db = db
+        self.work_dir = Path(work_dir)
+        self.rng = random.Random(2)
+        conn = db.connection()
+        first_day, last_day = conn.execute("SELECT MIN(movement_date), MAX(movement_date) FROM stock_movements").fetchone()
+        first_day = date.fromisoformat(first_day[:10]) if first_day else date.today()
+        last_day = date.fromisoformat(last_day[:10]) if last_day else date.today()
+        self.middle_day = (first_day + (last_day - first_day) / 2).isoformat()
+        self.year_ago = max(first_day, last_day - timedelta(days=365)).isoformat()
+        self.product_ids = [row[0] for row in conn.execute(
+            "SELECT id FROM products WHERE quantity > 10 ORDER BY random() LIMIT 1000"
+        )]
+        self.search_words = [row[0].split()[0] for row in conn.execute("SELECT name FROM products LIMIT 20")] or ["товар"]
+        self.invoice_number = 0
+
+    def invoice_lines(self, count=20):
+        products = self.rng.sample(self.product_ids, min(count, len(self.product_ids)))
+        return [(product_id, 1, 100.0) for product_id in products]
+
+    def next_invoice_number(self, prefix):
+        self.invoice_number += 1
+        return f"{prefix}-{os.getpid()}-{time.time_ns()}-{self.invoice_number}"
+
+def bench_dashboard(ctx):
+    ctx.db.dashboard_stats()
+
+def bench_products_page(ctx):
+    ctx.db.products_page(limit=50)
+
+def bench_products_deep_page(ctx):
+    ctx.db.products_page(after=("Ноутбук", 0), limit=50)
+
+def bench_products_search(ctx):
+    ctx.db.products_page(limit=50, filters={'query': ctx.rng.choice(ctx.search_words)})
+
+def bench_products_low_stock(ctx):
+    ctx.db.products_page(limit=50, filters={'low_stock': True})
+
+def bench_report_stock(ctx):
+    exhaust(ctx.db.stock_report_cursor())
+
+def bench_report_stock_as_of(ctx):
+    exhaust(ctx.db.stock_report_cursor(as_of=ctx.middle_day))
+
+def bench_report_sales(ctx):
+    # Те же запросы, что строит раздел отчета по продажам: сводка, динамика, топы и первая страница накладных
+    ctx.db.sales_summary()
+    exhaust(ctx.db.sales_by_period_cursor('month'))
+    exhaust(ctx.db.top_products_cursor(10))
+    exhaust(ctx.db.top_categories_cursor(10))
+    exhaust(ctx.db.sales_report_cursor(limit=50))
+
+def bench_report_turnover(ctx):
+    exhaust(ctx.db.turnover_report_cursor(ctx.year_ago, period='month', group_by='category'))
+
+def bench_report_suppliers(ctx):
+    exhaust(ctx.db.suppliers_report_cursor(with_id=True))
+    ctx.db.supplier_trends(ctx.year_ago[:7])
+
+def bench_post_income(ctx):
+    ctx.db.post_income_invoice(ctx.next_invoice_number("BENCH-PIN"), None, date.today().isoformat(), ctx.invoice_lines())
+
+def bench_post_outcome(ctx):
+    ctx.db.post_outcome_invoice(ctx.next_invoice_number("BENCH-POUT"), "Покупатель", date.today().isoformat(), ctx.invoice_lines())
+
+def bench_backup_full(ctx):
+    target = ctx.work_dir / "full_backup.db"
+    ctx.db.backup_to(target)
+    target.unlink()
+
+def bench_backup_incremental(ctx):
+    BackupStore(ctx.db, ctx.work_dir / "backups").create()
+
+# Замеры: имя -> (функция, не больше стольких повторов)
+BENCHMARKS = {
+    'dashboard': (bench_dashboard, None),
+    'products_page': (bench_products_page, None),
+    'products_deep_page': (bench_products_deep_page, None),
+    'products_search': (bench_products_search, None),
+    'products_low_stock': (bench_products_low_stock, None),
+    'report_stock': (bench_report_stock, 5),
+    'report_stock_as_of': (bench_report_stock_as_of, 5),
+    'report_sales': (bench_report_sales, 5),
+    'report_turnover': (bench_report_turnover, 5),
+    'report_suppliers': (bench_report_suppliers, 5),
+    'post_income_invoice': (bench_post_income, None),
+    'post_outcome_invoice': (bench_post_outcome, None),
+    'backup_full': (bench_backup_full, 3),
+    'backup_incremental': (bench_backup_incremental, 3),
+}
+
+def run_benchmarks(db_path, repeats=20, names=None, progress=None):
+    """Замерить каждый путь данных: первый запуск на новых соединениях (холодный) и repeats повторов (теплые)
+
+    Холодный запуск начинается с пустого кэша страниц SQLite и подготовленных выражений;
+    кэш файловой системы ОС при этом не сбрасывается. Замеры идут на рабочей копии базы,
+    чтобы проведенные накладные не меняли исходную базу между запусками.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="ais_bench_") as work_dir:
+        work_path = os.path.join(work_dir, "work.db")
+        source = ComputerStoreDB(db_path)
+        try:
+            source.backup_to(work_path)
+        finally:
+            source.close()
+        for name in names or BENCHMARKS:
+            run, max_repeats = BENCHMARKS[name]
+            db = ComputerStoreDB(work_path)
+            try:
+                ctx = BenchmarkContext(db, work_dir)
+                started = time.perf_counter()
+                run(ctx)
+                cold = (time.perf_counter() - started) * 1000
+                warm = []
+                for _ in range(max(1, min(repeats, max_repeats or repeats))):
+                    started = time.perf_counter()
+                    run(ctx)
+                    warm.append((time.perf_counter() - started) * 1000)
+            finally:
+                db.close()
+            results[name] = {
+                'cold_ms': round(cold, 3),
+                'p50_ms': round(percentile(warm, 50), 3),
+                'p90_ms': round(percentile(warm, 90), 3),
+                'p99_ms': round(percentile(warm, 99), 3),
+                'mean_ms': round(sum(warm) / len(warm), 3),
+                'runs': len(warm),
+            }
+            if progress:
+                progress(name, results[name])
+    return results
+
+def dataset_summary(db_path):
+    """Размеры базы до замеров (замеры проведения накладных ее дополняют)"""
+    conn = sqlite3.connect(db_path)
+    try:
+        summary = {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ('products', 'suppliers', 'income_items', 'outcome_items')
+        }
+    finally:
+        conn.close()
+    summary['file_mb'] = round(os.path.getsize(db_path) / 2 ** 20, 1)
+    return summary
+
+def benchmark_report(dataset, results):
+    """Результаты вместе с описанием базы и окружения - в таком виде сохраняется эталон"""
+    return {
+        'created': date.today().isoformat(),
+        'dataset': dataset,
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+
+def save_baseline(path, report):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def compare_with_baseline(report, baseline, threshold=REGRESSION_THRESHOLD):
+    """Сравнить медианы с эталоном: [(замер, эталон мс, сейчас мс, изменение)], регрессии - с пометкой"""
+    rows = []
+    for name, result in report['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        before, now = base['p50_ms'], result['p50_ms']
+        change = (now - before) / before if before else 0.0
+        regression = change > threshold and now - before > NOISE_FLOOR_MS
+        rows.append((name, before, now, change, regression))
+    return rows
+
+def same_dataset(report, baseline):
+    """Замеры сравнимы, только если эталон снят на базе тех же размеров"""
+    tables = ('products', 'suppliers', 'income_items', 'outcome_items')
+    return all(report['dataset'].get(t) == baseline.get('dataset', {}).get(t) for t in tables)
@@ -0,0 +1,197 @@
+import argparse
+import os
+import sys
+import tempfile
+from datetime import date
+
+from database import (
+    DB_PATH, MIGRATIONS, REPORTS, REPORT_PERIODS, TURNOVER_GROUPS,
+    ComputerStoreDB, BackupStore, ProductImporter,
+)
+from benchmark import (
+    BENCHMARKS, DEFAULT_PRODUCTS, DEFAULT_SUPPLIERS, DEFAULT_INVOICE_ITEMS, REGRESSION_THRESHOLD,
+    generate_dataset, run_benchmarks, dataset_summary, benchmark_report,
+    save_baseline, load_baseline, compare_with_baseline, same_dataset,
+)
+
+def build_parser():
+    """Разбор командной строки: общий параметр --db и подкоманды"""
+    parser = argparse.ArgumentParser(
+        prog="python -m op",
+        description="АИС Компьютерный салон: отчеты, импорт, резервное копирование и обслуживание без интерфейса"
+    )
+    parser.add_argument("--db", default=DB_PATH, help="файл базы данных (по умолчанию %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    report = commands.add_parser("report", help="выгрузить отчет в CSV или JSON")
+    report.add_argument("name", choices=list(REPORTS), help="отчет")
+    report.add_argument("--format", choices=("csv", "json"), default="csv", help="формат файла")
+    report.add_argument("-o", "--output", help="файл результата (по умолчанию <отчет>_<дата>.<формат>)")
+    report.add_argument("--as-of", help="stock: остатки на дату ГГГГ-ММ-ДД")
+    report.add_argument("--start", help="turnover: начало периода (по умолчанию начало месяца)")
+    report.add_argument("--end", help="turnover: конец периода (по умолчанию сегодня)")
+    report.add_argument("--period", choices=list(REPORT_PERIODS), default="month", help="turnover: детализация")
+    report.add_argument("--group-by", choices=list(TURNOVER_GROUPS), default="total", help="turnover: группировка")
+    
+    backup = commands.add_parser("backup", help="инкрементная резервная копия")
+    backup.add_argument("--dir", default="backups", help="каталог резервных копий (по умолчанию %(default)s)")
+    backup.add_argument("--file", help="снять полную копию базы в этот файл вместо инкрементной")
+    
+    import_parser = commands.add_parser("import", help="импорт каталога товаров из CSV/XLSX")
+    import_parser.add_argument("path", help="файл каталога")
+    
+    commands.add_parser("vacuum", help="обновить статистику планировщика и сжать файл базы")
+    commands.add_parser("check", help="проверить целостность базы и сходимость оборотной ведомости")
+    commands.add_parser("rebuild-stats", help="пересчитать счетчики и сводки")
+    
+    bench = commands.add_parser("benchmark", help="замеры скорости на синтетической базе (--db не используется)")
+    bench.add_argument("--products", type=int, default=DEFAULT_PRODUCTS, help="товаров (по умолчанию %(default)s)")
+    bench.add_argument("--suppliers", type=int, default=DEFAULT_SUPPLIERS, help="поставщиков (по умолчанию %(default)s)")
+    bench.add_argument("--items", type=int, default=DEFAULT_INVOICE_ITEMS, help="позиций накладных (по умолчанию %(default)s)")
+    bench.add_argument("--seed", type=int, default=1, help="зерно генератора данных")
+    bench.add_argument("--repeats", type=int, default=20, help="теплых повторов каждого замера")
+    bench.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="выполнить только эти замеры")
+    bench.add_argument("--dataset", help="файл синтетической базы: используется, если есть, иначе создается и сохраняется")
+    bench.add_argument("-o", "--output", help="сохранить результаты в JSON")
+    bench.add_argument("--baseline", help="сравнить с эталоном (JSON); код 1 при регрессии")
+    bench.add_argument("--save-baseline", help="сохранить результаты как эталон")
+    bench.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                       help="допустимый рост медианы относительно эталона (по умолчанию %(default)s)")
+    return parser
+
+def report_params(args):
+    """Параметры запроса отчета из аргументов командной строки"""
+    if args.name == 'stock':
+        return {'as_of': args.as_of}
+    if args.name == 'turnover':
+        return {
+            'start': args.start or date.today().replace(day=1).isoformat(),
+            'end': args.end,
+            'period': args.period,
+            'group_by': args.group_by,
+        }
+    return {}
+
+def run_report(db, args):
+    output = args.output or f"{args.name}_{date.today().isoformat()}.{args.format}"
+    count = db.export_report(args.name, output, args.format, **report_params(args))
+    print(f"{REPORTS[args.name]['title']}: {output} (строк: {count})")
+
+def run_backup(db, args):
+    if args.file:
+        db.backup_to(args.file)
+        print(f"Резервная копия создана: {args.file}")
+        return
+    manifest = BackupStore(db, args.dir).create()
+    print(
+        f"Резервная копия создана: {manifest['id']} "
+        f"(новых блоков: {manifest['new_chunks']} из {len(manifest['chunks'])}, "
+        f"записано {manifest['stored_bytes'] // 1024} КиБ, удалено старых копий: {manifest['pruned']})"
+    )
+
+def run_import(db, args):
+    result = ProductImporter(db).run(args.path)
+    print(f"Добавлено: {result['inserted']}, обновлено: {result['updated']}, отклонено: {result['rejected']}")
+    if result['rejected_file']:
+        print(f"Отклоненные строки: {result['rejected_file']}")
+    return 1 if result['rejected'] else 0
+
+def run_check_turnover(args, version):
+    """Остатки на конец оборотной ведомости с начала года должны совпасть с остатками по журналу"""
+    # Проверка ничего не меняет в базе: миграции не применяются, поэтому сверка нужна текущая схема
+    if version < len(MIGRATIONS):
+        print(f"Сверка оборотной ведомости пропущена: схема версии {version}, программе нужна {len(MIGRATIONS)}")
+        return 0
+    db = ComputerStoreDB(args.db, read_only=True)
+    try:
+        mismatches = db.check_turnover(date.today().replace(month=1, day=1).isoformat())
+    finally:
+        db.close()
+    if not mismatches:
+        print("Оборотная ведомость сходится с остатками")
+        return 0
+    for name, closing, expected in mismatches:
+        print(f"Расхождение ведомости: {name}: {closing} вместо {expected}", file=sys.stderr)
+    return 1
+
+def run_vacuum(db, args):
+    db.vacuum()
+    print("Обслуживание базы завершено")
+
+def run_rebuild_stats(db, args):
+    db.rebuild_stats()
+    print("Счетчики и сводки по поставщикам пересчитаны")
+
+def print_generate_progress(stage, done, total):
+    print(f"\r  {stage}: {done}/{total}", end="\n" if done == total else "", flush=True)
+
+def print_benchmark_result(name, result):
+    print(
+        f"  {name:<22} холодный {result['cold_ms']:>10.2f}  p50 {result['p50_ms']:>10.2f}  "
+        f"p90 {result['p90_ms']:>10.2f}  p99 {result['p99_ms']:>10.2f} мс  (повторов: {result['runs']})"
+    )
+
+def run_benchmark(args):
+    with tempfile.TemporaryDirectory(prefix="ais_bench_") as tmp_dir:
+        db_path = args.dataset or os.path.join(tmp_dir, "benchmark.db")
+        if not os.path.exists(db_path):
+            print(f"Генерация базы: товаров {args.products}, поставщиков {args.suppliers}, позиций {args.items}")
+            generate_dataset(db_path, args.products, args.suppliers, args.items, seed=args.seed,
+                             progress=print_generate_progress)
+        dataset = dataset_summary(db_path)
+        print("Замеры (мс):")
+        results = run_benchmarks(db_path, args.repeats, args.only, progress=print_benchmark_result)
+        report = benchmark_report(dataset, results)
+    
+    if args.output:
+        save_baseline(args.output, report)
+        print(f"Результаты сохранены: {args.output}")
+    if args.save_baseline:
+        save_baseline(args.save_baseline, report)
+        print(f"Эталон сохранен: {args.save_baseline}")
+    if not args.baseline:
+        return 0
+    
+    baseline = load_baseline(args.baseline)
+    if not same_dataset(report, baseline):
+        print(f"Внимание: эталон снят на другой базе: {baseline.get('dataset')}")
+    regressions = 0
+    print(f"Сравнение с эталоном {args.baseline} (p50, мс):")
+    for name, before, now, change, regression in compare_with_baseline(report, baseline, args.threshold):
+        regressions += regression
+        mark = "  РЕГРЕССИЯ" if regression else ""
+        print(f"  {name:<22} {before:>10.2f} -> {now:>10.2f}  {change:+7.1%}{mark}")
+    if regressions:
+        print(f"Регрессий: {regressions}", file=sys.stderr)
+        return 1
+    return 0
+
+COMMANDS = {
+    'report': run_report,
+    'backup': run_backup,
+    'import': run_import,
+    'vacuum': run_vacuum,
+    'rebuild-stats': run_rebuild_stats,
+}
+
+def main(argv=None):
+    """Точка входа; возвращает код завершения для cron: 0 - успех, 1 - ошибка"""
+    args = build_parser().parse_args(argv)
+    try:
+        if args.command == 'check':
+            version = ComputerStoreDB.check_database_file(args.db)
+            print(f"База в порядке (версия схемы {version})")
+            return run_check_turnover(args, version)
+        if args.command == 'benchmark':
+            return run_benchmark(args)
+        db = ComputerStoreDB(args.db)
+        try:
+            return COMMANDS[args.command](db, args) or 0
+        finally:
+            db.close()
+    except Exception as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
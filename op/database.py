@@ -0,0 +1,2093 @@
+import sqlite3
+import datetime
+from datetime import date
+import os
+import json
+import csv
+import hashlib
+import zlib
+import threading
+import time
+import queue
+import tempfile
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: блокировка файла через msvcrt
+    fcntl = None
+    import msvcrt
+
+DB_PATH = 'computer_store.db'
+
+def migrate_base_schema(cursor):
+    """v1: исходная схема, учетная запись администратора и справочник категорий"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            role TEXT NOT NULL,
+            full_name TEXT NOT NULL
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS suppliers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            contact_person TEXT,
+            phone TEXT,
+            email TEXT,
+            address TEXT
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            category_id INTEGER,
+            manufacturer TEXT,
+            price REAL NOT NULL,
+            quantity INTEGER DEFAULT 0,
+            min_quantity INTEGER DEFAULT 0,
+            description TEXT,
+            FOREIGN KEY (category_id) REFERENCES categories (id)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS income_invoices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            invoice_number TEXT UNIQUE NOT NULL,
+            supplier_id INTEGER,
+            invoice_date DATE NOT NULL,
+            total_amount REAL DEFAULT 0,
+            FOREIGN KEY (supplier_id) REFERENCES suppliers (id)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS income_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            invoice_id INTEGER,
+            product_id INTEGER,
+            quantity INTEGER NOT NULL,
+            price REAL NOT NULL,
+            FOREIGN KEY (invoice_id) REFERENCES income_invoices (id),
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS outcome_invoices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            invoice_number TEXT UNIQUE NOT NULL,
+            customer_name TEXT,
+            invoice_date DATE NOT NULL,
+            total_amount REAL DEFAULT 0
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS outcome_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            invoice_id INTEGER,
+            product_id INTEGER,
+            quantity INTEGER NOT NULL,
+            price REAL NOT NULL,
+            FOREIGN KEY (invoice_id) REFERENCES outcome_invoices (id),
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+    
+    cursor.execute('''
+        INSERT OR IGNORE INTO users (username, password, role, full_name)
+        VALUES (?, ?, ?, ?)
+    ''', ('admin', 'admin', 'admin', 'Администратор'))
+    
+    # Раньше категории добавлялись при каждом запуске и дублировались:
+    # переводим товары на первую категорию с тем же названием и удаляем дубли
+    cursor.execute('''
+        UPDATE products
+        SET category_id = (
+            SELECT MIN(c2.id) FROM categories c1
+            JOIN categories c2 ON c2.name = c1.name
+            WHERE c1.id = products.category_id
+        )
+        WHERE category_id IN (
+            SELECT id FROM categories
+            WHERE id NOT IN (SELECT MIN(id) FROM categories GROUP BY name)
+        )
+    ''')
+    cursor.execute("DELETE FROM categories WHERE id NOT IN (SELECT MIN(id) FROM categories GROUP BY name)")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_categories_name ON categories (name)")
+    
+    categories = ['Компьютеры', 'Ноутбуки', 'Комплектующие', 'Периферия', 'Программное обеспечение']
+    cursor.executemany('INSERT OR IGNORE INTO categories (name) VALUES (?)', [(c,) for c in categories])
+
+def migrate_query_indexes(cursor):
+    """v2: индексы под фильтры и сортировки главной страницы, списка товаров и отчетов"""
+    # get_stats, generate_turnover_report: WHERE invoice_date >= ?; generate_sales_report: ORDER BY invoice_date
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_income_invoices_date ON income_invoices (invoice_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_outcome_invoices_date ON outcome_invoices (invoice_date)")
+    # generate_suppliers_report: LEFT JOIN income_invoices ON supplier_id
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_income_invoices_supplier ON income_invoices (supplier_id)")
+    # products_page: ORDER BY name, id (id берется из rowid индекса)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_name ON products (name)")
+    # Позиции накладной выбираются по invoice_id, товар берется из того же индекса
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_income_items_invoice ON income_items (invoice_id, product_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_outcome_items_invoice ON outcome_items (invoice_id, product_id)")
+
+def rebuild_dashboard_stats(cursor):
+    """Пересчитать счетчики главной страницы по исходным таблицам"""
+    cursor.execute("DELETE FROM store_stats")
+    cursor.execute('''
+        INSERT INTO store_stats (id, total_products, low_stock)
+        SELECT 1, COUNT(*), COUNT(CASE WHEN quantity <= min_quantity AND min_quantity > 0 THEN 1 END)
+        FROM products
+    ''')
+    cursor.execute("DELETE FROM invoice_month_stats")
+    cursor.execute('''
+        INSERT INTO invoice_month_stats (month, income_count, outcome_count)
+        SELECT month, SUM(income_count), SUM(outcome_count)
+        FROM (
+            SELECT substr(invoice_date, 1, 7) AS month, 1 AS income_count, 0 AS outcome_count FROM income_invoices
+            UNION ALL
+            SELECT substr(invoice_date, 1, 7), 0, 1 FROM outcome_invoices
+        )
+        GROUP BY month
+    ''')
+
+def migrate_dashboard_stats(cursor):
+    """v3: счетчики главной страницы, которые поддерживаются триггерами"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS store_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_products INTEGER NOT NULL DEFAULT 0,
+            low_stock INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS invoice_month_stats (
+            month TEXT PRIMARY KEY,
+            income_count INTEGER NOT NULL DEFAULT 0,
+            outcome_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    
+    low_stock_new = "(CASE WHEN NEW.quantity <= NEW.min_quantity AND NEW.min_quantity > 0 THEN 1 ELSE 0 END)"
+    low_stock_old = "(CASE WHEN OLD.quantity <= OLD.min_quantity AND OLD.min_quantity > 0 THEN 1 ELSE 0 END)"
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_products_stats_insert AFTER INSERT ON products
+        BEGIN
+            UPDATE store_stats SET total_products = total_products + 1, low_stock = low_stock + {low_stock_new}
+            WHERE id = 1;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_products_stats_delete AFTER DELETE ON products
+        BEGIN
+            UPDATE store_stats SET total_products = total_products - 1, low_stock = low_stock - {low_stock_old}
+            WHERE id = 1;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_products_stats_update AFTER UPDATE OF quantity, min_quantity ON products
+        BEGIN
+            UPDATE store_stats SET low_stock = low_stock + {low_stock_new} - {low_stock_old}
+            WHERE id = 1;
+        END
+    ''')
+    
+    for kind in ('income', 'outcome'):
+        counter = f"{kind}_count"
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{kind}_invoices_stats_insert AFTER INSERT ON {kind}_invoices
+            BEGIN
+                INSERT INTO invoice_month_stats (month, {counter}) VALUES (substr(NEW.invoice_date, 1, 7), 1)
+                ON CONFLICT (month) DO UPDATE SET {counter} = {counter} + 1;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{kind}_invoices_stats_delete AFTER DELETE ON {kind}_invoices
+            BEGIN
+                UPDATE invoice_month_stats SET {counter} = {counter} - 1
+                WHERE month = substr(OLD.invoice_date, 1, 7);
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{kind}_invoices_stats_update AFTER UPDATE OF invoice_date ON {kind}_invoices
+            BEGIN
+                UPDATE invoice_month_stats SET {counter} = {counter} - 1
+                WHERE month = substr(OLD.invoice_date, 1, 7);
+                INSERT INTO invoice_month_stats (month, {counter}) VALUES (substr(NEW.invoice_date, 1, 7), 1)
+                ON CONFLICT (month) DO UPDATE SET {counter} = {counter} + 1;
+            END
+        ''')
+    
+    rebuild_dashboard_stats(cursor)
+
+def migrate_product_search(cursor):
+    """v4: полнотекстовый поиск товаров (FTS5) и индексы под фильтры списка товаров"""
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            name, manufacturer, description,
+            content='products', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_insert AFTER INSERT ON products
+        BEGIN
+            INSERT INTO products_fts (rowid, name, manufacturer, description)
+            VALUES (NEW.id, NEW.name, NEW.manufacturer, NEW.description);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_delete AFTER DELETE ON products
+        BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, manufacturer, description)
+            VALUES ('delete', OLD.id, OLD.name, OLD.manufacturer, OLD.description);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_update AFTER UPDATE OF name, manufacturer, description ON products
+        BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, manufacturer, description)
+            VALUES ('delete', OLD.id, OLD.name, OLD.manufacturer, OLD.description);
+            INSERT INTO products_fts (rowid, name, manufacturer, description)
+            VALUES (NEW.id, NEW.name, NEW.manufacturer, NEW.description);
+        END
+    ''')
+    cursor.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+    
+    # Фильтры списка товаров; порядок (name, id) сохраняется внутри каждого индекса
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_category ON products (category_id, name)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_price ON products (price)")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_products_low_stock ON products (name)
+        WHERE quantity <= min_quantity AND min_quantity > 0
+    ''')
+
+def migrate_stock_ledger(cursor):
+    """v5: неизменяемый журнал движения товаров и периодические срезы остатков"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_movements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            movement_date DATE NOT NULL,
+            quantity INTEGER NOT NULL,
+            price REAL,
+            source TEXT NOT NULL,
+            document_id INTEGER
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_movements_product_date ON stock_movements (product_id, movement_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_movements_date ON stock_movements (movement_date)")
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_stock_movements_no_update BEFORE UPDATE ON stock_movements
+        BEGIN
+            SELECT RAISE(ABORT, 'stock_movements: журнал движения нельзя изменять');
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_stock_movements_no_delete BEFORE DELETE ON stock_movements
+        BEGIN
+            SELECT RAISE(ABORT, 'stock_movements: журнал движения нельзя изменять');
+        END
+    ''')
+    
+    # Срез - остаток товара на конец дня snapshot_date; нулевые остатки не хранятся
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_snapshots (
+            snapshot_date DATE NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (snapshot_date, product_id)
+        ) WITHOUT ROWID
+    ''')
+    # Движение задним числом делает более поздние срезы неверными - они пересоздаются при следующем обновлении
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_stock_movements_backdated AFTER INSERT ON stock_movements
+        WHEN NEW.movement_date <= (SELECT MAX(snapshot_date) FROM stock_snapshots)
+        BEGIN
+            DELETE FROM stock_snapshots WHERE snapshot_date >= NEW.movement_date;
+        END
+    ''')
+    
+    for kind, sign in (('income', ''), ('outcome', '-')):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{kind}_items_movement AFTER INSERT ON {kind}_items
+            BEGIN
+                INSERT INTO stock_movements (product_id, movement_date, quantity, price, source, document_id)
+                SELECT NEW.product_id, invoice_date, {sign}NEW.quantity, NEW.price, '{kind}', NEW.invoice_id
+                FROM {kind}_invoices WHERE id = NEW.invoice_id;
+            END
+        ''')
+        # Позиции, проведенные до появления журнала
+        cursor.execute(f'''
+            INSERT INTO stock_movements (product_id, movement_date, quantity, price, source, document_id)
+            SELECT i.product_id, inv.invoice_date, {sign}i.quantity, i.price, '{kind}', i.invoice_id
+            FROM {kind}_items i
+            JOIN {kind}_invoices inv ON inv.id = i.invoice_id
+            ORDER BY i.id
+        ''')
+    
+    # Начальный остаток: то, что не объясняется накладными, относим на дату первого движения
+    cursor.execute('''
+        INSERT INTO stock_movements (product_id, movement_date, quantity, source)
+        SELECT p.id,
+               COALESCE((SELECT MIN(movement_date) FROM stock_movements), date('now', 'localtime')),
+               COALESCE(p.quantity, 0) - COALESCE(m.quantity, 0),
+               'opening'
+        FROM products p
+        LEFT JOIN (SELECT product_id, SUM(quantity) AS quantity FROM stock_movements GROUP BY product_id) m
+            ON m.product_id = p.id
+        WHERE COALESCE(p.quantity, 0) != COALESCE(m.quantity, 0)
+    ''')
+
+STOCK_SNAPSHOT_BOUNDS = "SELECT (SELECT MIN(movement_date) FROM stock_movements), (SELECT MAX(snapshot_date) FROM stock_snapshots)"
+
+def next_snapshot_month(first_movement, last_snapshot):
+    """Первый месяц без среза остатков или None, если срезы есть на конец всех завершенных месяцев"""
+    if first_movement is None:
+        return None
+    month_start = date.fromisoformat((last_snapshot or first_movement)[:10]).replace(day=1)
+    if last_snapshot:
+        month_start = (month_start + datetime.timedelta(days=32)).replace(day=1)
+    return month_start if month_start < date.today().replace(day=1) else None
+
+def create_stock_snapshots(cursor):
+    """Досоздать срезы остатков внутри задания записи; число созданных срезов"""
+    # Границы читаются внутри транзакции записи, чтобы два терминала не создали один срез дважды
+    first_movement, last_snapshot = cursor.execute(STOCK_SNAPSHOT_BOUNDS).fetchone()
+    month_start = next_snapshot_month(first_movement, last_snapshot)
+    current_month = date.today().replace(day=1)
+    created = 0
+    while month_start is not None and month_start < current_month:
+        next_month = (month_start + datetime.timedelta(days=32)).replace(day=1)
+        snapshot_date = (next_month - datetime.timedelta(days=1)).isoformat()
+        # Новый срез = предыдущий срез + движения после него
+        cursor.execute('''
+            INSERT INTO stock_snapshots (snapshot_date, product_id, quantity)
+            SELECT ?, product_id, SUM(quantity)
+            FROM (
+                SELECT product_id, quantity FROM stock_snapshots WHERE snapshot_date = ?
+                UNION ALL
+                SELECT product_id, quantity FROM stock_movements
+                WHERE movement_date > ? AND movement_date <= ?
+            )
+            GROUP BY product_id
+            HAVING SUM(quantity) != 0
+        ''', (snapshot_date, last_snapshot, last_snapshot or '', snapshot_date))
+        last_snapshot = snapshot_date
+        month_start = next_month
+        created += 1
+    return created
+
+def migrate_product_sku(cursor):
+    """v6: артикул товара - ключ для обновления каталога при импорте"""
+    cursor.execute("ALTER TABLE products ADD COLUMN sku TEXT")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_products_sku ON products (sku) WHERE sku IS NOT NULL")
+
+def migrate_daily_turnover(cursor):
+    """v7: дневные обороты по товарам, которые ведутся триггером по журналу движения"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_daily (
+            day DATE NOT NULL,
+            product_id INTEGER NOT NULL,
+            income_qty INTEGER NOT NULL DEFAULT 0,
+            income_amount REAL NOT NULL DEFAULT 0,
+            outcome_qty INTEGER NOT NULL DEFAULT 0,
+            outcome_amount REAL NOT NULL DEFAULT 0,
+            other_qty INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, product_id)
+        ) WITHOUT ROWID
+    ''')
+    # Расход хранится положительными числами; "прочее" - ввод остатков, корректировки и импорт
+    columns = (
+        "CASE WHEN {m}source = 'income' THEN {m}quantity ELSE 0 END",
+        "CASE WHEN {m}source = 'income' THEN {m}quantity * COALESCE({m}price, 0) ELSE 0 END",
+        "CASE WHEN {m}source = 'outcome' THEN -{m}quantity ELSE 0 END",
+        "CASE WHEN {m}source = 'outcome' THEN -{m}quantity * COALESCE({m}price, 0) ELSE 0 END",
+        "CASE WHEN {m}source NOT IN ('income', 'outcome') THEN {m}quantity ELSE 0 END",
+    )
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_stock_movements_daily AFTER INSERT ON stock_movements
+        BEGIN
+            INSERT INTO stock_daily (day, product_id, income_qty, income_amount, outcome_qty, outcome_amount, other_qty)
+            VALUES (date(NEW.movement_date), NEW.product_id, {", ".join(c.format(m='NEW.') for c in columns)})
+            ON CONFLICT (day, product_id) DO UPDATE SET
+                income_qty = income_qty + excluded.income_qty,
+                income_amount = income_amount + excluded.income_amount,
+                outcome_qty = outcome_qty + excluded.outcome_qty,
+                outcome_amount = outcome_amount + excluded.outcome_amount,
+                other_qty = other_qty + excluded.other_qty;
+        END
+    ''')
+    cursor.execute(f'''
+        INSERT INTO stock_daily (day, product_id, income_qty, income_amount, outcome_qty, outcome_amount, other_qty)
+        SELECT date(movement_date), product_id, {", ".join(f"SUM({c.format(m='')})" for c in columns)}
+        FROM stock_movements
+        GROUP BY date(movement_date), product_id
+    ''')
+
+def migrate_sales_indexes(cursor):
+    """v8: покрывающие индексы для аналитики продаж по всей истории"""
+    # Топ товаров и категорий: суммы по product_id считаются по индексу, без чтения таблицы
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_outcome_items_product_sales ON outcome_items (product_id, quantity, price)")
+    # Выручка по периодам читает дату и сумму из индекса; постраничный список накладных
+    # идет по (invoice_date, invoice_number) - индекс по одной дате становится лишним
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_outcome_invoices_sales
+        ON outcome_invoices (invoice_date, invoice_number, total_amount)
+    ''')
+    cursor.execute("DROP INDEX IF EXISTS idx_outcome_invoices_date")
+
+def rebuild_supplier_stats(cursor):
+    """Пересчитать сводки по поставщикам по приходным накладным"""
+    cursor.execute("DELETE FROM supplier_stats")
+    cursor.execute('''
+        INSERT INTO supplier_stats (supplier_id, invoice_count, total_amount, last_delivery)
+        SELECT supplier_id, COUNT(*), COALESCE(SUM(total_amount), 0), MAX(invoice_date)
+        FROM income_invoices
+        WHERE supplier_id IS NOT NULL
+        GROUP BY supplier_id
+    ''')
+    cursor.execute("DELETE FROM supplier_month_stats")
+    cursor.execute('''
+        INSERT INTO supplier_month_stats (supplier_id, month, invoice_count, total_amount)
+        SELECT supplier_id, substr(invoice_date, 1, 7), COUNT(*), COALESCE(SUM(total_amount), 0)
+        FROM income_invoices
+        WHERE supplier_id IS NOT NULL
+        GROUP BY supplier_id, substr(invoice_date, 1, 7)
+    ''')
+    cursor.execute("DELETE FROM supplier_products")
+    cursor.execute('''
+        INSERT INTO supplier_products (supplier_id, product_id, quantity, amount)
+        SELECT inv.supplier_id, i.product_id, SUM(i.quantity), SUM(i.quantity * i.price)
+        FROM income_items i
+        JOIN income_invoices inv ON inv.id = i.invoice_id
+        WHERE inv.supplier_id IS NOT NULL
+        GROUP BY inv.supplier_id, i.product_id
+    ''')
+
+def migrate_supplier_stats(cursor):
+    """v9: сводки по поставщикам (итоги, помесячная динамика, поставляемые товары), которые ведут триггеры"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS supplier_stats (
+            supplier_id INTEGER PRIMARY KEY,
+            invoice_count INTEGER NOT NULL DEFAULT 0,
+            total_amount REAL NOT NULL DEFAULT 0,
+            last_delivery DATE
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS supplier_month_stats (
+            supplier_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            invoice_count INTEGER NOT NULL DEFAULT 0,
+            total_amount REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (supplier_id, month)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS supplier_products (
+            supplier_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            amount REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (supplier_id, product_id)
+        ) WITHOUT ROWID
+    ''')
+    # Дата последней поставки после удаления накладной пересчитывается по этому индексу
+    cursor.execute("DROP INDEX IF EXISTS idx_income_invoices_supplier")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_income_invoices_supplier_date ON income_invoices (supplier_id, invoice_date)")
+    
+    def add_invoice(row):
+        return f'''
+            INSERT INTO supplier_stats (supplier_id, invoice_count, total_amount, last_delivery)
+            SELECT {row}.supplier_id, 1, COALESCE({row}.total_amount, 0), {row}.invoice_date
+            WHERE {row}.supplier_id IS NOT NULL
+            ON CONFLICT (supplier_id) DO UPDATE SET
+                invoice_count = invoice_count + 1,
+                total_amount = total_amount + excluded.total_amount,
+                last_delivery = MAX(COALESCE(last_delivery, ''), excluded.last_delivery);
+            INSERT INTO supplier_month_stats (supplier_id, month, invoice_count, total_amount)
+            SELECT {row}.supplier_id, substr({row}.invoice_date, 1, 7), 1, COALESCE({row}.total_amount, 0)
+            WHERE {row}.supplier_id IS NOT NULL
+            ON CONFLICT (supplier_id, month) DO UPDATE SET
+                invoice_count = invoice_count + 1,
+                total_amount = total_amount + excluded.total_amount;
+        '''
+    
+    def remove_invoice(row):
+        return f'''
+            UPDATE supplier_stats
+            SET invoice_count = invoice_count - 1,
+                total_amount = total_amount - COALESCE({row}.total_amount, 0),
+                last_delivery = (SELECT MAX(invoice_date) FROM income_invoices WHERE supplier_id = {row}.supplier_id)
+            WHERE supplier_id = {row}.supplier_id;
+            UPDATE supplier_month_stats
+            SET invoice_count = invoice_count - 1,
+                total_amount = total_amount - COALESCE({row}.total_amount, 0)
+            WHERE supplier_id = {row}.supplier_id AND month = substr({row}.invoice_date, 1, 7);
+        '''
+    
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_income_invoices_supplier_insert AFTER INSERT ON income_invoices
+        BEGIN
+            {add_invoice('NEW')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_income_invoices_supplier_delete AFTER DELETE ON income_invoices
+        BEGIN
+            {remove_invoice('OLD')}
+        END
+    ''')
+    # Проведение накладной меняет только сумму - достаточно добавить разницу
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_income_invoices_supplier_total AFTER UPDATE OF total_amount ON income_invoices
+        WHEN OLD.supplier_id IS NEW.supplier_id AND OLD.invoice_date IS NEW.invoice_date
+        BEGIN
+            UPDATE supplier_stats
+            SET total_amount = total_amount + COALESCE(NEW.total_amount, 0) - COALESCE(OLD.total_amount, 0)
+            WHERE supplier_id = NEW.supplier_id;
+            UPDATE supplier_month_stats
+            SET total_amount = total_amount + COALESCE(NEW.total_amount, 0) - COALESCE(OLD.total_amount, 0)
+            WHERE supplier_id = NEW.supplier_id AND month = substr(NEW.invoice_date, 1, 7);
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_income_invoices_supplier_update
+        AFTER UPDATE OF supplier_id, invoice_date, total_amount ON income_invoices
+        WHEN OLD.supplier_id IS NOT NEW.supplier_id OR OLD.invoice_date IS NOT NEW.invoice_date
+        BEGIN
+            {remove_invoice('OLD')}
+            {add_invoice('NEW')}
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_income_items_supplier_products AFTER INSERT ON income_items
+        BEGIN
+            INSERT INTO supplier_products (supplier_id, product_id, quantity, amount)
+            SELECT supplier_id, NEW.product_id, NEW.quantity, NEW.quantity * NEW.price
+            FROM income_invoices
+            WHERE id = NEW.invoice_id AND supplier_id IS NOT NULL
+            ON CONFLICT (supplier_id, product_id) DO UPDATE SET
+                quantity = quantity + excluded.quantity,
+                amount = amount + excluded.amount;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_suppliers_stats_delete AFTER DELETE ON suppliers
+        BEGIN
+            DELETE FROM supplier_stats WHERE supplier_id = OLD.id;
+            DELETE FROM supplier_month_stats WHERE supplier_id = OLD.id;
+            DELETE FROM supplier_products WHERE supplier_id = OLD.id;
+        END
+    ''')
+    rebuild_supplier_stats(cursor)
+
+# Таблицы, изменения строк которых отслеживаются для обновления открытых разделов
+TRACKED_TABLES = ('products', 'suppliers')
+
+def migrate_change_log(cursor):
+    """v10: журнал изменений строк - какие товары и поставщики менялись после заданного номера"""
+    # На каждую строку хранится только последний номер изменения, поэтому журнал не растет без предела
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            PRIMARY KEY (table_name, row_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_change_log_seq ON change_log (seq)")
+    for table in TRACKED_TABLES:
+        create_change_log_triggers(cursor, table)
+
+def create_change_log_triggers(cursor, table):
+    """Триггеры, записывающие в change_log номер изменения каждой вставленной, измененной и удаленной строки"""
+    for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_change_log_{event.lower()} AFTER {event} ON {table}
+            BEGIN
+                INSERT INTO change_log (table_name, row_id, seq)
+                VALUES ('{table}', {row}.id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM change_log))
+                ON CONFLICT (table_name, row_id) DO UPDATE SET seq = excluded.seq;
+            END
+        ''')
+
+def migrate_reference_changes(cursor):
+    """v11: изменения категорий в журнале и последний номер изменения по таблице - для кэша справочников"""
+    create_change_log_triggers(cursor, 'categories')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_change_log_table_seq ON change_log (table_name, seq)")
+
+def migrate_row_versions(cursor):
+    """v12: номер версии строки у товаров и поставщиков - правка сохраняется, только если строку никто не изменил"""
+    # Правки из программы увеличивают version сами; остальные UPDATE - триггером из migrate_version_triggers
+    cursor.execute("ALTER TABLE products ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("ALTER TABLE suppliers ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+def migrate_version_triggers(cursor):
+    """v13: любой UPDATE товара или поставщика увеличивает version, даже если запрос его не меняет"""
+    # Без этого UPDATE в обход программы (импорт, обслуживание, другие скрипты) не замечался бы проверкой версии
+    for table in TRACKED_TABLES:
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_version AFTER UPDATE ON {table}
+            WHEN NEW.version = OLD.version
+            BEGIN
+                UPDATE {table} SET version = OLD.version + 1 WHERE id = NEW.id;
+            END
+        ''')
+
+def supplier_products_change(supplier, items, sign):
+    """SQL триггера: добавить (sign '+') или вычесть (sign '-') позиции items у поставщика supplier в supplier_products
+
+    items - подзапрос (product_id, quantity, price). Строка товара, которого у поставщика больше нет
+    ни в одной накладной, удаляется - как после rebuild_supplier_stats.
+    """
+    return f'''
+        INSERT INTO supplier_products (supplier_id, product_id, quantity, amount)
+        SELECT {supplier}, product_id, {sign}SUM(quantity), {sign}SUM(quantity * price)
+        FROM ({items})
+        WHERE {supplier} IS NOT NULL
+        GROUP BY product_id
+        ON CONFLICT (supplier_id, product_id) DO UPDATE SET
+            quantity = quantity + excluded.quantity,
+            amount = amount + excluded.amount;
+        DELETE FROM supplier_products
+        WHERE supplier_id = {supplier}
+          AND product_id IN (SELECT product_id FROM ({items}))
+          AND NOT EXISTS (
+              SELECT 1 FROM income_items i
+              JOIN income_invoices inv ON inv.id = i.invoice_id
+              WHERE inv.supplier_id = supplier_products.supplier_id AND i.product_id = supplier_products.product_id
+          );
+    '''
+
+def migrate_supplier_products_triggers(cursor):
+    """v14: поставляемые товары следуют за удалением и правкой позиций и накладных, а не только за вставкой"""
+    def item(row):
+        return f"SELECT {row}.product_id AS product_id, {row}.quantity AS quantity, {row}.price AS price"
+    
+    def item_supplier(row):
+        return f"(SELECT supplier_id FROM income_invoices WHERE id = {row}.invoice_id)"
+    
+    invoice_items = "SELECT product_id, quantity, price FROM income_items WHERE invoice_id = {row}.id"
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_income_items_supplier_products_delete AFTER DELETE ON income_items
+        BEGIN
+            {supplier_products_change(item_supplier('OLD'), item('OLD'), '-')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_income_items_supplier_products_update
+        AFTER UPDATE OF invoice_id, product_id, quantity, price ON income_items
+        BEGIN
+            {supplier_products_change(item_supplier('OLD'), item('OLD'), '-')}
+            {supplier_products_change(item_supplier('NEW'), item('NEW'), '+')}
+        END
+    ''')
+    # Позиции удаленной накладной вычитаются сразу: если их удалят позже, поставщика по ним уже не найти
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_income_invoices_supplier_products_delete AFTER DELETE ON income_invoices
+        BEGIN
+            {supplier_products_change('OLD.supplier_id', invoice_items.format(row='OLD'), '-')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_income_invoices_supplier_products_move
+        AFTER UPDATE OF supplier_id ON income_invoices
+        WHEN OLD.supplier_id IS NOT NEW.supplier_id
+        BEGIN
+            {supplier_products_change('OLD.supplier_id', invoice_items.format(row='NEW'), '-')}
+            {supplier_products_change('NEW.supplier_id', invoice_items.format(row='NEW'), '+')}
+        END
+    ''')
+    rebuild_supplier_stats(cursor)
+
+# Миграции схемы по порядку: номер версии = позиция в списке + 1 (хранится в PRAGMA user_version)
+MIGRATIONS = [
+    migrate_base_schema,
+    migrate_query_indexes,
+    migrate_dashboard_stats,
+    migrate_product_search,
+    migrate_stock_ledger,
+    migrate_product_sku,
+    migrate_daily_turnover,
+    migrate_sales_indexes,
+    migrate_supplier_stats,
+    migrate_change_log,
+    migrate_reference_changes,
+    migrate_row_versions,
+    migrate_version_triggers,
+    migrate_supplier_products_triggers,
+]
+
+# Отчеты, доступные для экспорта: метод ComputerStoreDB с запросом и заголовки столбцов
+REPORTS = {
+    'stock': {
+        'title': "Отчет по остаткам",
+        'query': 'stock_report_cursor',
+        'columns': ["Товар", "Категория", "Остаток", "Мин. запас", "Цена", "Низкий запас"],
+    },
+    'sales': {
+        'title': "Отчет по продажам",
+        'query': 'sales_report_cursor',
+        'columns': ["Накладная", "Дата", "Клиент", "Сумма"],
+    },
+    'turnover': {
+        'title': "Оборотная ведомость",
+        'query': 'turnover_report_cursor',
+        'columns': [
+            "Период", "Группа", "Остаток на начало", "Приход, шт.", "Приход, сумма",
+            "Расход, шт.", "Расход, сумма", "Прочие изменения", "Остаток на конец",
+        ],
+    },
+    'suppliers': {
+        'title': "Отчет по поставщикам",
+        'query': 'suppliers_report_cursor',
+        'columns': ["Поставщик", "Контакт", "Телефон", "Накладных", "Сумма", "Последняя поставка", "Товаров"],
+    },
+}
+
+# Детализация отчетов по времени: название и выражение периода по столбцу даты {day}
+REPORT_PERIODS = {
+    'day': ("По дням", "date({day})"),
+    'week': ("По неделям", "date({day}, 'weekday 0', '-6 days')"),
+    'month': ("По месяцам", "strftime('%Y-%m', {day})"),
+    'quarter': ("По кварталам", "strftime('%Y', {day}) || '-Q' || ((CAST(strftime('%m', {day}) AS INTEGER) + 2) / 3)"),
+}
+
+# Группировка оборотной ведомости: название, ключ группы по товару p и название группы
+TURNOVER_GROUPS = {
+    'total': ("Итого по складу", "0", "'Все товары'"),
+    'category': ("По категориям", "p.category_id", "COALESCE(c.name, 'Без категории')"),
+    'product': ("По товарам", "p.id", "p.name"),
+}
+
+# Размер порции строк при потоковом чтении курсора
+EXPORT_CHUNK_SIZE = 1000
+
+def iter_cursor_rows(cursor, chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    """Строки курсора порциями через fetchmany; progress(прочитано строк) - после каждой порции"""
+    count = 0
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield from rows
+        count += len(rows)
+        if progress:
+            progress(count)
+
+def write_rows_csv(path, columns, rows):
+    """Записать строки в CSV по мере поступления; вернуть число строк"""
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+def write_rows_json(path, columns, rows):
+    """Записать строки массивом JSON-объектов, по одному объекту за раз; вернуть число строк"""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for row in rows:
+            f.write(',\n' if count else '\n')
+            f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+            count += 1
+        f.write('\n]\n' if count else ']\n')
+    return count
+
+class ComputerStoreDB:
+    """Доступ к базе данных: одно долгоживущее соединение на поток для чтения и один поток записи"""
+    
+    # Размер кэша подготовленных выражений на соединение (по умолчанию в sqlite3 - 128)
+    STATEMENT_CACHE_SIZE = 256
+    # Размер страничного кэша в КиБ (отрицательное значение для PRAGMA cache_size)
+    PAGE_CACHE_KIB = 16384
+    # Сколько страниц копирует один шаг резервного копирования
+    BACKUP_STEP_PAGES = 1024
+    # Сколько заданий записи, накопившихся в очереди, фиксируется одной транзакцией
+    WRITE_GROUP_MAX_JOBS = 64
+    
+    def __init__(self, db_path=DB_PATH, background_init=False, read_only=False):
+        self.db_path = db_path
+        self.read_only = read_only
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._probe = None
+        self._probe_generation = 0
+        self._probe_lock = threading.Lock()
+        self.reference = ReferenceCache(self)
+        self._write_queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self.init_seconds = None
+        self._ready = threading.Event()
+        self._init_thread = None
+        if read_only:
+            # Только чтение (проверка базы): без миграций, файл не меняется
+            self._ready.set()
+        elif background_init:
+            # Миграции идут параллельно с запуском интерфейса; первое обращение к базе их дождется
+            threading.Thread(target=self._initialize, args=(True,), name="db-init", daemon=True).start()
+        else:
+            self._initialize()
+    
+    def _initialize(self, background=False):
+        """Применить миграции и отметить базу готовой к работе"""
+        self._init_thread = threading.current_thread()
+        started = time.perf_counter()
+        try:
+            self.init_db()
+        finally:
+            self.init_seconds = time.perf_counter() - started
+            if background:
+                # Поток инициализации завершается - его соединение больше не понадобится
+                conn = getattr(self._local, 'conn', None)
+                if conn is not None:
+                    with self._connections_lock:
+                        self._connections.remove(conn)
+                    conn.close()
+            self._ready.set()
+    
+    def wait_ready(self):
+        """Дождаться окончания инициализации базы"""
+        self._ready.wait()
+    
+    def _connect(self):
+        """Открыть новое соединение и один раз применить к нему настройки"""
+        conn = sqlite3.connect(
+            f"{Path(self.db_path).resolve().as_uri()}?mode=ro" if self.read_only else self.db_path,
+            uri=self.read_only,
+            timeout=10,
+            check_same_thread=False,
+            cached_statements=self.STATEMENT_CACHE_SIZE
+        )
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = -{self.PAGE_CACHE_KIB}")
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+    
+    def connection(self):
+        """Соединение текущего потока (создается при первом обращении и затем переиспользуется)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if not self._ready.is_set() and threading.current_thread() is not self._init_thread:
+                self._ready.wait()
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+    
+    def data_version(self):
+        """Версия данных: меняется после каждой фиксации любым соединением, включая другие процессы"""
+        # PRAGMA data_version не реагирует на записи своего соединения, поэтому читается на отдельном,
+        # которое само ничего не пишет; поколение отличает значения заново открытого соединения
+        with self._probe_lock:
+            if self._probe is None:
+                self._probe = sqlite3.connect(self.db_path, check_same_thread=False)
+                self._probe_generation += 1
+            return self._probe_generation, self._probe.execute("PRAGMA data_version").fetchone()[0]
+    
+    def submit_write(self, job):
+        """Поставить задание записи в очередь; job(cursor) выполняется в потоке записи, результат - во Future"""
+        future = Future()
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="db-writer", daemon=True)
+                self._writer.start()
+            self._write_queue.put((job, future))
+        return future
+    
+    def write(self, job):
+        """Выполнить задание записи и дождаться фиксации; ошибка задания пробрасывается вызывающему"""
+        if threading.current_thread() is self._writer:
+            # Задание изнутри другого задания уже идет в открытой транзакции
+            return job(self.connection().cursor())
+        return self.submit_write(job).result()
+    
+    def _write_loop(self):
+        """Поток записи: единственный пишущий в базу в этом процессе
+        
+        Задания, накопившиеся в очереди, фиксируются одной транзакцией (групповая фиксация),
+        каждое - в своей точке сохранения, поэтому ошибка одного задания не отменяет остальные.
+        BEGIN IMMEDIATE сразу берет блокировку записи, и конкуренция с другими терминалами
+        решается ожиданием по timeout, а не ошибкой "database is locked" посреди транзакции.
+        """
+        conn = self.connection()
+        while True:
+            item = self._write_queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self.WRITE_GROUP_MAX_JOBS:
+                try:
+                    item = self._write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            
+            done = []
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for job, future in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    conn.execute("SAVEPOINT write_job")
+                    try:
+                        result = job(conn.cursor())
+                    except BaseException as e:
+                        conn.execute("ROLLBACK TO write_job")
+                        conn.execute("RELEASE write_job")
+                        future.set_exception(e)
+                    else:
+                        conn.execute("RELEASE write_job")
+                        done.append((future, result))
+                conn.commit()
+            except BaseException as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                for future, _ in done:
+                    future.set_exception(e)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for future, result in done:
+                    future.set_result(result)
+            if stop:
+                return
+    
+    def close(self):
+        """Дождаться поставленных записей и закрыть все открытые соединения"""
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+            if writer is not None and writer.is_alive():
+                self._write_queue.put(None)
+        if writer is not None:
+            writer.join()
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        with self._probe_lock:
+            if self._probe is not None:
+                connections.append(self._probe)
+                self._probe = None
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+    
+    def post_income_invoice(self, invoice_number, supplier_id, invoice_date, items):
+        """Провести приходную накладную: шапка, позиции и остатки - одной транзакцией"""
+        return self._post_invoice(
+            'income',
+            '''
+                INSERT INTO income_invoices (invoice_number, supplier_id, invoice_date, total_amount)
+                VALUES (?, ?, ?, 0)
+            ''',
+            (invoice_number, supplier_id, invoice_date),
+            items
+        )
+    
+    def post_outcome_invoice(self, invoice_number, customer_name, invoice_date, items):
+        """Провести расходную накладную: шапка, позиции и списание остатков - одной транзакцией"""
+        return self._post_invoice(
+            'outcome',
+            '''
+                INSERT INTO outcome_invoices (invoice_number, customer_name, invoice_date, total_amount)
+                VALUES (?, ?, ?, 0)
+            ''',
+            (invoice_number, customer_name, invoice_date),
+            items
+        )
+    
+    def _post_invoice(self, kind, header_sql, header_params, items):
+        """Общая часть проведения: items - последовательность (product_id, quantity, price)"""
+        sign = '+' if kind == 'income' else '-'
+        
+        def post(cursor):
+            cursor.execute(header_sql, header_params)
+            invoice_id = cursor.lastrowid
+            cursor.executemany(
+                f"INSERT INTO {kind}_items (invoice_id, product_id, quantity, price) VALUES (?, ?, ?, ?)",
+                ((invoice_id, product_id, quantity, price) for product_id, quantity, price in items)
+            )
+            
+            cursor.execute(f'''
+                SELECT DISTINCT product_id FROM {kind}_items
+                WHERE invoice_id = ? AND product_id NOT IN (SELECT id FROM products)
+            ''', (invoice_id,))
+            missing = [str(row[0]) for row in cursor.fetchall()]
+            if missing:
+                raise ValueError(f"Товары не найдены: {', '.join(missing)}")
+            
+            if kind == 'outcome':
+                cursor.execute('''
+                    SELECT p.name, COALESCE(p.quantity, 0), SUM(i.quantity)
+                    FROM outcome_items i
+                    JOIN products p ON p.id = i.product_id
+                    WHERE i.invoice_id = ?
+                    GROUP BY p.id
+                    HAVING SUM(i.quantity) > COALESCE(p.quantity, 0)
+                ''', (invoice_id,))
+                shortages = [f"{name} (остаток {stock}, нужно {needed})" for name, stock, needed in cursor.fetchall()]
+                if shortages:
+                    raise ValueError(f"Недостаточно товара: {'; '.join(shortages)}")
+            
+            # Остатки и сумма пересчитываются одним запросом на всю накладную
+            cursor.execute(f'''
+                UPDATE products
+                SET quantity = COALESCE(quantity, 0) {sign} (
+                    SELECT SUM(quantity) FROM {kind}_items
+                    WHERE invoice_id = ? AND product_id = products.id
+                ),
+                    version = version + 1
+                WHERE id IN (SELECT product_id FROM {kind}_items WHERE invoice_id = ?)
+            ''', (invoice_id, invoice_id))
+            cursor.execute(f'''
+                UPDATE {kind}_invoices
+                SET total_amount = (
+                    SELECT COALESCE(SUM(quantity * price), 0) FROM {kind}_items WHERE invoice_id = ?
+                )
+                WHERE id = ?
+            ''', (invoice_id, invoice_id))
+            # Первая накладная нового месяца (или задним числом) досоздает срезы остатков
+            create_stock_snapshots(cursor)
+            return invoice_id
+        
+        return self.write(post)
+    
+    @staticmethod
+    def add_stock_movement(cursor, product_id, quantity, source, movement_date=None):
+        """Записать в журнал изменение остатка, сделанное не накладной (ввод товара, корректировка)"""
+        if quantity:
+            cursor.execute('''
+                INSERT INTO stock_movements (product_id, movement_date, quantity, source)
+                VALUES (?, ?, ?, ?)
+            ''', (product_id, movement_date or date.today().isoformat(), quantity, source))
+    
+    def dashboard_stats(self):
+        """Счетчики главной страницы: товары, низкий запас, накладные за текущий месяц"""
+        # Счетчики ведутся триггерами (см. migrate_dashboard_stats), здесь - чтение одной строки
+        month = date.today().strftime("%Y-%m")
+        cursor = self.connection().cursor()
+        cursor.execute('''
+            SELECT s.total_products, s.low_stock,
+                   COALESCE(m.income_count, 0), COALESCE(m.outcome_count, 0)
+            FROM store_stats s
+            LEFT JOIN invoice_month_stats m ON m.month = ?
+            WHERE s.id = 1
+        ''', (month,))
+        total_products, low_stock, month_income, month_outcome = cursor.fetchone()
+        return {
+            'total_products': total_products,
+            'low_stock': low_stock,
+            'month_income': month_income,
+            'month_outcome': month_outcome
+        }
+    
+    @staticmethod
+    def build_fts_query(text):
+        """Запрос FTS5 из строки поиска: каждое слово - префикс, все слова обязательны"""
+        terms = []
+        for word in text.split():
+            terms.append('"' + word.replace('"', '""') + '"*')
+        return " ".join(terms)
+    
+    def _products_conditions(self, filters):
+        """Условия WHERE и параметры для фильтров списка товаров"""
+        conditions = []
+        params = []
+        if filters.get('query'):
+            conditions.append("id IN (SELECT rowid FROM products_fts WHERE products_fts MATCH ?)")
+            params.append(self.build_fts_query(filters['query']))
+        if filters.get('category_id') is not None:
+            conditions.append("category_id = ?")
+            params.append(filters['category_id'])
+        if filters.get('price_min') is not None:
+            conditions.append("price >= ?")
+            params.append(filters['price_min'])
+        if filters.get('price_max') is not None:
+            conditions.append("price <= ?")
+            params.append(filters['price_max'])
+        if filters.get('low_stock'):
+            # Условие совпадает с частичным индексом idx_products_low_stock
+            conditions.append("quantity <= min_quantity AND min_quantity > 0")
+        return conditions, params
+    
+    def products_page(self, after=None, before=None, limit=50, filters=None):
+        """Страница товаров по ключу (name, id) - без OFFSET, по индексу idx_products_name"""
+        conditions, params = self._products_conditions(filters or {})
+        order = "name, id"
+        if after is not None:
+            conditions.append("(name, id) > (?, ?)")
+            params.extend(after)
+        elif before is not None:
+            conditions.append("(name, id) < (?, ?)")
+            params.extend(before)
+            order = "name DESC, id DESC"
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor = self.connection().cursor()
+        cursor.execute(f"SELECT * FROM products {where} ORDER BY {order} LIMIT ?", (*params, limit))
+        products = cursor.fetchall()
+        return products[::-1] if before is not None else products
+    
+    def products_by_ids(self, product_ids, filters=None):
+        """Товары по списку id, только подходящие под фильтры"""
+        conditions, params = self._products_conditions(filters or {})
+        conditions.append(f"id IN ({', '.join('?' * len(product_ids))})")
+        cursor = self.connection().cursor()
+        cursor.execute(f"SELECT * FROM products WHERE {' AND '.join(conditions)}", (*params, *product_ids))
+        return cursor.fetchall()
+    
+    def refresh_stock_snapshots(self):
+        """Досоздать срезы остатков на конец каждого завершенного месяца; если все срезы есть, база не блокируется"""
+        # Проверка - обычным чтением: задание записи ставится в очередь, только если срез действительно отсутствует
+        first_movement, last_snapshot = self.connection().execute(STOCK_SNAPSHOT_BOUNDS).fetchone()
+        if next_snapshot_month(first_movement, last_snapshot) is None:
+            return 0
+        return self.write(create_stock_snapshots)
+    
+    def _stock_as_of_source(self, as_of):
+        """Подзапрос (product_id, quantity) с остатками на конец дня as_of и его параметры"""
+        # Срезы досоздаются при проведении накладных и обслуживании; отчет только читает -
+        # без недостающего среза берется более ранний, и движений после него просто больше
+        cursor = self.connection().cursor()
+        cursor.execute(
+            "SELECT MAX(snapshot_date) FROM stock_snapshots WHERE snapshot_date <= ?",
+            (as_of,)
+        )
+        snapshot_date = cursor.fetchone()[0]
+        sql = '''
+            SELECT product_id, SUM(quantity) AS quantity
+            FROM (
+                SELECT product_id, quantity FROM stock_snapshots WHERE snapshot_date = ?
+                UNION ALL
+                SELECT product_id, quantity FROM stock_movements
+                WHERE movement_date > ? AND movement_date <= ?
+            )
+            GROUP BY product_id
+        '''
+        return sql, (snapshot_date, snapshot_date or '', as_of)
+    
+    def get_stock_as_of(self, as_of):
+        """Остатки всех товаров на конец дня as_of: ближайший срез + движения после него"""
+        sql, params = self._stock_as_of_source(as_of)
+        return dict(self.connection().execute(sql, params).fetchall())
+    
+    # Запросы отчетов возвращают открытый курсор: экран читает его целиком,
+    # экспорт - порциями через fetchmany
+    
+    def stock_report_cursor(self, as_of=None):
+        """Отчет по остаткам: название, категория, остаток, мин. запас, цена, признак низкого запаса"""
+        cursor = self.connection().cursor()
+        if as_of:
+            # Остатки на дату берутся из журнала движения, а не из products.quantity
+            source, params = self._stock_as_of_source(as_of)
+            cursor.execute(f'''
+                SELECT p.name, c.name as category, COALESCE(s.quantity, 0) as quantity, p.min_quantity, p.price,
+                       CASE WHEN COALESCE(s.quantity, 0) <= p.min_quantity AND p.min_quantity > 0 THEN 1 ELSE 0 END as low_stock
+                FROM products p
+                LEFT JOIN categories c ON p.category_id = c.id
+                LEFT JOIN ({source}) s ON s.product_id = p.id
+                ORDER BY low_stock DESC, quantity ASC
+            ''', params)
+        else:
+            cursor.execute('''
+                SELECT p.name, c.name as category, p.quantity, p.min_quantity, p.price,
+                       CASE WHEN p.quantity <= p.min_quantity AND p.min_quantity > 0 THEN 1 ELSE 0 END as low_stock
+                FROM products p
+                LEFT JOIN categories c ON p.category_id = c.id
+                ORDER BY low_stock DESC, p.quantity ASC
+            ''')
+        return cursor
+    
+    def sales_report_cursor(self, before=None, limit=-1):
+        """Расходные накладные от новых к старым; before = (дата, номер) последней показанной"""
+        cursor = self.connection().cursor()
+        where, params = "", []
+        if before:
+            where = "WHERE (invoice_date, invoice_number) < (?, ?)"
+            params.extend(before)
+        cursor.execute(f'''
+            SELECT invoice_number, invoice_date, customer_name, total_amount
+            FROM outcome_invoices
+            {where}
+            ORDER BY invoice_date DESC, invoice_number DESC
+            LIMIT ?
+        ''', (*params, limit))
+        return cursor
+    
+    def sales_summary(self):
+        """Итоги продаж за всю историю: накладных, выручка, средний чек, продано единиц"""
+        return self.connection().execute('''
+            SELECT COUNT(*), COALESCE(SUM(total_amount), 0), COALESCE(AVG(total_amount), 0),
+                   (SELECT COALESCE(SUM(quantity), 0) FROM outcome_items)
+            FROM outcome_invoices
+        ''').fetchone()
+    
+    def sales_by_period_cursor(self, period='month'):
+        """Выручка по периодам: период, накладных, выручка, средний чек"""
+        period_expr = REPORT_PERIODS[period][1].format(day='invoice_date')
+        cursor = self.connection().cursor()
+        cursor.execute(f'''
+            SELECT {period_expr} AS period, COUNT(*), SUM(total_amount), AVG(total_amount)
+            FROM outcome_invoices
+            GROUP BY period
+            ORDER BY period DESC
+        ''')
+        return cursor
+    
+    def top_products_cursor(self, limit=10):
+        """Самые продаваемые товары по выручке: товар, продано единиц, выручка"""
+        cursor = self.connection().cursor()
+        cursor.execute('''
+            SELECT COALESCE(p.name, 'Товар #' || s.product_id), s.quantity, s.revenue
+            FROM (
+                SELECT product_id, SUM(quantity) AS quantity, SUM(quantity * price) AS revenue
+                FROM outcome_items
+                GROUP BY product_id
+            ) s
+            LEFT JOIN products p ON p.id = s.product_id
+            ORDER BY s.revenue DESC
+            LIMIT ?
+        ''', (limit,))
+        return cursor
+    
+    def top_categories_cursor(self, limit=10):
+        """Категории по выручке: категория, продано единиц, выручка"""
+        cursor = self.connection().cursor()
+        cursor.execute('''
+            SELECT COALESCE(c.name, 'Без категории'), SUM(s.quantity), SUM(s.revenue) AS revenue
+            FROM (
+                SELECT product_id, SUM(quantity) AS quantity, SUM(quantity * price) AS revenue
+                FROM outcome_items
+                GROUP BY product_id
+            ) s
+            LEFT JOIN products p ON p.id = s.product_id
+            LEFT JOIN categories c ON c.id = p.category_id
+            GROUP BY c.id
+            ORDER BY revenue DESC
+            LIMIT ?
+        ''', (limit,))
+        return cursor
+    
+    def turnover_report_cursor(self, start, end=None, period='month', group_by='total'):
+        """Оборотная ведомость за [start, end] по периодам и группам с остатками на начало и конец"""
+        end = end or date.today().isoformat()
+        period_expr = REPORT_PERIODS[period][1].format(day='d.day')
+        _, group_expr, group_name_expr = TURNOVER_GROUPS[group_by]
+        day_before = (date.fromisoformat(start) - datetime.timedelta(days=1)).isoformat()
+        opening_sql, opening_params = self._stock_as_of_source(day_before)
+        
+        # Обороты берутся из дневной сводки stock_daily, остаток на начало - из среза и журнала.
+        # Строки строятся по сетке "период x группа": группа с остатком, но без движения в диапазоне,
+        # тоже попадает в ведомость с нулевыми оборотами.
+        # Остаток на начало каждого периода = остаток на начало ведомости + движение в предыдущих периодах
+        cursor = self.connection().cursor()
+        cursor.execute(f'''
+            WITH RECURSIVE days(day) AS (
+                SELECT date(?)
+                UNION ALL
+                SELECT date(day, '+1 day') FROM days WHERE day < date(?)
+            ),
+            periods AS (
+                SELECT DISTINCT {period_expr} AS period FROM days d
+            ),
+            opening AS (
+                SELECT {group_expr} AS group_id, {group_name_expr} AS group_name, SUM(o.quantity) AS quantity
+                FROM ({opening_sql}) o
+                JOIN products p ON p.id = o.product_id
+                LEFT JOIN categories c ON c.id = p.category_id
+                GROUP BY group_id
+                HAVING SUM(o.quantity) != 0
+            ),
+            turnover AS (
+                SELECT {period_expr} AS period, {group_expr} AS group_id, {group_name_expr} AS group_name,
+                       SUM(d.income_qty) AS income_qty, SUM(d.income_amount) AS income_amount,
+                       SUM(d.outcome_qty) AS outcome_qty, SUM(d.outcome_amount) AS outcome_amount,
+                       SUM(d.other_qty) AS other_qty,
+                       SUM(d.income_qty - d.outcome_qty + d.other_qty) AS net_qty
+                FROM stock_daily d
+                JOIN products p ON p.id = d.product_id
+                LEFT JOIN categories c ON c.id = p.category_id
+                WHERE d.day BETWEEN ? AND ?
+                GROUP BY period, group_id
+            ),
+            groups AS (
+                SELECT group_id, group_name FROM opening
+                UNION
+                SELECT group_id, group_name FROM turnover
+            ),
+            grid AS (
+                SELECT pr.period, g.group_id, g.group_name,
+                       COALESCE(t.income_qty, 0) AS income_qty, COALESCE(t.income_amount, 0) AS income_amount,
+                       COALESCE(t.outcome_qty, 0) AS outcome_qty, COALESCE(t.outcome_amount, 0) AS outcome_amount,
+                       COALESCE(t.other_qty, 0) AS other_qty, COALESCE(t.net_qty, 0) AS net_qty
+                FROM periods pr
+                CROSS JOIN groups g
+                LEFT JOIN turnover t ON t.period = pr.period AND t.group_id IS g.group_id
+            ),
+            balances AS (
+                SELECT t.*,
+                       COALESCE(o.quantity, 0) + COALESCE(SUM(t.net_qty) OVER (
+                           PARTITION BY t.group_id ORDER BY t.period
+                           ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                       ), 0) AS opening_qty
+                FROM grid t
+                LEFT JOIN opening o ON o.group_id IS t.group_id
+            )
+            SELECT period, group_name, opening_qty, income_qty, income_amount,
+                   outcome_qty, outcome_amount, other_qty, opening_qty + net_qty
+            FROM balances
+            ORDER BY period, group_name
+        ''', (start, end, *opening_params, start, end))
+        return cursor
+    
+    def check_turnover(self, start, end=None):
+        """Сверка ведомости с журналом: остатки на конец по категориям против get_stock_as_of(end); список расхождений"""
+        end = end or date.today().isoformat()
+        expected = {}
+        names = dict(self.connection().execute('''
+            SELECT p.id, COALESCE(c.name, 'Без категории')
+            FROM products p LEFT JOIN categories c ON c.id = p.category_id
+        '''))
+        for product_id, quantity in self.get_stock_as_of(end).items():
+            name = names.get(product_id, 'Без категории')
+            expected[name] = expected.get(name, 0) + quantity
+        expected = {name: quantity for name, quantity in expected.items() if quantity}
+        
+        # Строки идут по периодам, поэтому для каждой группы остается остаток на конец последнего периода
+        closing = {}
+        for row in self.turnover_report_cursor(start, end, 'month', 'category'):
+            closing[row[1]] = row[8]
+        closing = {name: quantity for name, quantity in closing.items() if quantity}
+        
+        mismatches = [
+            (name, closing.get(name, 0), expected.get(name, 0))
+            for name in sorted(set(closing) | set(expected))
+            if closing.get(name, 0) != expected.get(name, 0)
+        ]
+        if sum(closing.values()) != sum(expected.values()):
+            mismatches.append(('Итого', sum(closing.values()), sum(expected.values())))
+        return mismatches
+    
+    def suppliers_report_cursor(self, with_id=False):
+        """Отчет по поставщикам: контакты и сводка из supplier_stats (число и сумма накладных, последняя поставка, товаров)"""
+        cursor = self.connection().cursor()
+        cursor.execute(f'''
+            SELECT {"s.id, " if with_id else ""}s.name, s.contact_person, s.phone,
+                   COALESCE(st.invoice_count, 0), COALESCE(st.total_amount, 0), st.last_delivery,
+                   (SELECT COUNT(*) FROM supplier_products sp WHERE sp.supplier_id = s.id)
+            FROM suppliers s
+            LEFT JOIN supplier_stats st ON st.supplier_id = s.id
+            ORDER BY COALESCE(st.total_amount, 0) DESC
+        ''')
+        return cursor
+    
+    def supplier_trends(self, since_month):
+        """Суммы поставок по месяцам начиная с since_month: {supplier_id: {месяц: сумма}}"""
+        trends = {}
+        for supplier_id, month, total in self.connection().execute('''
+            SELECT supplier_id, month, total_amount
+            FROM supplier_month_stats
+            WHERE month >= ?
+        ''', (since_month,)):
+            trends.setdefault(supplier_id, {})[month] = total
+        return trends
+    
+    def change_seq(self):
+        """Номер последнего изменения в журнале change_log"""
+        return self.connection().execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+    
+    def changes_since(self, table, seq):
+        """Строки таблицы, изменившиеся после номера seq: (id строк, новый номер)
+        
+        Если журнал короче seq (база восстановлена из копии или файл откатили), возвращается
+        (None, текущий номер): отдельные изменения восстановить нельзя, раздел нужно перечитать целиком.
+        """
+        current = self.change_seq()
+        if current < seq:
+            return None, current
+        rows = self.connection().execute('''
+            SELECT row_id, seq FROM change_log
+            WHERE seq > ? AND table_name = ?
+        ''', (seq, table)).fetchall()
+        return [row_id for row_id, _ in rows], max((row_seq for _, row_seq in rows), default=seq)
+    
+    def report_cursor(self, name, **params):
+        """Курсор отчета по имени из REPORTS"""
+        return getattr(self, REPORTS[name]['query'])(**params)
+    
+    def export_report(self, name, path, fmt='csv', progress=None, **params):
+        """Выгрузить отчет в CSV или JSON, не загружая его в память целиком; вернуть число строк"""
+        cursor = self.report_cursor(name, **params)
+        rows = iter_cursor_rows(cursor, progress=progress)
+        writer = write_rows_json if fmt == 'json' else write_rows_csv
+        try:
+            return writer(path, REPORTS[name]['columns'], rows)
+        finally:
+            cursor.close()
+    
+    def backup_to(self, path, progress=None):
+        """Снять согласованную копию работающей базы через backup API, не блокируя запись"""
+        path = Path(path)
+        part_path = path.with_name(path.name + '.part')
+        part_path.unlink(missing_ok=True)
+        # Отдельное соединение: открытая на нем читающая транзакция фиксирует снимок WAL,
+        # поэтому писатели продолжают работу, а копирование не перезапускается
+        source = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+        target = sqlite3.connect(part_path)
+        try:
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            source.backup(
+                target,
+                pages=self.BACKUP_STEP_PAGES,
+                progress=(lambda status, remaining, total: progress(total - remaining, total)) if progress else None
+            )
+            source.rollback()
+        except BaseException:
+            target.close()
+            part_path.unlink(missing_ok=True)
+            raise
+        finally:
+            source.close()
+        target.close()
+        # Файл появляется под своим именем только после полного копирования
+        os.replace(part_path, path)
+        return path
+    
+    @staticmethod
+    def check_database_file(path, full=True):
+        """Проверить целостность файла базы; вернуть версию его схемы или выбросить ValueError"""
+        try:
+            conn = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True)
+        except sqlite3.Error as e:
+            raise ValueError(f"файл не открывается как база SQLite: {e}")
+        try:
+            pragma = "integrity_check" if full else "quick_check"
+            problems = [row[0] for row in conn.execute(f"PRAGMA {pragma}")]
+            if problems != ['ok']:
+                raise ValueError("база повреждена: " + "; ".join(problems[:5]))
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if not {'products', 'categories', 'suppliers'} <= tables:
+                raise ValueError("файл не является базой компьютерного магазина")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version > len(MIGRATIONS):
+                raise ValueError(f"копия создана более новой версией программы (схема {version})")
+            return version
+        except sqlite3.DatabaseError as e:
+            raise ValueError(f"файл не читается как база SQLite: {e}")
+        finally:
+            conn.close()
+    
+    def restore_from(self, path, progress=None):
+        """Восстановить базу из копии без перезапуска: проверка, промежуточный файл, подмена одной транзакцией"""
+        def report(stage):
+            if progress is None:
+                return None
+            return lambda status, remaining, total: progress(stage, total - remaining, total)
+        
+        if progress:
+            progress('check', 0, 0)
+        self.check_database_file(path)
+        
+        # Копия сначала загружается в промежуточный файл: так исходный файл не нужен во время подмены,
+        # а его -wal (если он лежит рядом) учитывается при чтении
+        staging_path = Path(f"{self.db_path}.restore")
+        staging_path.unlink(missing_ok=True)
+        try:
+            source = sqlite3.connect(path, timeout=10)
+            staging = sqlite3.connect(staging_path)
+            try:
+                source.backup(staging, pages=self.BACKUP_STEP_PAGES, progress=report('stage'))
+                # Backup API не меняет размер страницы базы в режиме WAL - приводим копию к размеру рабочей базы
+                page_size = self.connection().execute("PRAGMA page_size").fetchone()[0]
+                if staging.execute("PRAGMA page_size").fetchone()[0] != page_size:
+                    staging.execute("PRAGMA journal_mode = DELETE")
+                    staging.execute(f"PRAGMA page_size = {page_size}")
+                    staging.execute("VACUUM")
+            finally:
+                source.close()
+                staging.close()
+            self.check_database_file(staging_path, full=False)
+            
+            # Подмена: запись копии в рабочую базу идет одной транзакцией назначения, поэтому остальные
+            # соединения видят либо старые, либо новые данные целиком и продолжают работать без переоткрытия
+            staging = sqlite3.connect(staging_path)
+            target = sqlite3.connect(self.db_path, timeout=10)
+            try:
+                staging.backup(target, pages=self.BACKUP_STEP_PAGES, progress=report('swap'))
+            finally:
+                staging.close()
+                target.close()
+        finally:
+            staging_path.unlink(missing_ok=True)
+        
+        # Копия могла быть снята со старой схемой - догоняем ее миграциями
+        self.init_db()
+        self.reference.invalidate()
+    
+    def vacuum(self):
+        """Обслуживание: досоздать срезы остатков, обновить статистику планировщика, сжать файл и обрезать WAL"""
+        self.refresh_stock_snapshots()
+        conn = self.connection()
+        conn.execute("ANALYZE")
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    
+    def rebuild_stats(self):
+        """Пересчитать счетчики главной страницы и сводки по поставщикам, если они разошлись с данными; досоздать срезы"""
+        def rebuild(cursor):
+            rebuild_dashboard_stats(cursor)
+            rebuild_supplier_stats(cursor)
+            create_stock_snapshots(cursor)
+        
+        self.write(rebuild)
+    
+    def init_db(self):
+        """Применить к базе недостающие миграции схемы"""
+        conn = self.connection()
+        try:
+            # WAL сохраняется в файле БД, поэтому включается один раз для всех соединений
+            conn.execute("PRAGMA journal_mode = WAL")
+            
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= len(MIGRATIONS):
+                return
+            
+            # BEGIN IMMEDIATE и повторное чтение версии: другой терминал мог обновить схему раньше
+            conn.execute("BEGIN IMMEDIATE")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            cursor = conn.cursor()
+            for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+            print(f"База данных успешно инициализирована (версия схемы {len(MIGRATIONS)})")
+            
+        except Exception as e:
+            conn.rollback()
+            print(f"Ошибка инициализации базы данных: {e}")
+
+class ReferenceCache:
+    """Справочники в памяти процесса: категории {id: название} и поставщики ((id, название), ...)
+    
+    Запись через это приложение сбрасывает справочник сразу (invalidate). Изменения с других терминалов
+    замечаются по PRAGMA data_version, а перечитывание идет, только если справочник действительно менялся
+    по журналу change_log. Возвращаемые данные общие для всех вызывающих - их нельзя изменять.
+    """
+    
+    QUERIES = {
+        'categories': "SELECT id, name FROM categories ORDER BY id",
+        'suppliers': "SELECT id, name FROM suppliers ORDER BY name, id",
+    }
+    
+    def __init__(self, db):
+        self.db = db
+        self._entries = {}
+        self._lock = threading.Lock()
+    
+    def get(self, name):
+        """Справочник по имени из QUERIES"""
+        version = self.db.data_version()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry['version'] == version:
+                return entry['data']
+        
+        conn = self.db.connection()
+        seq = conn.execute("SELECT MAX(seq) FROM change_log WHERE table_name = ?", (name,)).fetchone()[0]
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry['seq'] == seq:
+                entry['version'] = version
+                return entry['data']
+        
+        rows = conn.execute(self.QUERIES[name]).fetchall()
+        data = dict(rows) if name == 'categories' else tuple(rows)
+        with self._lock:
+            self._entries[name] = {'version': version, 'seq': seq, 'data': data}
+        return data
+    
+    def categories(self):
+        """Категории {id: название}"""
+        return self.get('categories')
+    
+    def suppliers(self):
+        """Поставщики ((id, название), ...) по алфавиту"""
+        return self.get('suppliers')
+    
+    def invalidate(self, name=None):
+        """Сбросить справочник (или все) после записи в его таблицу"""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+class BackupStore:
+    """Цепочка инкрементных резервных копий: сжатые блоки файла БД без повторов и описи снимков"""
+    
+    # Размер блока в страницах БД: меньше блок - меньше лишних данных при точечных изменениях
+    CHUNK_PAGES = 16
+    COMPRESSION_LEVEL = 3
+    # Сколько последних снимков хранится всегда, независимо от периодов
+    KEEP_LAST = 12
+    # Политика хранения: (название, ключ периода, сколько последних периодов держать)
+    RETENTION = (
+        ('hourly', '%Y%m%d%H', 24),
+        ('daily', '%Y%m%d', 7),
+        ('weekly', '%G%V', 8),
+    )
+    
+    def __init__(self, db, root="backups"):
+        self.db = db
+        self.root = Path(root)
+        self.chunks_dir = self.root / "chunks"
+        self.manifests_dir = self.root / "manifests"
+        self._lock = threading.Lock()
+    
+    def _chunk_path(self, digest):
+        return self.chunks_dir / digest[:2] / f"{digest}.z"
+    
+    @contextmanager
+    def _exclusive(self):
+        """Блокировка хранилища для всех процессов: снимок и очистка из cron и из программы не пересекаются"""
+        self.root.mkdir(exist_ok=True)
+        with self._lock, open(self.root / ".lock", 'a+b') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        # LK_LOCK сдается через 10 секунд - ждем дальше, пока другой процесс не закончит
+                        continue
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+    
+    def _write_atomic(self, path, data):
+        """Записать файл целиком или не записать вовсе"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    
+    def create(self, progress=None):
+        """Снять снимок базы и сохранить только блоки, которых еще нет в хранилище; вернуть опись"""
+        with self._exclusive():
+            created = datetime.datetime.now()
+            backup_id = created.strftime("%Y%m%d_%H%M%S")
+            suffix = 1
+            while (self.manifests_dir / f"{backup_id}.json").exists():
+                backup_id = f"{created.strftime('%Y%m%d_%H%M%S')}_{suffix}"
+                suffix += 1
+            
+            # Свое имя файла снимка у каждого запуска
+            fd, snapshot_path = tempfile.mkstemp(prefix="snapshot_", suffix=".db", dir=self.root)
+            os.close(fd)
+            snapshot_path = Path(snapshot_path)
+            self.db.backup_to(snapshot_path, progress=(lambda done, total: progress('snapshot', done, total)) if progress else None)
+            try:
+                conn = sqlite3.connect(snapshot_path)
+                try:
+                    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+                finally:
+                    conn.close()
+                chunk_size = page_size * self.CHUNK_PAGES
+                size = snapshot_path.stat().st_size
+                total_chunks = (size + chunk_size - 1) // chunk_size
+                chunks = []
+                new_chunks = 0
+                stored_bytes = 0
+                with open(snapshot_path, 'rb') as f:
+                    while True:
+                        data = f.read(chunk_size)
+                        if not data:
+                            break
+                        digest = hashlib.sha256(data).hexdigest()
+                        chunk_path = self._chunk_path(digest)
+                        if not chunk_path.exists():
+                            packed = zlib.compress(data, self.COMPRESSION_LEVEL)
+                            self._write_atomic(chunk_path, packed)
+                            new_chunks += 1
+                            stored_bytes += len(packed)
+                        chunks.append(digest)
+                        if progress and len(chunks) % 256 == 0:
+                            progress('chunks', len(chunks), total_chunks)
+            finally:
+                snapshot_path.unlink(missing_ok=True)
+            
+            manifest = {
+                'id': backup_id,
+                'created': created.isoformat(timespec='seconds'),
+                'page_size': page_size,
+                'chunk_size': chunk_size,
+                'size': size,
+                'chunks': chunks,
+                'new_chunks': new_chunks,
+                'stored_bytes': stored_bytes,
+            }
+            # Опись пишется последней: снимок считается созданным, только когда все его блоки на диске
+            self._write_atomic(self.manifests_dir / f"{backup_id}.json", json.dumps(manifest).encode('utf-8'))
+            manifest['pruned'] = self._prune()
+            return manifest
+    
+    def list_backups(self):
+        """Описи всех снимков, от новых к старым"""
+        manifests = []
+        if self.manifests_dir.exists():
+            for path in self.manifests_dir.glob("*.json"):
+                with open(path, encoding='utf-8') as f:
+                    manifests.append(json.load(f))
+        manifests.sort(key=lambda m: (m['created'], m['id']), reverse=True)
+        return manifests
+    
+    def _prune(self):
+        """Удалить снимки вне политики хранения и блоки, на которые больше никто не ссылается"""
+        manifests = self.list_backups()
+        keep = {m['id'] for m in manifests[:self.KEEP_LAST]}
+        for _, period_format, count in self.RETENTION:
+            periods = []
+            for manifest in manifests:
+                period = datetime.datetime.fromisoformat(manifest['created']).strftime(period_format)
+                if period in periods:
+                    continue
+                if len(periods) >= count:
+                    break
+                periods.append(period)
+                keep.add(manifest['id'])
+        
+        removed = 0
+        referenced = set()
+        for manifest in manifests:
+            if manifest['id'] in keep:
+                referenced.update(manifest['chunks'])
+            else:
+                (self.manifests_dir / f"{manifest['id']}.json").unlink(missing_ok=True)
+                removed += 1
+        if removed and self.chunks_dir.exists():
+            for chunk_path in self.chunks_dir.glob("*/*"):
+                if chunk_path.name.split('.')[0] not in referenced:
+                    chunk_path.unlink(missing_ok=True)
+        return removed
+    
+    def materialize(self, backup_id, path):
+        """Собрать файл БД снимка из блоков с проверкой контрольных сумм"""
+        with open(self.manifests_dir / f"{backup_id}.json", encoding='utf-8') as f:
+            manifest = json.load(f)
+        with open(path, 'wb') as out:
+            for digest in manifest['chunks']:
+                with open(self._chunk_path(digest), 'rb') as f:
+                    data = zlib.decompress(f.read())
+                if hashlib.sha256(data).hexdigest() != digest:
+                    raise ValueError(f"блок {digest[:12]} снимка {backup_id} поврежден")
+                out.write(data)
+        return path
+    
+    def restore(self, backup_id, progress=None):
+        """Восстановить рабочую базу на момент снимка"""
+        with self._exclusive():
+            fd, path = tempfile.mkstemp(prefix=f"restore_{backup_id}_", suffix=".db", dir=self.root)
+            os.close(fd)
+            path = Path(path)
+        try:
+            # Блоки собираются под блокировкой, чтобы очистка в другом процессе не удалила их посреди сборки
+            with self._exclusive():
+                self.materialize(backup_id, path)
+            self.db.restore_from(path, progress=progress)
+        finally:
+            path.unlink(missing_ok=True)
+
+class ProductImporter:
+    """Потоковый импорт каталога товаров из CSV/XLSX пакетами по BATCH_SIZE строк"""
+    
+    BATCH_SIZE = 1000
+    # Сколько причин отказа держать в памяти для показа; полный список пишется в файл
+    MAX_REPORTED_ERRORS = 100
+    
+    # Допустимые заголовки столбцов -> поле товара
+    COLUMNS = {
+        'sku': 'sku', 'артикул': 'sku',
+        'name': 'name', 'название': 'name', 'наименование': 'name',
+        'category': 'category', 'категория': 'category',
+        'manufacturer': 'manufacturer', 'производитель': 'manufacturer',
+        'price': 'price', 'цена': 'price',
+        'quantity': 'quantity', 'количество': 'quantity', 'остаток': 'quantity',
+        'min_quantity': 'min_quantity', 'мин. количество': 'min_quantity', 'мин. запас': 'min_quantity',
+        'description': 'description', 'описание': 'description',
+    }
+    
+    def __init__(self, db, batch_size=None):
+        self.db = db
+        self.batch_size = batch_size or self.BATCH_SIZE
+    
+    def iter_rows(self, path):
+        """Строки файла в виде (номер строки, {поле: значение}, доля прочитанного файла)"""
+        if Path(path).suffix.lower() == '.xlsx':
+            yield from self._iter_xlsx_rows(path)
+        else:
+            yield from self._iter_csv_rows(path)
+    
+    def _map_header(self, header):
+        fields = [self.COLUMNS.get(str(title or '').strip().lower()) for title in header]
+        if 'name' not in fields or 'price' not in fields:
+            raise ValueError("В файле должны быть столбцы 'Название' и 'Цена'")
+        return fields
+    
+    def _iter_csv_rows(self, path):
+        total_size = os.path.getsize(path) or 1
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            first_line = f.readline()
+            delimiter = ';' if first_line.count(';') >= first_line.count(',') else ','
+            fields = self._map_header(next(csv.reader([first_line], delimiter=delimiter)))
+            for line_no, values in enumerate(csv.reader(f, delimiter=delimiter), start=2):
+                if any(values):
+                    yield line_no, dict(zip(fields, values)), f.buffer.tell() / total_size
+    
+    def _iter_xlsx_rows(self, path):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise RuntimeError("Для импорта XLSX установите пакет openpyxl")
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            sheet = workbook.active
+            total_rows = sheet.max_row or 0
+            rows = sheet.iter_rows(values_only=True)
+            fields = self._map_header(next(rows, ()))
+            for line_no, values in enumerate(rows, start=2):
+                if any(value is not None and value != '' for value in values):
+                    yield line_no, dict(zip(fields, values)), (line_no / total_rows if total_rows else None)
+        finally:
+            workbook.close()
+    
+    @staticmethod
+    def _text(value):
+        if value is None:
+            return None
+        value = str(value).strip()
+        return value or None
+    
+    @staticmethod
+    def _number(value, convert):
+        if value is None or str(value).strip() == '':
+            return None
+        if isinstance(value, str):
+            value = value.strip().replace(' ', '').replace(',', '.')
+        return convert(float(value)) if convert is int else convert(value)
+    
+    def validate(self, row):
+        """Проверить строку и привести типы; ошибка - ValueError с причиной"""
+        name = self._text(row.get('name'))
+        if not name:
+            raise ValueError("не указано название")
+        try:
+            price = self._number(row.get('price'), float)
+            quantity = self._number(row.get('quantity'), int)
+            min_quantity = self._number(row.get('min_quantity'), int)
+        except (TypeError, ValueError):
+            raise ValueError("некорректное числовое значение")
+        if price is None or price < 0:
+            raise ValueError("цена должна быть неотрицательным числом")
+        if (quantity is not None and quantity < 0) or (min_quantity is not None and min_quantity < 0):
+            raise ValueError("количество не может быть отрицательным")
+        return {
+            'sku': self._text(row.get('sku')),
+            'name': name,
+            'category': self._text(row.get('category')),
+            'manufacturer': self._text(row.get('manufacturer')),
+            'price': price,
+            'quantity': quantity,
+            'min_quantity': min_quantity,
+            'description': self._text(row.get('description')),
+        }
+    
+    def run(self, path, progress=None):
+        """Импортировать файл; progress(обработано строк, доля файла или None) вызывается после каждого пакета"""
+        result = {'inserted': 0, 'updated': 0, 'rejected': 0, 'errors': [], 'rejected_file': None}
+        rejected_path = None
+        rejected_file = None
+        rejected_writer = None
+        batch = []
+        processed = 0
+        fraction = None
+        
+        try:
+            for line_no, row, fraction in self.iter_rows(path):
+                processed += 1
+                try:
+                    batch.append((line_no, self.validate(row)))
+                except ValueError as e:
+                    result['rejected'] += 1
+                    if len(result['errors']) < self.MAX_REPORTED_ERRORS:
+                        result['errors'].append((line_no, str(e)))
+                    if rejected_writer is None:
+                        rejected_file, rejected_path = self._open_rejected_file(path)
+                        rejected_writer = csv.writer(rejected_file, delimiter=';')
+                        rejected_writer.writerow(['Строка', 'Причина', 'Название', 'Цена'])
+                    rejected_writer.writerow([line_no, str(e), row.get('name'), row.get('price')])
+                
+                if len(batch) >= self.batch_size:
+                    self._write_batch(batch, result)
+                    batch = []
+                    if progress:
+                        progress(processed, fraction)
+            if batch:
+                self._write_batch(batch, result)
+            if progress:
+                progress(processed, 1.0)
+        finally:
+            if rejected_file is not None:
+                rejected_file.close()
+                result['rejected_file'] = str(rejected_path)
+            # Новые категории из файла добавляются по ходу импорта
+            self.db.reference.invalidate('categories')
+        return result
+    
+    @staticmethod
+    def _open_rejected_file(path):
+        """Файл отклоненных строк рядом с исходным, а если там нельзя писать - во временном каталоге"""
+        rejected_path = Path(path).with_suffix('.rejected.csv')
+        try:
+            return open(rejected_path, 'w', newline='', encoding='utf-8-sig'), rejected_path
+        except OSError:
+            # Предыдущие пакеты уже записаны в базу - импорт не должен прерываться из-за каталога файла
+            rejected_path = Path(tempfile.gettempdir()) / rejected_path.name
+            return open(rejected_path, 'w', newline='', encoding='utf-8-sig'), rejected_path
+    
+    def _write_batch(self, batch, result):
+        """Записать пакет одной транзакцией: staging-таблица + набор операций над ней"""
+        today = date.today().isoformat()
+        def write_batch(cursor):
+            # Категории пакета сопоставляются одним запросом; новые названия добавляются в справочник
+            names = sorted({row['category'] for _, row in batch if row['category']})
+            categories = {}
+            if names:
+                names_json = json.dumps(names, ensure_ascii=False)
+                cursor.execute(
+                    "INSERT OR IGNORE INTO categories (name) SELECT value FROM json_each(?)",
+                    (names_json,)
+                )
+                cursor.execute(
+                    "SELECT name, id FROM categories WHERE name IN (SELECT value FROM json_each(?))",
+                    (names_json,)
+                )
+                categories = dict(cursor.fetchall())
+            
+            cursor.execute('''
+                CREATE TEMP TABLE IF NOT EXISTS import_batch (
+                    line_no INTEGER PRIMARY KEY,
+                    sku TEXT, name TEXT, category_id INTEGER, manufacturer TEXT,
+                    price REAL, quantity INTEGER, min_quantity INTEGER, description TEXT
+                )
+            ''')
+            cursor.execute("DELETE FROM temp.import_batch")
+            cursor.executemany(
+                "INSERT INTO temp.import_batch VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (line_no, row['sku'], row['name'], categories.get(row['category']), row['manufacturer'],
+                     row['price'], row['quantity'], row['min_quantity'], row['description'])
+                    for line_no, row in batch
+                )
+            )
+            # При повторе артикула в пакете действует последняя строка
+            cursor.execute('''
+                DELETE FROM temp.import_batch
+                WHERE sku IS NOT NULL
+                  AND line_no NOT IN (SELECT MAX(line_no) FROM temp.import_batch WHERE sku IS NOT NULL GROUP BY sku)
+            ''')
+            
+            # Изменение остатков существующих товаров - в журнал движения до перезаписи
+            cursor.execute('''
+                INSERT INTO stock_movements (product_id, movement_date, quantity, source)
+                SELECT p.id, ?, b.quantity - COALESCE(p.quantity, 0), 'import'
+                FROM temp.import_batch b
+                JOIN products p ON p.sku = b.sku
+                WHERE b.quantity IS NOT NULL AND b.quantity != COALESCE(p.quantity, 0)
+            ''', (today,))
+            
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM products")
+            last_id = cursor.fetchone()[0]
+            upserted = cursor.execute('''
+                INSERT INTO products (sku, name, category_id, manufacturer, price, quantity, min_quantity, description)
+                SELECT sku, name, category_id, manufacturer, price, quantity, min_quantity, description
+                FROM temp.import_batch
+                WHERE true
+                ORDER BY line_no
+                ON CONFLICT (sku) WHERE sku IS NOT NULL DO UPDATE SET
+                    name = excluded.name,
+                    category_id = COALESCE(excluded.category_id, products.category_id),
+                    manufacturer = COALESCE(excluded.manufacturer, products.manufacturer),
+                    price = excluded.price,
+                    quantity = COALESCE(excluded.quantity, products.quantity),
+                    min_quantity = COALESCE(excluded.min_quantity, products.min_quantity),
+                    description = COALESCE(excluded.description, products.description),
+                    version = products.version + 1
+                -- Строки без изменений не переписываются и не считаются обновленными
+                WHERE products.name IS NOT excluded.name
+                   OR products.category_id IS NOT COALESCE(excluded.category_id, products.category_id)
+                   OR products.manufacturer IS NOT COALESCE(excluded.manufacturer, products.manufacturer)
+                   OR products.price IS NOT excluded.price
+                   OR products.quantity IS NOT COALESCE(excluded.quantity, products.quantity)
+                   OR products.min_quantity IS NOT COALESCE(excluded.min_quantity, products.min_quantity)
+                   OR products.description IS NOT COALESCE(excluded.description, products.description)
+            ''').rowcount
+            # Пустые количества у новых товаров - как значения по умолчанию в схеме
+            cursor.execute('''
+                UPDATE products SET quantity = COALESCE(quantity, 0), min_quantity = COALESCE(min_quantity, 0)
+                WHERE id > ? AND (quantity IS NULL OR min_quantity IS NULL)
+            ''', (last_id,))
+            cursor.execute('''
+                INSERT INTO stock_movements (product_id, movement_date, quantity, source)
+                SELECT id, ?, quantity, 'import' FROM products WHERE id > ? AND quantity != 0
+            ''', (today, last_id))
+            
+            cursor.execute("SELECT COUNT(*) FROM products WHERE id > ?", (last_id,))
+            inserted = cursor.fetchone()[0]
+            result['inserted'] += inserted
+            result['updated'] += upserted - inserted
+        
+        self.db.write(write_batch)
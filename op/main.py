@@ -1,13 +1,56 @@
+import sys
+import time
+
+# Отсчет запуска начинается до импорта flet - он занимает большую часть старта
+STARTUP_STARTED = time.perf_counter()
+
 import flet as ft
-import sqlite3
 import datetime
 from datetime import date
-import os
 import json
-import webbrowser
-import shutil
+import threading
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from pathlib import Path
 
+from database import (
+    REPORTS, REPORT_PERIODS, TURNOVER_GROUPS,
+    ComputerStoreDB, BackupStore, ProductImporter, iter_cursor_rows,
+)
+
+class StartupTimer:
+    """Замер этапов запуска; разбивка печатается при запуске с флагом --startup-timing"""
+    
+    def __init__(self, started, enabled):
+        self.enabled = enabled
+        self.started = started
+        self.stages = []
+        self._last = started
+    
+    def mark(self, stage):
+        """Закрыть текущий этап запуска"""
+        now = time.perf_counter()
+        self.stages.append((stage, now - self._last))
+        self._last = now
+    
+    def report(self, extra=()):
+        """Напечатать разбивку времени запуска"""
+        if not self.enabled:
+            return
+        # Служебный вывод идет в stderr, как диагностика CLI, и не смешивается с выводом приложения
+        lines = ["Время запуска:"]
+        for stage, seconds in [*self.stages, *extra]:
+            lines.append(f"  {stage}: {seconds * 1000:.0f} мс")
+        lines.append(f"  всего до экрана входа: {(self._last - self.started) * 1000:.0f} мс")
+        print("\n".join(lines), file=sys.stderr, flush=True)
+
+# Флаг принадлежит приложению: убираем его из argv, чтобы он не дошел до Flet
+STARTUP_TIMING_FLAG = "--startup-timing"
+startup_timer = StartupTimer(STARTUP_STARTED, STARTUP_TIMING_FLAG in sys.argv)
+sys.argv = [arg for arg in sys.argv if arg != STARTUP_TIMING_FLAG]
+startup_timer.mark("импорт модулей")
+
 class HelpSystem:
     def __init__(self):
         self.help_url = "https://lolkakot.github.io/help_system/"
@@ -15,6 +58,7 @@ class HelpSystem:
     def open_help(self, page: ft.Page):
         """Открытие справочной системы"""
         try:
+            import webbrowser
             webbrowser.open(self.help_url)
             page.snack_bar = ft.SnackBar(
                 content=ft.Text("Справка открыта в браузере")
@@ -37,133 +81,116 @@ class HelpSystem:
                 ft.Text(self.help_url, style=ft.TextStyle(weight=ft.FontWeight.BOLD)),
             ], tight=True),
             actions=[
-                ft.TextButton("Открыть вручную", on_click=lambda e: webbrowser.open(self.help_url)),
+                ft.TextButton("Открыть вручную", on_click=lambda e: self.open_url()),
                 ft.TextButton("OK", on_click=lambda e: page.close(error_dialog))
             ]
         )
         page.open(error_dialog)
+    
+    def open_url(self):
+        """Открыть адрес справки в браузере"""
+        import webbrowser
+        webbrowser.open(self.help_url)
 
-class ComputerStoreDB:
+class BackgroundTask:
+    """Задача в пуле фоновых потоков; отменяется прерыванием ее текущего SQL-запроса"""
+    
     def __init__(self):
-        self.init_db()
+        self.cancelled = False
+        self.connection = None
+        self.future = None
     
-    def init_db(self):
-        try:
-            conn = sqlite3.connect('computer_store.db')
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    password TEXT NOT NULL,
-                    role TEXT NOT NULL,
-                    full_name TEXT NOT NULL
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS suppliers (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    contact_person TEXT,
-                    phone TEXT,
-                    email TEXT,
-                    address TEXT
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS categories (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS products (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    category_id INTEGER,
-                    manufacturer TEXT,
-                    price REAL NOT NULL,
-                    quantity INTEGER DEFAULT 0,
-                    min_quantity INTEGER DEFAULT 0,
-                    description TEXT,
-                    FOREIGN KEY (category_id) REFERENCES categories (id)
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS income_invoices (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    invoice_number TEXT UNIQUE NOT NULL,
-                    supplier_id INTEGER,
-                    invoice_date DATE NOT NULL,
-                    total_amount REAL DEFAULT 0,
-                    FOREIGN KEY (supplier_id) REFERENCES suppliers (id)
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS income_items (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    invoice_id INTEGER,
-                    product_id INTEGER,
-                    quantity INTEGER NOT NULL,
-                    price REAL NOT NULL,
-                    FOREIGN KEY (invoice_id) REFERENCES income_invoices (id),
-                    FOREIGN KEY (product_id) REFERENCES products (id)
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS outcome_invoices (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    invoice_number TEXT UNIQUE NOT NULL,
-                    customer_name TEXT,
-                    invoice_date DATE NOT NULL,
-                    total_amount REAL DEFAULT 0
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS outcome_items (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    invoice_id INTEGER,
-                    product_id INTEGER,
-                    quantity INTEGER NOT NULL,
-                    price REAL NOT NULL,
-                    FOREIGN KEY (invoice_id) REFERENCES outcome_invoices (id),
-                    FOREIGN KEY (product_id) REFERENCES products (id)
-                )
-            ''')
-            
-            cursor.execute('''
-                INSERT OR IGNORE INTO users (username, password, role, full_name)
-                VALUES (?, ?, ?, ?)
-            ''', ('admin', 'admin', 'admin', 'Администратор'))
-            
-            categories = ['Компьютеры', 'Ноутбуки', 'Комплектующие', 'Периферия', 'Программное обеспечение']
-            for category in categories:
-                cursor.execute('INSERT OR IGNORE INTO categories (name) VALUES (?)', (category,))
-            
-            conn.commit()
-            print("База данных успешно инициализирована")
-            
-        except Exception as e:
-            print(f"Ошибка инициализации базы данных: {e}")
-        finally:
-            conn.close()
+    def cancel(self):
+        """Отменить задачу: выполняемый запрос прерывается, результат отбрасывается"""
+        self.cancelled = True
+        conn = self.connection
+        if conn is not None:
+            conn.interrupt()
+
+class ReportCache:
+    """LRU-кэш готовых отчетов по (отчет, параметры, версия данных)"""
+    
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(report, params, version):
+        return report, tuple(sorted(params.items())), version
+    
+    def get(self, report, params, version):
+        """Отчет из кэша или None (с учетом в счетчиках попаданий и промахов)"""
+        key = self._key(report, params, version)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+    
+    def put(self, report, params, version, value):
+        """Запомнить построенный отчет, вытеснив самые давно использованные"""
+        with self._lock:
+            # Записи с другой версией данных больше никогда не совпадут - удаляем их сразу
+            for stale in [k for k in self._entries if k[2] != version]:
+                del self._entries[stale]
+            self._entries[self._key(report, params, version)] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def get_or_build(self, report, params, version, build):
+        """Вернуть отчет из кэша или построить его через build() и запомнить"""
+        value = self.get(report, params, version)
+        if value is None:
+            value = build()
+            self.put(report, params, version, value)
+        return value
 
 class ComputerStoreApp:
+    # Число фоновых потоков для работы с базой (отчеты, загрузка списков, статистика)
+    DATA_WORKERS = 4
+    # Сколько готовых отчетов держать в кэше
+    REPORT_CACHE_SIZE = 16
+    # Сколько строк отчета показывать в таблице на экране (выгрузка всегда полная)
+    REPORT_TABLE_MAX_ROWS = 1000
+    # Накладные в отчете по продажам подгружаются страницами
+    SALES_PAGE_SIZE = 50
+    # Глубина помесячной динамики в отчете по поставщикам
+    SUPPLIER_TREND_MONTHS = 6
+    # Товары подгружаются страницами; в таблице держится не больше PRODUCTS_MAX_ROWS строк
+    PRODUCTS_PAGE_SIZE = 50
+    PRODUCTS_MAX_ROWS = 500
+    # Расстояние до конца прокрутки (в пикселях), при котором подгружается следующая страница
+    PRODUCTS_PRELOAD_PIXELS = 400
+    # Разделы в порядке пунктов панели навигации
+    SECTIONS = ('main', 'suppliers', 'products', 'income', 'outcome', 'reports', 'backup')
+    # При большем числе изменившихся строк (например, после импорта) раздел перечитывается целиком
+    VIEW_PATCH_MAX_CHANGES = 500
+    
     def __init__(self):
-        self.db = ComputerStoreDB()
+        # Миграции базы выполняются в фоне, пока запускается Flet и строится экран входа
+        self.db = ComputerStoreDB(background_init=True)
+        self.backups = BackupStore(self.db)
+        self.executor = ThreadPoolExecutor(max_workers=self.DATA_WORKERS, thread_name_prefix="db")
+        self.report_cache = ReportCache(self.REPORT_CACHE_SIZE)
+        self.report_cache_status = None
+        self.file_picker = None
         self.current_user = None
         self.help_system = HelpSystem()
         self.is_logged_in = False
+        self.products_view = None
+        self.products_lock = threading.Lock()
+        self.shell_built = False
+        self.section_views = {}
+        self.current_section = None
+        startup_timer.mark("создание приложения")
         
     def main(self, page: ft.Page):
+        startup_timer.mark("запуск Flet")
         self.page = page
         self.page.title = "АИС Компьютерный салон"
         self.page.theme_mode = ft.ThemeMode.DARK
@@ -172,8 +199,34 @@ class ComputerStoreApp:
             "Roboto": "Roboto"
         }
         
-        self.main_content = ft.Column(expand=True, scroll=ft.ScrollMode.ADAPTIVE)
+        self.main_content = ft.Column(
+            expand=True,
+            scroll=ft.ScrollMode.ADAPTIVE,
+            on_scroll_interval=100,
+            on_scroll=self.on_content_scroll
+        )
         
+        # До входа на странице только экран входа; панель навигации строится после входа
+        self.content_container = ft.Container(
+            content=self.main_content,
+            expand=True,
+            padding=20
+        )
+        self.page.add(self.content_container)
+        self.show_login_page()
+        startup_timer.mark("экран входа")
+        if startup_timer.enabled:
+            threading.Thread(target=self.report_startup_timing, daemon=True).start()
+    
+    def report_startup_timing(self):
+        """Напечатать разбивку запуска, когда закончится инициализация базы"""
+        self.db.wait_ready()
+        startup_timer.report([("инициализация БД (параллельно)", self.db.init_seconds)])
+    
+    def build_shell(self):
+        """Построить панель навигации и заголовок при первом входе"""
+        if self.shell_built:
+            return
         self.nav_rail = ft.NavigationRail(
             selected_index=0,
             label_type=ft.NavigationRailLabelType.ALL,
@@ -242,21 +295,28 @@ class ComputerStoreApp:
             ]
         )
         
-        content = ft.Row(
-            [
-                self.nav_rail,
-                ft.VerticalDivider(width=1),
-                ft.Container(
-                    content=self.main_content,
-                    expand=True,
-                    padding=20
-                ),
-            ],
-            expand=True,
+        self.page.controls.clear()
+        self.page.add(
+            self.app_bar,
+            ft.Row(
+                [
+                    self.nav_rail,
+                    ft.VerticalDivider(width=1),
+                    self.content_container,
+                ],
+                expand=True,
+            )
         )
-        
-        self.page.add(self.app_bar, content)
-        self.show_login_page()
+        self.shell_built = True
+    
+    def get_file_picker(self, on_result):
+        """Общий диалог выбора файла: добавляется на страницу один раз, обработчик задается при каждом открытии"""
+        if self.file_picker is None:
+            self.file_picker = ft.FilePicker()
+            self.page.overlay.append(self.file_picker)
+        self.file_picker.on_result = on_result
+        self.page.update()
+        return self.file_picker
     
     def show_snack_bar(self, message):
         """Показать уведомление"""
@@ -272,6 +332,9 @@ class ComputerStoreApp:
     def show_login_page(self):
         """Показать страницу входа"""
         self.is_logged_in = False
+        # Разделы предыдущего пользователя не сохраняются
+        self.section_views.clear()
+        self.current_section = None
         self.main_content.controls.clear()
         
         self.login_field = ft.TextField(label="Логин", prefix_icon=ft.Icons.PERSON)
@@ -317,11 +380,10 @@ class ComputerStoreApp:
             return
         
         try:
-            conn = sqlite3.connect('computer_store.db')
+            conn = self.db.connection()
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM users WHERE username = ? AND password = ?", (username, password))
             user = cursor.fetchone()
-            conn.close()
             
             if user:
                 self.current_user = {
@@ -331,6 +393,8 @@ class ComputerStoreApp:
                     "full_name": user[4]
                 }
                 self.is_logged_in = True
+                self.build_shell()
+                self.main_content.controls.clear()
                 self.show_main_page()
                 self.show_snack_bar(f"Добро пожаловать, {user[4]}!")
             else:
@@ -354,8 +418,6 @@ class ComputerStoreApp:
             return
             
         index = e.control.selected_index
-        self.main_content.controls.clear()
-        
         if index == 0:
             self.show_main_page()
         elif index == 1:
@@ -370,21 +432,69 @@ class ComputerStoreApp:
             self.show_reports()
         elif index == 6:
             self.show_backup()
-        
+    
+    def open_section(self, name, build, refresh=None):
+        """Показать раздел: при первом посещении построить, при возврате - только обновить изменившееся"""
+        view = self.section_views.get(name)
+        created = view is None
+        if created:
+            view = ft.Column()
+            self.section_views[name] = view
+            self.main_content.controls.append(view)
+        # Построенные разделы остаются на странице скрытыми - переключение передает только флаги видимости
+        for other in self.section_views.values():
+            other.visible = other is view
+        self.current_section = name
+        self.nav_rail.selected_index = self.SECTIONS.index(name)
+        if created:
+            build(view)
+        elif refresh is not None:
+            refresh()
         self.page.update()
     
+    def discard_other_sections(self):
+        """Забыть построенные разделы, кроме текущего - они построятся заново при следующем посещении"""
+        for name, view in list(self.section_views.items()):
+            if name != self.current_section:
+                self.main_content.controls.remove(view)
+                del self.section_views[name]
+    
+    @staticmethod
+    def patch_table_rows(rows, changed_ids, fresh, build_row, in_range=None):
+        """Заменить в таблице строки changed_ids на свежие данные fresh
+        
+        Строки отсортированы по data = (name, id); свежие вставляются на свое место,
+        исчезнувшие (удаленные или не подходящие под фильтр) убираются. Остальные строки
+        не трогаются, поэтому page.update() передает только изменения.
+        """
+        changed = set(changed_ids)
+        rows[:] = [row for row in rows if row.data[1] not in changed]
+        keys = [row.data for row in rows]
+        for item in fresh:
+            row = build_row(item)
+            if in_range is None or in_range(row.data):
+                position = bisect_left(keys, row.data)
+                keys.insert(position, row.data)
+                rows.insert(position, row)
+    
     def show_main_page(self):
         """Показать главную страницу"""
-        self.main_content.controls.clear()
-        
-        stats = self.get_stats()
+        self.open_section('main', self.build_main_view, self.refresh_main_view)
+    
+    def build_main_view(self, view):
+        """Построить главную страницу"""
+        # Значения подставляются, когда фоновый запрос статистики завершится
+        self.stat_texts = stat_texts = {
+            key: ft.Text("...", size=24, weight=ft.FontWeight.BOLD)
+            for key in ('total_products', 'low_stock', 'month_income', 'month_outcome')
+        }
         
         stats_row = ft.ResponsiveRow([
             ft.Container(
                 content=ft.Column([
                     ft.Icon(ft.Icons.INVENTORY_2, size=40, color=ft.Colors.BLUE_400),
                     ft.Text("Всего товаров", size=16),
-                    ft.Text(str(stats['total_products']), size=24, weight=ft.FontWeight.BOLD)
+                    stat_texts['total_products']
                 ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
                 padding=20,
                 margin=5,
@@ -396,7 +506,7 @@ class ComputerStoreApp:
                 content=ft.Column([
                     ft.Icon(ft.Icons.WARNING, size=40, color=ft.Colors.ORANGE_400),
                     ft.Text("Товары с низким запасом", size=16),
-                    ft.Text(str(stats['low_stock']), size=24, weight=ft.FontWeight.BOLD)
+                    stat_texts['low_stock']
                 ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
                 padding=20,
                 margin=5,
@@ -408,7 +518,7 @@ class ComputerStoreApp:
                 content=ft.Column([
                     ft.Icon(ft.Icons.INPUT, size=40, color=ft.Colors.GREEN_400),
                     ft.Text("Приход за месяц", size=16),
-                    ft.Text(str(stats['month_income']), size=24, weight=ft.FontWeight.BOLD)
+                    stat_texts['month_income']
                 ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
                 padding=20,
                 margin=5,
@@ -420,7 +530,7 @@ class ComputerStoreApp:
                 content=ft.Column([
                     ft.Icon(ft.Icons.OUTPUT, size=40, color=ft.Colors.RED_400),
                     ft.Text("Расход за месяц", size=16),
-                    ft.Text(str(stats['month_outcome']), size=24, weight=ft.FontWeight.BOLD)
+                    stat_texts['month_outcome']
                 ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
                 padding=20,
                 margin=5,
@@ -430,7 +540,7 @@ class ComputerStoreApp:
             ),
         ])
         
-        self.main_content.controls.extend([
+        view.controls.extend([
             ft.Text("Главная панель", size=28, weight=ft.FontWeight.BOLD),
             ft.Divider(),
             stats_row,
@@ -462,35 +572,21 @@ class ComputerStoreApp:
                 ),
             ])
         ])
-        self.page.update()
+        self.refresh_main_view()
+    
+    def refresh_main_view(self):
+        """Перечитать счетчики главной страницы в фоне"""
+        def show_stats(stats):
+            for key, text in self.stat_texts.items():
+                text.value = str(stats[key])
+            self.page.update()
+        
+        self.run_in_background(self.get_stats, show_stats)
 
     def get_stats(self):
         """Получить статистику для главной страницы"""
         try:
-            conn = sqlite3.connect('computer_store.db')
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT COUNT(*) FROM products")
-            total_products = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM products WHERE quantity <= min_quantity AND min_quantity > 0")
-            low_stock = cursor.fetchone()[0]
-            
-            month_start = date.today().replace(day=1)
-            cursor.execute("SELECT COUNT(*) FROM income_invoices WHERE invoice_date >= ?", (month_start.isoformat(),))
-            month_income = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM outcome_invoices WHERE invoice_date >= ?", (month_start.isoformat(),))
-            month_outcome = cursor.fetchone()[0]
-            
-            conn.close()
-            
-            return {
-                'total_products': total_products,
-                'low_stock': low_stock,
-                'month_income': month_income,
-                'month_outcome': month_outcome
-            }
+            return self.db.dashboard_stats()
         except Exception as e:
             print(f"Ошибка получения статистики: {e}")
             return {
@@ -502,67 +598,112 @@ class ComputerStoreApp:
 
     def show_suppliers(self):
         """Показать раздел поставщиков"""
-        self.main_content.controls.clear()
-        self.main_content.controls.append(ft.Text("Управление поставщиков", size=28, weight=ft.FontWeight.BOLD))
-        self.main_content.controls.append(ft.Divider())
+        self.open_section('suppliers', self.build_suppliers_view, self.refresh_suppliers_view)
+    
+    def build_suppliers_view(self, view):
+        """Построить раздел поставщиков"""
+        view.controls.append(ft.Text("Управление поставщиков", size=28, weight=ft.FontWeight.BOLD))
+        view.controls.append(ft.Divider())
         
         add_button = ft.ElevatedButton("Добавить поставщика", icon=ft.Icons.ADD, on_click=self.add_supplier)
-        self.main_content.controls.append(add_button)
+        view.controls.append(add_button)
+        
+        self.suppliers_table = ft.DataTable(
+            columns=[
+                ft.DataColumn(ft.Text("ID")),
+                ft.DataColumn(ft.Text("Название")),
+                ft.DataColumn(ft.Text("Контактное лицо")),
+                ft.DataColumn(ft.Text("Телефон")),
+                ft.DataColumn(ft.Text("Действия")),
+            ],
+            rows=[]
+        )
+        self.suppliers_table_container = ft.Container(
+            content=self.suppliers_table,
+            margin=ft.margin.only(top=20)
+        )
+        self.suppliers_status = ft.Text("", style=ft.TextStyle(italic=True))
+        view.controls.append(self.suppliers_table_container)
+        view.controls.append(self.suppliers_status)
         
         try:
-            suppliers = self.get_suppliers()
-            if suppliers:
-                data_table = ft.DataTable(
-                    columns=[
-                        ft.DataColumn(ft.Text("ID")),
-                        ft.DataColumn(ft.Text("Название")),
-                        ft.DataColumn(ft.Text("Контактное лицо")),
-                        ft.DataColumn(ft.Text("Телефон")),
-                        ft.DataColumn(ft.Text("Действия")),
-                    ],
-                    rows=[]
-                )
-                
-                for supplier in suppliers:
-                    data_table.rows.append(
-                        ft.DataRow(
-                            cells=[
-                                ft.DataCell(ft.Text(str(supplier[0]))),
-                                ft.DataCell(ft.Text(supplier[1])),
-                                ft.DataCell(ft.Text(supplier[2] or "")),
-                                ft.DataCell(ft.Text(supplier[3] or "")),
-                                ft.DataCell(ft.Row([
-                                    ft.IconButton(ft.Icons.EDIT, on_click=lambda e, sid=supplier[0]: self.edit_supplier(sid)),
-                                    ft.IconButton(ft.Icons.DELETE, on_click=lambda e, sid=supplier[0]: self.delete_supplier(sid)),
-                                ])),
-                            ]
-                        )
-                    )
-                
-                self.main_content.controls.append(ft.Container(
-                    content=data_table,
-                    margin=ft.margin.only(top=20)
-                ))
+            self.suppliers_seq = self.db.change_seq()
+            self.suppliers_table.rows = [self.build_supplier_row(supplier) for supplier in self.get_suppliers()]
+            self.update_suppliers_status()
+        except Exception as e:
+            self.update_suppliers_status(e)
+    
+    def build_supplier_row(self, supplier):
+        """Строка таблицы поставщиков; в data хранится ключ сортировки (name, id)"""
+        return ft.DataRow(
+            cells=[
+                ft.DataCell(ft.Text(str(supplier[0]))),
+                ft.DataCell(ft.Text(supplier[1])),
+                ft.DataCell(ft.Text(supplier[2] or "")),
+                ft.DataCell(ft.Text(supplier[3] or "")),
+                ft.DataCell(ft.Row([
+                    ft.IconButton(ft.Icons.EDIT, on_click=lambda e, sid=supplier[0]: self.edit_supplier(sid)),
+                    ft.IconButton(ft.Icons.DELETE, on_click=lambda e, sid=supplier[0]: self.delete_supplier(sid)),
+                ])),
+            ],
+            data=(supplier[1], supplier[0])
+        )
+    
+    def update_suppliers_status(self, error=None):
+        """Показать таблицу поставщиков, надпись о пустом списке или ошибку загрузки"""
+        has_rows = bool(self.suppliers_table.rows)
+        self.suppliers_table_container.visible = has_rows
+        if error is not None:
+            self.suppliers_status.value = f"Ошибка загрузки поставщиков: {error}"
+            self.suppliers_status.color = ft.Colors.RED
+        else:
+            self.suppliers_status.value = "" if has_rows else "Нет поставщиков"
+            self.suppliers_status.color = None
+    
+    def refresh_suppliers_view(self):
+        """Обновить в таблице поставщиков только строки, изменившиеся с прошлого показа"""
+        try:
+            ids, seq = self.db.changes_since('suppliers', self.suppliers_seq)
+            if not ids and ids is not None:
+                return
+            # None - журнал изменений откатился (восстановление из копии): перечитываем целиком
+            if ids is None or len(ids) > self.VIEW_PATCH_MAX_CHANGES:
+                self.suppliers_seq = self.db.change_seq()
+                self.suppliers_table.rows = [self.build_supplier_row(supplier) for supplier in self.get_suppliers()]
             else:
-                self.main_content.controls.append(ft.Text("Нет поставщиков", style=ft.TextStyle(italic=True)))
+                self.patch_table_rows(self.suppliers_table.rows, ids, self.get_suppliers_by_ids(ids), self.build_supplier_row)
+                self.suppliers_seq = seq
+            self.update_suppliers_status()
         except Exception as e:
-            self.main_content.controls.append(ft.Text(f"Ошибка загрузки поставщиков: {e}", color=ft.Colors.RED))
-        
+            self.update_suppliers_status(e)
+    
+    def patch_supplier(self, supplier_id, supplier=None):
+        """Поправить одну строку в таблице поставщиков: supplier - новая строка, None - удаление"""
+        if 'suppliers' not in self.section_views:
+            return
+        self.patch_table_rows(self.suppliers_table.rows, [supplier_id], [supplier] if supplier else [], self.build_supplier_row)
+        self.update_suppliers_status()
         self.page.update()
     
     def get_suppliers(self):
         """Получить список поставщиков"""
         try:
-            conn = sqlite3.connect('computer_store.db')
+            conn = self.db.connection()
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM suppliers ORDER BY name")
+            cursor.execute("SELECT * FROM suppliers ORDER BY name, id")
             suppliers = cursor.fetchall()
-            conn.close()
             return suppliers
         except Exception as e:
             print(f"Ошибка получения поставщиков: {e}")
             return []
     
+    def get_suppliers_by_ids(self, supplier_ids):
+        """Получить поставщиков по списку id"""
+        placeholders = ", ".join("?" * len(supplier_ids))
+        cursor = self.db.connection().cursor()
+        cursor.execute(f"SELECT * FROM suppliers WHERE id IN ({placeholders})", list(supplier_ids))
+        return cursor.fetchall()
+    
     def add_supplier(self, e):
         """Добавить поставщика"""
         def save_supplier(e):
@@ -577,17 +718,19 @@ class ComputerStoreApp:
                 return
             
             try:
-                conn = sqlite3.connect('computer_store.db')
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO suppliers (name, contact_person, phone, email, address)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (name, contact, phone, email, address))
-                conn.commit()
-                conn.close()
+                def insert_supplier(cursor):
+                    cursor.execute('''
+                        INSERT INTO suppliers (name, contact_person, phone, email, address)
+                        VALUES (?, ?, ?, ?, ?)
+                        RETURNING *
+                    ''', (name, contact, phone, email, address))
+                    return cursor.fetchone()
+                
+                supplier = self.db.write(insert_supplier)
+                self.db.reference.invalidate('suppliers')
                 
                 self.page.close(dialog)
-                self.show_suppliers()
+                self.patch_supplier(supplier[0], supplier)
                 self.show_snack_bar("Поставщик добавлен")
             except Exception as ex:
                 self.show_snack_bar(f"Ошибка добавления поставщика: {ex}")
@@ -621,17 +764,24 @@ class ComputerStoreApp:
     def edit_supplier(self, supplier_id):
         """Редактировать поставщика"""
         try:
-            conn = sqlite3.connect('computer_store.db')
+            conn = self.db.connection()
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM suppliers WHERE id = ?", (supplier_id,))
             supplier = cursor.fetchone()
-            conn.close()
             
             if not supplier:
                 self.show_snack_bar("Поставщик не найден")
                 return
             
+            def fill_fields(row):
+                name_field.value = row[1]
+                contact_field.value = row[2] or ""
+                phone_field.value = row[3] or ""
+                email_field.value = row[4] or ""
+                address_field.value = row[5] or ""
+            
             def save_edit(e):
+                nonlocal supplier
                 name = name_field.value
                 contact = contact_field.value
                 phone = phone_field.value
@@ -643,27 +793,43 @@ class ComputerStoreApp:
                     return
                 
                 try:
-                    conn = sqlite3.connect('computer_store.db')
-                    cursor = conn.cursor()
-                    cursor.execute('''
-                        UPDATE suppliers 
-                        SET name=?, contact_person=?, phone=?, email=?, address=?
-                        WHERE id=?
-                    ''', (name, contact, phone, email, address, supplier_id))
-                    conn.commit()
-                    conn.close()
+                    # Сохраняется, только если строка не менялась с момента открытия диалога (version - последний столбец)
+                    def update_supplier(cursor):
+                        cursor.execute('''
+                            UPDATE suppliers 
+                            SET name=?, contact_person=?, phone=?, email=?, address=?, version = version + 1
+                            WHERE id=? AND version=?
+                            RETURNING *
+                        ''', (name, contact, phone, email, address, supplier_id, supplier[6]))
+                        return cursor.fetchone()
+                    
+                    updated = self.db.write(update_supplier)
+                    if updated is None:
+                        # Конфликт: перечитываем только эту строку и показываем актуальные данные
+                        current = self.get_suppliers_by_ids([supplier_id])
+                        self.patch_supplier(supplier_id, current[0] if current else None)
+                        if not current:
+                            self.page.close(dialog)
+                            self.show_snack_bar("Поставщик уже удален на другом терминале")
+                            return
+                        supplier = current[0]
+                        fill_fields(supplier)
+                        self.show_snack_bar("Поставщик изменен на другом терминале: показаны новые данные, внесите правку заново")
+                        return
+                    self.db.reference.invalidate('suppliers')
                     
                     self.page.close(dialog)
-                    self.show_suppliers()
+                    self.patch_supplier(supplier_id, updated)
                     self.show_snack_bar("Поставщик обновлен")
                 except Exception as ex:
                     self.show_snack_bar(f"Ошибка обновления поставщика: {ex}")
             
-            name_field = ft.TextField(label="Название*", width=400, value=supplier[1])
-            contact_field = ft.TextField(label="Контактное лицо", width=400, value=supplier[2] or "")
-            phone_field = ft.TextField(label="Телефон", width=400, value=supplier[3] or "")
-            email_field = ft.TextField(label="Email", width=400, value=supplier[4] or "")
-            address_field = ft.TextField(label="Адрес", multiline=True, width=400, value=supplier[5] or "")
+            name_field = ft.TextField(label="Название*", width=400)
+            contact_field = ft.TextField(label="Контактное лицо", width=400)
+            phone_field = ft.TextField(label="Телефон", width=400)
+            email_field = ft.TextField(label="Email", width=400)
+            address_field = ft.TextField(label="Адрес", multiline=True, width=400)
+            fill_fields(supplier)
             
             dialog = ft.AlertDialog(
                 title=ft.Text("Редактировать поставщика"),
@@ -691,14 +857,11 @@ class ComputerStoreApp:
         """Удалить поставщика"""
         def confirm_delete(e):
             try:
-                conn = sqlite3.connect('computer_store.db')
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM suppliers WHERE id = ?", (supplier_id,))
-                conn.commit()
-                conn.close()
+                self.db.write(lambda cursor: cursor.execute("DELETE FROM suppliers WHERE id = ?", (supplier_id,)))
+                self.db.reference.invalidate('suppliers')
                 
                 self.page.close(dialog)
-                self.show_suppliers()
+                self.patch_supplier(supplier_id)
                 self.show_snack_bar("Поставщик удален")
             except Exception as ex:
                 self.show_snack_bar(f"Ошибка удаления поставщика: {ex}")
@@ -715,100 +878,270 @@ class ComputerStoreApp:
     
     def show_products(self):
         """Показать раздел товаров"""
-        self.main_content.controls.clear()
-        self.main_content.controls.append(ft.Text("Управление товарами", size=28, weight=ft.FontWeight.BOLD))
-        self.main_content.controls.append(ft.Divider())
+        self.open_section('products', self.build_products_view, lambda: self.executor.submit(self.refresh_products_view))
+    
+    def build_products_view(self, view):
+        """Построить раздел товаров; первая страница загружается в фоне"""
+        view.controls.append(ft.Text("Управление товарами", size=28, weight=ft.FontWeight.BOLD))
+        view.controls.append(ft.Divider())
         
         add_button = ft.ElevatedButton("Добавить товар", icon=ft.Icons.ADD, on_click=self.add_product)
-        self.main_content.controls.append(add_button)
+        import_button = ft.ElevatedButton("Импорт из файла", icon=ft.Icons.UPLOAD_FILE, on_click=self.import_products)
+        view.controls.append(ft.Row([add_button, import_button]))
+        
+        self.products_categories = self.get_categories_dict()
+        self.products_has_more = True
+        self.products_filters = {}
+        
+        self.products_search_field = ft.TextField(
+            label="Поиск по названию, производителю, описанию",
+            prefix_icon=ft.Icons.SEARCH,
+            expand=True,
+            on_change=self.apply_products_filters
+        )
+        category_filter_options = [ft.dropdown.Option(key="", text="Все категории")]
+        category_filter_options.extend(
+            ft.dropdown.Option(key=str(cat_id), text=cat_name)
+            for cat_id, cat_name in self.products_categories.items()
+        )
+        self.products_category_filter = ft.Dropdown(
+            label="Категория",
+            width=220,
+            options=category_filter_options,
+            value="",
+            on_change=self.apply_products_filters
+        )
+        self.products_price_min = ft.TextField(label="Цена от", width=120, on_change=self.apply_products_filters)
+        self.products_price_max = ft.TextField(label="Цена до", width=120, on_change=self.apply_products_filters)
+        self.products_low_stock_filter = ft.Checkbox(label="Низкий запас", on_change=self.apply_products_filters)
+        view.controls.append(
+            ft.Container(
+                content=ft.Row([
+                    self.products_search_field,
+                    self.products_category_filter,
+                    self.products_price_min,
+                    self.products_price_max,
+                    self.products_low_stock_filter,
+                ]),
+                margin=ft.margin.only(top=20)
+            )
+        )
+        self.products_table = ft.DataTable(
+            columns=[
+                ft.DataColumn(ft.Text("ID")),
+                ft.DataColumn(ft.Text("Название")),
+                ft.DataColumn(ft.Text("Категория")),
+                ft.DataColumn(ft.Text("Производитель")),
+                ft.DataColumn(ft.Text("Цена")),
+                ft.DataColumn(ft.Text("Остаток")),
+                ft.DataColumn(ft.Text("Действия")),
+            ],
+            rows=[]
+        )
+        self.products_prev_button = ft.TextButton(
+            "Показать предыдущие",
+            icon=ft.Icons.EXPAND_LESS,
+            visible=False,
+            on_click=lambda _: self.load_products_page(backward=True)
+        )
+        self.products_next_button = ft.TextButton(
+            "Загрузить еще",
+            icon=ft.Icons.EXPAND_MORE,
+            visible=False,
+            on_click=lambda _: self.load_products_page()
+        )
+        self.products_status = ft.Text("", style=ft.TextStyle(italic=True))
+        self.products_view = ft.Container(
+            content=ft.Column([
+                self.products_prev_button,
+                self.products_table,
+                self.products_next_button,
+                self.products_status,
+            ]),
+            margin=ft.margin.only(top=20)
+        )
+        view.controls.append(self.products_view)
         
+        self.products_status.value = "Загрузка..."
+        self.executor.submit(self.load_products_page)
+    
+    def on_content_scroll(self, e: ft.OnScrollEvent):
+        """Подгрузка следующей страницы товаров при прокрутке к концу списка"""
+        if self.current_section != 'products':
+            return
+        if e.max_scroll_extent - e.pixels < self.PRODUCTS_PRELOAD_PIXELS:
+            self.load_products_page()
+    
+    def build_product_row(self, product):
+        """Строка таблицы товаров; в data хранится ключ сортировки (name, id)"""
+        category_name = self.products_categories.get(product[2], "Не указана")
+        return ft.DataRow(
+            cells=[
+                ft.DataCell(ft.Text(str(product[0]))),
+                ft.DataCell(ft.Text(product[1])),
+                ft.DataCell(ft.Text(category_name)),
+                ft.DataCell(ft.Text(product[3] or "")),
+                ft.DataCell(ft.Text(f"{product[4]:.2f} руб.")),
+                ft.DataCell(ft.Text(str(product[5]))),
+                ft.DataCell(ft.Row([
+                    ft.IconButton(ft.Icons.EDIT, on_click=lambda e, pid=product[0]: self.edit_product(pid)),
+                    ft.IconButton(ft.Icons.DELETE, on_click=lambda e, pid=product[0]: self.delete_product(pid)),
+                ])),
+            ],
+            data=(product[1], product[0])
+        )
+    
+    def apply_products_filters(self, e):
+        """Перечитать список товаров с первой страницы по текущим условиям поиска"""
+        filters = {}
+        if self.products_search_field.value and self.products_search_field.value.strip():
+            filters['query'] = self.products_search_field.value
+        if self.products_category_filter.value:
+            filters['category_id'] = int(self.products_category_filter.value)
         try:
-            products = self.get_products()
-            if products:
-                data_table = ft.DataTable(
-                    columns=[
-                        ft.DataColumn(ft.Text("ID")),
-                        ft.DataColumn(ft.Text("Название")),
-                        ft.DataColumn(ft.Text("Категория")),
-                        ft.DataColumn(ft.Text("Производитель")),
-                        ft.DataColumn(ft.Text("Цена")),
-                        ft.DataColumn(ft.Text("Остаток")),
-                        ft.DataColumn(ft.Text("Действия")),
-                    ],
-                    rows=[]
-                )
-                
-                categories = self.get_categories_dict()
-                
-                for product in products:
-                    category_name = categories.get(product[2], "Не указана")
-                    data_table.rows.append(
-                        ft.DataRow(
-                            cells=[
-                                ft.DataCell(ft.Text(str(product[0]))),
-                                ft.DataCell(ft.Text(product[1])),
-                                ft.DataCell(ft.Text(category_name)),
-                                ft.DataCell(ft.Text(product[3] or "")),
-                                ft.DataCell(ft.Text(f"{product[4]:.2f} руб.")),
-                                ft.DataCell(ft.Text(str(product[5]))),
-                                ft.DataCell(ft.Row([
-                                    ft.IconButton(ft.Icons.EDIT, on_click=lambda e, pid=product[0]: self.edit_product(pid)),
-                                    ft.IconButton(ft.Icons.DELETE, on_click=lambda e, pid=product[0]: self.delete_product(pid)),
-                                ])),
-                            ]
-                        )
-                    )
-                
-                self.main_content.controls.append(ft.Container(
-                    content=data_table,
-                    margin=ft.margin.only(top=20)
-                ))
+            if self.products_price_min.value:
+                filters['price_min'] = float(self.products_price_min.value)
+            if self.products_price_max.value:
+                filters['price_max'] = float(self.products_price_max.value)
+        except ValueError:
+            self.products_status.value = "Некорректный диапазон цен"
+            self.page.update()
+            return
+        if self.products_low_stock_filter.value:
+            filters['low_stock'] = True
+        
+        self.products_filters = filters
+        self.executor.submit(self.load_products_page, reset=True)
+    
+    def load_products_page(self, backward=False, reset=False):
+        """Догрузить страницу товаров после последней (или перед первой) показанной строки"""
+        # Обработчики прокрутки приходят из нескольких потоков - вторую загрузку просто пропускаем,
+        # а смена фильтров дожидается текущей загрузки
+        if not self.products_lock.acquire(blocking=reset):
+            return
+        try:
+            self.products_categories = self.get_categories_dict()
+            rows = self.products_table.rows
+            if reset:
+                rows.clear()
+                self.products_has_more = True
+                self.products_prev_button.visible = False
+            if backward:
+                if not rows:
+                    return
+                products = self.get_products_page(before=rows[0].data, filters=self.products_filters)
+                rows[:0] = [self.build_product_row(product) for product in products]
+                self.products_prev_button.visible = len(products) == self.PRODUCTS_PAGE_SIZE
+                overflow = len(rows) - self.PRODUCTS_MAX_ROWS
+                if overflow > 0:
+                    del rows[-overflow:]
+                    self.products_has_more = True
             else:
-                self.main_content.controls.append(ft.Text("Нет товаров", style=ft.TextStyle(italic=True)))
+                if not self.products_has_more:
+                    return
+                if not rows:
+                    # Номер изменений запоминается до чтения - правки во время загрузки не потеряются
+                    self.products_seq = self.db.change_seq()
+                products = self.get_products_page(after=rows[-1].data if rows else None, filters=self.products_filters)
+                rows.extend(self.build_product_row(product) for product in products)
+                self.products_has_more = len(products) == self.PRODUCTS_PAGE_SIZE
+                overflow = len(rows) - self.PRODUCTS_MAX_ROWS
+                if overflow > 0:
+                    del rows[:overflow]
+                    self.products_prev_button.visible = True
+            
+            self.update_products_status()
         except Exception as e:
-            self.main_content.controls.append(ft.Text(f"Ошибка загрузки товаров: {e}", color=ft.Colors.RED))
+            self.products_status.value = f"Ошибка загрузки товаров: {e}"
+        finally:
+            self.products_lock.release()
+        self.page.update()
+    
+    def update_products_status(self):
+        """Кнопка догрузки и надпись под таблицей товаров"""
+        self.products_next_button.visible = self.products_has_more
+        if self.products_table.rows:
+            self.products_status.value = ""
+        else:
+            self.products_status.value = "Ничего не найдено" if self.products_filters else "Нет товаров"
+    
+    def refresh_products_view(self):
+        """Обновить в показанном окне товаров только строки, изменившиеся с прошлого показа"""
+        try:
+            ids, seq = self.db.changes_since('products', self.products_seq)
+        except Exception as e:
+            print(f"Ошибка чтения журнала изменений: {e}")
+            return
+        if not ids and ids is not None:
+            return
+        # None - журнал изменений откатился (восстановление из копии): перечитываем целиком
+        if ids is None or len(ids) > self.VIEW_PATCH_MAX_CHANGES:
+            self.load_products_page(reset=True)
+            return
+        self.patch_products(ids, seq=seq)
+    
+    def patch_products(self, product_ids, products=None, seq=None):
+        """Поправить в списке товаров строки product_ids
         
+        products - уже прочитанные строки (например, из RETURNING после сохранения); при
+        включенных фильтрах или если строки не переданы, они перечитываются с учетом фильтров.
+        """
+        if 'products' not in self.section_views:
+            return
+        with self.products_lock:
+            try:
+                self.products_categories = self.get_categories_dict()
+                rows = self.products_table.rows
+                first = rows[0].data if rows else None
+                last = rows[-1].data if rows else None
+                
+                def in_window(key):
+                    # Строки вне загруженного окна появятся сами при прокрутке
+                    if self.products_prev_button.visible and (first is None or key < first):
+                        return False
+                    return not self.products_has_more or (last is not None and key <= last)
+                
+                if products is None or (products and self.products_filters):
+                    products = self.get_products_by_ids(product_ids, self.products_filters)
+                self.patch_table_rows(rows, product_ids, products, self.build_product_row, in_window)
+                overflow = len(rows) - self.PRODUCTS_MAX_ROWS
+                if overflow > 0:
+                    del rows[-overflow:]
+                    self.products_has_more = True
+                if seq is not None:
+                    self.products_seq = seq
+                self.update_products_status()
+            except Exception as e:
+                self.products_status.value = f"Ошибка загрузки товаров: {e}"
         self.page.update()
     
     def get_categories_dict(self):
-        """Получить словарь категорий - ИСПРАВЛЕННАЯ ВЕРСИЯ"""
+        """Получить словарь категорий из кэша справочников"""
         try:
-            conn = sqlite3.connect('computer_store.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, name FROM categories")
-            categories = cursor.fetchall()
-            conn.close()
-            return {cat[0]: cat[1] for cat in categories}
+            return self.db.reference.categories()
         except Exception as e:
             print(f"Ошибка получения категорий: {e}")
             return {}
     
     def get_categories_list(self):
-        """Получить список категорий для выпадающего списка - ИСПРАВЛЕННАЯ ВЕРСИЯ"""
+        """Получить список категорий для выпадающего списка из кэша справочников"""
         try:
-            conn = sqlite3.connect('computer_store.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, name FROM categories")
-            categories = cursor.fetchall()
-            conn.close()
-            
             options = [ft.dropdown.Option(key="", text="Не выбрано")]
-            for cat_id, cat_name in categories:
+            for cat_id, cat_name in self.db.reference.categories().items():
                 options.append(ft.dropdown.Option(key=str(cat_id), text=cat_name))
             return options
         except Exception as e:
             print(f"Ошибка получения списка категорий: {e}")
             return [ft.dropdown.Option(key="", text="Не выбрано")]
     
-    def get_products(self):
-        """Получить список товаров"""
+    def get_products_by_ids(self, product_ids, filters=None):
+        """Получить товары по списку id, оставив только подходящие под фильтры"""
+        return self.db.products_by_ids(product_ids, filters)
+    
+    def get_products_page(self, after=None, before=None, limit=None, filters=None):
+        """Получить страницу товаров по ключу (name, id)"""
         try:
-            conn = sqlite3.connect('computer_store.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM products ORDER BY name")
-            products = cursor.fetchall()
-            conn.close()
-            return products
+            return self.db.products_page(after, before, limit or self.PRODUCTS_PAGE_SIZE, filters)
         except Exception as e:
             print(f"Ошибка получения товаров: {e}")
             return []
@@ -837,17 +1170,20 @@ class ComputerStoreApp:
                 return
             
             try:
-                conn = sqlite3.connect('computer_store.db')
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO products (name, category_id, manufacturer, price, quantity, min_quantity, description)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (name, category, manufacturer, price, quantity, min_quantity, description))
-                conn.commit()
-                conn.close()
+                def insert_product(cursor):
+                    cursor.execute('''
+                        INSERT INTO products (name, category_id, manufacturer, price, quantity, min_quantity, description)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        RETURNING *
+                    ''', (name, category, manufacturer, price, quantity, min_quantity, description))
+                    product = cursor.fetchone()
+                    self.db.add_stock_movement(cursor, product[0], quantity, 'opening')
+                    return product
+                
+                product = self.db.write(insert_product)
                 
                 self.page.close(dialog)
-                self.show_products()
+                self.patch_products([product[0]], [product])
                 self.show_snack_bar("Товар добавлен")
             except Exception as ex:
                 self.show_snack_bar(f"Ошибка добавления товара: {ex}")
@@ -885,20 +1221,84 @@ class ComputerStoreApp:
         )
         self.page.open(dialog)
     
+    def import_products(self, e):
+        """Импорт каталога товаров из CSV/XLSX с индикатором хода"""
+        def run_import(path):
+            def on_progress(processed, fraction):
+                progress_bar.value = fraction
+                progress_text.value = f"Обработано строк: {processed}"
+                self.page.update()
+            
+            try:
+                result = ProductImporter(self.db).run(path, progress=on_progress)
+            except Exception as ex:
+                self.page.close(progress_dialog)
+                self.show_snack_bar(f"Ошибка импорта: {ex}")
+                return
+            
+            self.page.close(progress_dialog)
+            summary = [
+                ft.Text(f"Добавлено: {result['inserted']}"),
+                ft.Text(f"Обновлено: {result['updated']}"),
+                ft.Text(f"Отклонено: {result['rejected']}", color=ft.Colors.ORANGE_400 if result['rejected'] else None),
+            ]
+            if result['rejected_file']:
+                summary.append(ft.Text(f"Отклоненные строки: {result['rejected_file']}", selectable=True))
+            for line_no, reason in result['errors'][:20]:
+                summary.append(ft.Text(f"Строка {line_no}: {reason}", size=12))
+            result_dialog = ft.AlertDialog(
+                title=ft.Text("Импорт завершен"),
+                content=ft.Column(summary, tight=True, scroll=ft.ScrollMode.ADAPTIVE),
+                actions=[ft.TextButton("OK", on_click=lambda e: self.page.close(result_dialog))]
+            )
+            self.page.open(result_dialog)
+            # Пользователь мог уйти в другой раздел, пока шел импорт - список товаров обновится при возврате
+            if self.current_section == 'products':
+                self.refresh_products_view()
+        
+        def file_selected(e):
+            if not e.files:
+                return
+            path = e.files[0].path
+            self.page.open(progress_dialog)
+            self.executor.submit(run_import, path)
+        
+        progress_bar = ft.ProgressBar(width=400)
+        progress_text = ft.Text("Чтение файла...")
+        progress_dialog = ft.AlertDialog(
+            title=ft.Text("Импорт товаров"),
+            content=ft.Column([progress_bar, progress_text], tight=True),
+            modal=True
+        )
+        
+        self.get_file_picker(file_selected).pick_files(
+            allowed_extensions=["csv", "xlsx"],
+            dialog_title="Выберите файл каталога (CSV или XLSX)"
+        )
+    
     def edit_product(self, product_id):
         """Редактировать товар"""
         try:
-            conn = sqlite3.connect('computer_store.db')
+            conn = self.db.connection()
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM products WHERE id = ?", (product_id,))
             product = cursor.fetchone()
-            conn.close()
             
             if not product:
                 self.show_snack_bar("Товар не найден")
                 return
             
+            def fill_fields(row):
+                name_field.value = row[1]
+                category_field.value = str(row[2]) if row[2] else ""
+                manufacturer_field.value = row[3] or ""
+                price_field.value = str(row[4])
+                quantity_field.value = str(row[5])
+                min_quantity_field.value = str(row[6])
+                description_field.value = row[7] or ""
+            
             def save_edit(e):
+                nonlocal product
                 name = name_field.value
                 category = category_field.value
                 manufacturer = manufacturer_field.value
@@ -920,18 +1320,37 @@ class ComputerStoreApp:
                     return
                 
                 try:
-                    conn = sqlite3.connect('computer_store.db')
-                    cursor = conn.cursor()
-                    cursor.execute('''
-                        UPDATE products 
-                        SET name=?, category_id=?, manufacturer=?, price=?, quantity=?, min_quantity=?, description=?
-                        WHERE id=?
-                    ''', (name, category, manufacturer, price, quantity, min_quantity, description, product_id))
-                    conn.commit()
-                    conn.close()
+                    # Сохраняется, только если строка не менялась с момента открытия диалога (version - последний столбец);
+                    # тогда и остаток в базе тот же, что был показан
+                    def update_product(cursor):
+                        cursor.execute('''
+                            UPDATE products 
+                            SET name=?, category_id=?, manufacturer=?, price=?, quantity=?, min_quantity=?, description=?,
+                                version = version + 1
+                            WHERE id=? AND version=?
+                            RETURNING *
+                        ''', (name, category, manufacturer, price, quantity, min_quantity, description, product_id, product[9]))
+                        updated = cursor.fetchone()
+                        if updated is not None:
+                            self.db.add_stock_movement(cursor, product_id, quantity - (product[5] or 0), 'adjustment')
+                        return updated
+                    
+                    updated = self.db.write(update_product)
+                    if updated is None:
+                        # Конфликт: перечитываем только эту строку и показываем актуальные данные
+                        current = self.get_products_by_ids([product_id])
+                        self.patch_products([product_id], current)
+                        if not current:
+                            self.page.close(dialog)
+                            self.show_snack_bar("Товар уже удален на другом терминале")
+                            return
+                        product = current[0]
+                        fill_fields(product)
+                        self.show_snack_bar("Товар изменен на другом терминале: показаны новые данные, внесите правку заново")
+                        return
                     
                     self.page.close(dialog)
-                    self.show_products()
+                    self.patch_products([product_id], [updated])
                     self.show_snack_bar("Товар обновлен")
                 except Exception as ex:
                     self.show_snack_bar(f"Ошибка обновления товара: {ex}")
@@ -939,18 +1358,18 @@ class ComputerStoreApp:
             # Используем исправленный метод для получения категорий
             category_options = self.get_categories_list()
             
-            name_field = ft.TextField(label="Название*", width=400, value=product[1])
+            name_field = ft.TextField(label="Название*", width=400)
             category_field = ft.Dropdown(
                 label="Категория", 
                 width=400, 
-                options=category_options,
-                value=str(product[2]) if product[2] else ""
+                options=category_options
             )
-            manufacturer_field = ft.TextField(label="Производитель", width=400, value=product[3] or "")
-            price_field = ft.TextField(label="Цена*", width=400, value=str(product[4]))
-            quantity_field = ft.TextField(label="Количество", width=400, value=str(product[5]))
-            min_quantity_field = ft.TextField(label="Мин. количество", width=400, value=str(product[6]))
-            description_field = ft.TextField(label="Описание", multiline=True, width=400, value=product[7] or "")
+            manufacturer_field = ft.TextField(label="Производитель", width=400)
+            price_field = ft.TextField(label="Цена*", width=400)
+            quantity_field = ft.TextField(label="Количество", width=400)
+            min_quantity_field = ft.TextField(label="Мин. количество", width=400)
+            description_field = ft.TextField(label="Описание", multiline=True, width=400)
+            fill_fields(product)
             
             dialog = ft.AlertDialog(
                 title=ft.Text("Редактировать товар"),
@@ -980,14 +1399,10 @@ class ComputerStoreApp:
         """Удалить товар"""
         def confirm_delete(e):
             try:
-                conn = sqlite3.connect('computer_store.db')
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM products WHERE id = ?", (product_id,))
-                conn.commit()
-                conn.close()
+                self.db.write(lambda cursor: cursor.execute("DELETE FROM products WHERE id = ?", (product_id,)))
                 
                 self.page.close(dialog)
-                self.show_products()
+                self.patch_products([product_id], [])
                 self.show_snack_bar("Товар удален")
             except Exception as ex:
                 self.show_snack_bar(f"Ошибка удаления товара: {ex}")
@@ -1004,11 +1419,14 @@ class ComputerStoreApp:
     
     def show_income(self):
         """Показать раздел прихода с функциональными кнопками"""
-        self.main_content.controls.clear()
-        self.main_content.controls.append(ft.Text("Учет прихода товаров", size=28, weight=ft.FontWeight.BOLD))
-        self.main_content.controls.append(ft.Divider())
+        self.open_section('income', self.build_income_view)
+    
+    def build_income_view(self, view):
+        """Построить раздел прихода"""
+        view.controls.append(ft.Text("Учет прихода товаров", size=28, weight=ft.FontWeight.BOLD))
+        view.controls.append(ft.Divider())
         
-        self.main_content.controls.append(
+        view.controls.append(
             ft.Container(
                 content=ft.Column([
                     ft.Text("Функционал учета прихода", size=20),
@@ -1022,40 +1440,196 @@ class ComputerStoreApp:
                 border_radius=10
             )
         )
-        self.page.update()
+    
+    def create_invoice_lines_editor(self):
+        """Редактор позиций накладной: поиск товара, ручной ввод и вставка списком"""
+        lines = []
+        found_products = {}
+        
+        lines_table = ft.DataTable(
+            columns=[
+                ft.DataColumn(ft.Text("ID")),
+                ft.DataColumn(ft.Text("Товар")),
+                ft.DataColumn(ft.Text("Кол-во")),
+                ft.DataColumn(ft.Text("Цена")),
+                ft.DataColumn(ft.Text("")),
+            ],
+            rows=[]
+        )
+        total_text = ft.Text("Позиций: 0, сумма: 0.00 руб.", weight=ft.FontWeight.BOLD)
+        
+        def refresh_lines():
+            lines_table.rows = [
+                ft.DataRow(
+                    cells=[
+                        ft.DataCell(ft.Text(str(line['product_id']))),
+                        ft.DataCell(ft.Text(line['name'])),
+                        ft.DataCell(ft.Text(str(line['quantity']))),
+                        ft.DataCell(ft.Text(f"{line['price']:.2f}")),
+                        ft.DataCell(ft.IconButton(ft.Icons.DELETE, on_click=lambda e, i=index: remove_line(i))),
+                    ]
+                )
+                for index, line in enumerate(lines)
+            ]
+            total = sum(line['quantity'] * line['price'] for line in lines)
+            total_text.value = f"Позиций: {len(lines)}, сумма: {total:.2f} руб."
+            self.page.update()
+        
+        def remove_line(index):
+            del lines[index]
+            refresh_lines()
+        
+        def search_products(e):
+            found_products.clear()
+            text = search_field.value.strip() if search_field.value else ""
+            products = self.get_products_page(filters={'query': text}, limit=20) if text else []
+            for product in products:
+                found_products[str(product[0])] = product
+            product_field.options = [
+                ft.dropdown.Option(key=str(product[0]), text=f"{product[1]} (ост. {product[5]})")
+                for product in products
+            ]
+            product_field.value = None
+            self.page.update()
+        
+        def select_product(e):
+            product = found_products.get(product_field.value)
+            if product:
+                price_field.value = str(product[4])
+                self.page.update()
+        
+        def add_line(e):
+            product = found_products.get(product_field.value)
+            if not product:
+                self.show_snack_bar("Выберите товар")
+                return
+            try:
+                quantity = int(quantity_field.value)
+                price = float(price_field.value)
+            except (TypeError, ValueError):
+                self.show_snack_bar("Некорректные числовые значения")
+                return
+            if quantity <= 0 or price < 0:
+                self.show_snack_bar("Количество должно быть больше нуля, цена - не меньше нуля")
+                return
+            lines.append({'product_id': product[0], 'name': product[1], 'quantity': quantity, 'price': price})
+            refresh_lines()
+        
+        def add_bulk_lines(e):
+            # Формат строки: ID товара;количество;цена
+            parsed = []
+            for number, raw in enumerate((bulk_field.value or "").splitlines(), start=1):
+                if not raw.strip():
+                    continue
+                parts = [part.strip() for part in raw.replace(",", ".").split(";")]
+                try:
+                    product_id, quantity, price = int(parts[0]), int(parts[1]), float(parts[2])
+                except (IndexError, ValueError):
+                    self.show_snack_bar(f"Строка {number}: ожидается 'ID;количество;цена'")
+                    return
+                if quantity <= 0 or price < 0:
+                    self.show_snack_bar(f"Строка {number}: некорректное количество или цена")
+                    return
+                parsed.append((product_id, quantity, price))
+            if not parsed:
+                return
+            
+            names = self.get_product_names({product_id for product_id, _, _ in parsed})
+            for product_id, quantity, price in parsed:
+                lines.append({
+                    'product_id': product_id,
+                    'name': names.get(product_id, "Не найден"),
+                    'quantity': quantity,
+                    'price': price
+                })
+            bulk_field.value = ""
+            refresh_lines()
+        
+        search_field = ft.TextField(label="Поиск товара", prefix_icon=ft.Icons.SEARCH, on_change=search_products)
+        product_field = ft.Dropdown(label="Товар", options=[], on_change=select_product, expand=True)
+        quantity_field = ft.TextField(label="Кол-во", width=100, value="1")
+        price_field = ft.TextField(label="Цена", width=120)
+        bulk_field = ft.TextField(
+            label="Позиции списком",
+            hint_text="ID;количество;цена - по одной позиции на строку",
+            multiline=True,
+            min_lines=3,
+            max_lines=6
+        )
+        
+        content = ft.Column([
+            ft.Text("Позиции накладной", size=16, weight=ft.FontWeight.BOLD),
+            search_field,
+            ft.Row([
+                product_field,
+                quantity_field,
+                price_field,
+                ft.IconButton(ft.Icons.ADD, tooltip="Добавить позицию", on_click=add_line),
+            ]),
+            bulk_field,
+            ft.TextButton("Добавить из списка", icon=ft.Icons.PLAYLIST_ADD, on_click=add_bulk_lines),
+            lines_table,
+            total_text,
+        ])
+        return content, lines
+    
+    def get_product_names(self, product_ids):
+        """Получить названия товаров по набору id"""
+        product_ids = list(product_ids)
+        if not product_ids:
+            return {}
+        try:
+            conn = self.db.connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id, name FROM products WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps(product_ids),)
+            )
+            return dict(cursor.fetchall())
+        except Exception as e:
+            print(f"Ошибка получения товаров: {e}")
+            return {}
+    
+    @staticmethod
+    def invoice_items(lines):
+        """Позиции редактора в виде (product_id, quantity, price) для проведения"""
+        return [(line['product_id'], line['quantity'], line['price']) for line in lines]
     
     def create_income_invoice(self, e):
-        """Создать приходную накладную - РАБОЧАЯ ВЕРСИЯ"""
+        """Создать приходную накладную с позициями"""
         def save_invoice(e):
             try:
                 invoice_number = invoice_number_field.value
-                supplier_id = supplier_field.value
+                supplier_id = supplier_field.value or None
                 invoice_date = date_field.value
                 
                 if not invoice_number or not invoice_date:
                     self.show_snack_bar("Заполните обязательные поля")
                     return
+                try:
+                    date.fromisoformat(invoice_date)
+                except ValueError:
+                    self.show_snack_bar("Дата должна быть в формате ГГГГ-ММ-ДД")
+                    return
+                if not lines:
+                    self.show_snack_bar("Добавьте хотя бы одну позицию")
+                    return
                 
-                conn = sqlite3.connect('computer_store.db')
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO income_invoices (invoice_number, supplier_id, invoice_date, total_amount)
-                    VALUES (?, ?, ?, ?)
-                ''', (invoice_number, supplier_id, invoice_date, 0))
-                conn.commit()
-                conn.close()
+                self.db.post_income_invoice(invoice_number, supplier_id, invoice_date, self.invoice_items(lines))
                 
                 self.page.close(dialog)
                 self.show_income()
-                self.show_snack_bar("Приходная накладная создана")
+                self.show_snack_bar(f"Приходная накладная проведена, позиций: {len(lines)}")
             except Exception as ex:
-                self.show_snack_bar(f"Ошибка создания накладной: {ex}")
+                self.show_snack_bar(f"Ошибка проведения накладной: {ex}")
         
-        # Получаем список поставщиков
-        suppliers = self.get_suppliers()
+        # Поставщики для выпадающего списка берутся из кэша справочников
         supplier_options = [ft.dropdown.Option(key="", text="Не выбран")]
-        for supplier in suppliers:
-            supplier_options.append(ft.dropdown.Option(key=str(supplier[0]), text=supplier[1]))
+        try:
+            for supplier_id, supplier_name in self.db.reference.suppliers():
+                supplier_options.append(ft.dropdown.Option(key=str(supplier_id), text=supplier_name))
+        except Exception as ex:
+            print(f"Ошибка получения поставщиков: {ex}")
         
         invoice_number_field = ft.TextField(label="Номер накладной*", width=400)
         supplier_field = ft.Dropdown(label="Поставщик", width=400, options=supplier_options)
@@ -1065,6 +1639,7 @@ class ComputerStoreApp:
             value=date.today().isoformat(),
             hint_text="ГГГГ-ММ-ДД"
         )
+        lines_editor, lines = self.create_invoice_lines_editor()
         
         dialog = ft.AlertDialog(
             title=ft.Text("Создать приходную накладную"),
@@ -1073,23 +1648,29 @@ class ComputerStoreApp:
                     invoice_number_field,
                     supplier_field,
                     date_field,
-                ]),
-                width=400
+                    ft.Divider(),
+                    lines_editor,
+                ], scroll=ft.ScrollMode.ADAPTIVE),
+                width=700,
+                height=600
             ),
             actions=[
                 ft.TextButton("Отмена", on_click=lambda e: self.page.close(dialog)),
-                ft.TextButton("Сохранить", on_click=save_invoice),
+                ft.TextButton("Провести", on_click=save_invoice),
             ]
         )
         self.page.open(dialog)
     
     def show_outcome(self):
         """Показать раздел расхода с функциональными кнопками"""
-        self.main_content.controls.clear()
-        self.main_content.controls.append(ft.Text("Учет расхода товаров", size=28, weight=ft.FontWeight.BOLD))
-        self.main_content.controls.append(ft.Divider())
+        self.open_section('outcome', self.build_outcome_view)
+    
+    def build_outcome_view(self, view):
+        """Построить раздел расхода"""
+        view.controls.append(ft.Text("Учет расхода товаров", size=28, weight=ft.FontWeight.BOLD))
+        view.controls.append(ft.Divider())
         
-        self.main_content.controls.append(
+        view.controls.append(
             ft.Container(
                 content=ft.Column([
                     ft.Text("Функционал учета расхода", size=20),
@@ -1103,10 +1684,9 @@ class ComputerStoreApp:
                 border_radius=10
             )
         )
-        self.page.update()
     
     def create_outcome_invoice(self, e):
-        """Создать расходную накладную - РАБОЧАЯ ВЕРСИЯ"""
+        """Создать расходную накладную с позициями"""
         def save_invoice(e):
             try:
                 invoice_number = invoice_number_field.value
@@ -1116,21 +1696,22 @@ class ComputerStoreApp:
                 if not invoice_number or not invoice_date:
                     self.show_snack_bar("Заполните обязательные поля")
                     return
+                try:
+                    date.fromisoformat(invoice_date)
+                except ValueError:
+                    self.show_snack_bar("Дата должна быть в формате ГГГГ-ММ-ДД")
+                    return
+                if not lines:
+                    self.show_snack_bar("Добавьте хотя бы одну позицию")
+                    return
                 
-                conn = sqlite3.connect('computer_store.db')
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO outcome_invoices (invoice_number, customer_name, invoice_date, total_amount)
-                    VALUES (?, ?, ?, ?)
-                ''', (invoice_number, customer_name, invoice_date, 0))
-                conn.commit()
-                conn.close()
+                self.db.post_outcome_invoice(invoice_number, customer_name, invoice_date, self.invoice_items(lines))
                 
                 self.page.close(dialog)
                 self.show_outcome()
-                self.show_snack_bar("Расходная накладная создана")
+                self.show_snack_bar(f"Расходная накладная проведена, позиций: {len(lines)}")
             except Exception as ex:
-                self.show_snack_bar(f"Ошибка создания накладной: {ex}")
+                self.show_snack_bar(f"Ошибка проведения накладной: {ex}")
         
         invoice_number_field = ft.TextField(label="Номер накладной*", width=400)
         customer_field = ft.TextField(label="Имя клиента", width=400)
@@ -1140,6 +1721,7 @@ class ComputerStoreApp:
             value=date.today().isoformat(),
             hint_text="ГГГГ-ММ-ДД"
         )
+        lines_editor, lines = self.create_invoice_lines_editor()
         
         dialog = ft.AlertDialog(
             title=ft.Text("Создать расходную накладную"),
@@ -1148,21 +1730,56 @@ class ComputerStoreApp:
                     invoice_number_field,
                     customer_field,
                     date_field,
-                ]),
-                width=400
+                    ft.Divider(),
+                    lines_editor,
+                ], scroll=ft.ScrollMode.ADAPTIVE),
+                width=700,
+                height=600
             ),
             actions=[
                 ft.TextButton("Отмена", on_click=lambda e: self.page.close(dialog)),
-                ft.TextButton("Сохранить", on_click=save_invoice),
+                ft.TextButton("Провести", on_click=save_invoice),
             ]
         )
         self.page.open(dialog)
     
     def show_reports(self):
         """Показать раздел отчетов с красивыми визуальными отчетами"""
-        self.main_content.controls.clear()
-        self.main_content.controls.append(ft.Text("Отчетность", size=28, weight=ft.FontWeight.BOLD))
-        self.main_content.controls.append(ft.Divider())
+        self.open_section('reports', self.build_reports_view, self.update_report_cache_status)
+    
+    def build_reports_view(self, view):
+        """Построить раздел отчетов; введенные параметры сохраняются между посещениями"""
+        view.controls.append(ft.Text("Отчетность", size=28, weight=ft.FontWeight.BOLD))
+        view.controls.append(ft.Divider())
+        
+        self.stock_report_date_field = ft.TextField(
+            label="Остатки на дату",
+            hint_text="ГГГГ-ММ-ДД, пусто - текущие",
+            width=250
+        )
+        self.turnover_start_field = ft.TextField(
+            label="Обороты с",
+            hint_text="ГГГГ-ММ-ДД",
+            value=date.today().replace(day=1).isoformat(),
+            width=160
+        )
+        self.turnover_end_field = ft.TextField(
+            label="по",
+            hint_text="ГГГГ-ММ-ДД, пусто - сегодня",
+            width=160
+        )
+        self.turnover_period_field = ft.Dropdown(
+            label="Детализация",
+            width=180,
+            options=[ft.dropdown.Option(key, title) for key, (title, _) in REPORT_PERIODS.items()],
+            value='month'
+        )
+        self.turnover_group_field = ft.Dropdown(
+            label="Группировка",
+            width=200,
+            options=[ft.dropdown.Option(key, group[0]) for key, group in TURNOVER_GROUPS.items()],
+            value='total'
+        )
         
         report_buttons = ft.ResponsiveRow([
             ft.ElevatedButton(
@@ -1195,420 +1812,663 @@ class ComputerStoreApp:
             ),
         ])
         
-        self.main_content.controls.append(report_buttons)
-        self.page.update()
+        self.report_cache_status = ft.Text("", size=12, style=ft.TextStyle(italic=True))
+        self.update_report_cache_status()
+        
+        view.controls.append(ft.Row([
+            self.stock_report_date_field,
+            self.turnover_start_field,
+            self.turnover_end_field,
+            self.turnover_period_field,
+            self.turnover_group_field,
+        ], wrap=True))
+        view.controls.append(report_buttons)
+        view.controls.append(self.report_cache_status)
+    
+    def update_report_cache_status(self):
+        """Показать счетчики попаданий и промахов кэша отчетов"""
+        if self.report_cache_status is not None:
+            self.report_cache_status.value = (
+                f"Кэш отчетов: попаданий {self.report_cache.hits}, промахов {self.report_cache.misses}"
+            )
     
     def generate_stock_report(self, e):
         """Генерация отчета по остаткам с красивым оформлением"""
-        try:
-            conn = sqlite3.connect('computer_store.db')
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT p.name, c.name as category, p.quantity, p.min_quantity, p.price,
-                       CASE WHEN p.quantity <= p.min_quantity AND p.min_quantity > 0 THEN 1 ELSE 0 END as low_stock
-                FROM products p
-                LEFT JOIN categories c ON p.category_id = c.id
-                ORDER BY low_stock DESC, p.quantity ASC
-            ''')
-            products = cursor.fetchall()
-            conn.close()
-            
-            # Создаем визуальный отчет
-            report_content = ft.Column(scroll=ft.ScrollMode.ADAPTIVE)
-            
-            # Заголовок
+        as_of = (self.stock_report_date_field.value or "").strip()
+        if as_of:
+            try:
+                date.fromisoformat(as_of)
+            except ValueError:
+                self.show_snack_bar("Дата должна быть в формате ГГГГ-ММ-ДД")
+                return
+        self.run_report(
+            "Отчет по остаткам",
+            lambda: self.build_stock_report(as_of),
+            export=('stock', {'as_of': as_of or None})
+        )
+    
+    def build_stock_report(self, as_of):
+        """Содержимое отчета по остаткам (выполняется в фоновом потоке)"""
+        # Итоги считаются по всем товарам, а в таблицу попадают только первые REPORT_TABLE_MAX_ROWS строк
+        products = []
+        total_products = 0
+        low_stock_count = 0
+        total_value = 0
+        for product in iter_cursor_rows(self.db.stock_report_cursor(as_of or None)):
+            total_products += 1
+            low_stock_count += product[5] == 1
+            total_value += product[4] * product[2]
+            if len(products) < self.REPORT_TABLE_MAX_ROWS:
+                products.append(product)
+        
+        # Создаем визуальный отчет
+        report_content = ft.Column(scroll=ft.ScrollMode.ADAPTIVE)
+        
+        # Заголовок
+        report_content.controls.append(
+            ft.Container(
+                content=ft.Column([
+                    ft.Text("ОТЧЕТ ПО ОСТАТКАМ ТОВАРОВ", size=20, weight=ft.FontWeight.BOLD),
+                    ft.Text(f"Остатки на: {as_of or 'текущий момент'}", size=14),
+                    ft.Text(f"Дата формирования: {date.today()}", size=14),
+                    ft.Divider()
+                ]),
+                padding=10
+            )
+        )
+        
+        # Статистика
+        stats_row = ft.ResponsiveRow([
+            ft.Container(
+                content=ft.Column([
+                    ft.Text(str(total_products), size=24, weight=ft.FontWeight.BOLD, color=ft.Colors.BLUE_400),
+                    ft.Text("Всего товаров", size=12)
+                ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                padding=10,
+                bgcolor=ft.Colors.BLACK,
+                border_radius=10,
+                col=4
+            ),
+            ft.Container(
+                content=ft.Column([
+                    ft.Text(str(low_stock_count), size=24, weight=ft.FontWeight.BOLD, color=ft.Colors.ORANGE_400),
+                    ft.Text("Низкий запас", size=12)
+                ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                padding=10,
+                bgcolor=ft.Colors.BLACK,
+                border_radius=10,
+                col=4
+            ),
+            ft.Container(
+                content=ft.Column([
+                    ft.Text(f"{total_value:.2f} руб.", size=18, weight=ft.FontWeight.BOLD, color=ft.Colors.GREEN_400),
+                    ft.Text("Общая стоимость", size=12)
+                ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                padding=10,
+                bgcolor=ft.Colors.BLACK,
+                border_radius=10,
+                col=4
+            ),
+        ])
+        
+        report_content.controls.append(ft.Container(content=stats_row, padding=10))
+        
+        # Таблица товаров
+        data_table = ft.DataTable(
+            columns=[
+                ft.DataColumn(ft.Text("Товар")),
+                ft.DataColumn(ft.Text("Категория")),
+                ft.DataColumn(ft.Text("Остаток")),
+                ft.DataColumn(ft.Text("Мин. запас")),
+                ft.DataColumn(ft.Text("Цена")),
+                ft.DataColumn(ft.Text("Статус")),
+            ],
+            rows=[]
+        )
+        
+        for product in products:
+            status_color = ft.Colors.RED if product[5] == 1 else ft.Colors.GREEN
+            status_text = "Низкий запас!" if product[5] == 1 else "В норме"
+            
+            data_table.rows.append(
+                ft.DataRow(
+                    cells=[
+                        ft.DataCell(ft.Text(product[0])),
+                        ft.DataCell(ft.Text(product[1])),
+                        ft.DataCell(ft.Text(str(product[2]))),
+                        ft.DataCell(ft.Text(str(product[3]))),
+                        ft.DataCell(ft.Text(f"{product[4]:.2f} руб.")),
+                        ft.DataCell(ft.Text(status_text, color=status_color, weight=ft.FontWeight.BOLD)),
+                    ]
+                )
+            )
+        
+        report_content.controls.append(ft.Container(content=data_table, padding=10))
+        if total_products > self.REPORT_TABLE_MAX_ROWS:
             report_content.controls.append(
-                ft.Container(
-                    content=ft.Column([
-                        ft.Text("ОТЧЕТ ПО ОСТАТКАМ ТОВАРОВ", size=20, weight=ft.FontWeight.BOLD),
-                        ft.Text(f"Дата формирования: {date.today()}", size=14),
-                        ft.Divider()
-                    ]),
-                    padding=10
+                ft.Text(
+                    f"Показаны первые {self.REPORT_TABLE_MAX_ROWS} строк из {total_products}; полный отчет - в экспорте",
+                    style=ft.TextStyle(italic=True)
                 )
             )
-            
-            # Статистика
-            total_products = len(products)
-            low_stock_count = sum(1 for p in products if p[5] == 1)
-            total_value = sum(p[4] * p[2] for p in products)
-            
-            stats_row = ft.ResponsiveRow([
-                ft.Container(
-                    content=ft.Column([
-                        ft.Text(str(total_products), size=24, weight=ft.FontWeight.BOLD, color=ft.Colors.BLUE_400),
-                        ft.Text("Всего товаров", size=12)
-                    ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-                    padding=10,
-                    bgcolor=ft.Colors.BLACK,
-                    border_radius=10,
-                    col=4
-                ),
-                ft.Container(
-                    content=ft.Column([
-                        ft.Text(str(low_stock_count), size=24, weight=ft.FontWeight.BOLD, color=ft.Colors.ORANGE_400),
-                        ft.Text("Низкий запас", size=12)
-                    ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-                    padding=10,
-                    bgcolor=ft.Colors.BLACK,
-                    border_radius=10,
-                    col=4
-                ),
-                ft.Container(
-                    content=ft.Column([
-                        ft.Text(f"{total_value:.2f} руб.", size=18, weight=ft.FontWeight.BOLD, color=ft.Colors.GREEN_400),
-                        ft.Text("Общая стоимость", size=12)
-                    ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-                    padding=10,
-                    bgcolor=ft.Colors.BLACK,
-                    border_radius=10,
-                    col=4
-                ),
-            ])
-            
-            report_content.controls.append(ft.Container(content=stats_row, padding=10))
-            
-            # Таблица товаров
-            data_table = ft.DataTable(
-                columns=[
-                    ft.DataColumn(ft.Text("Товар")),
-                    ft.DataColumn(ft.Text("Категория")),
-                    ft.DataColumn(ft.Text("Остаток")),
-                    ft.DataColumn(ft.Text("Мин. запас")),
-                    ft.DataColumn(ft.Text("Цена")),
-                    ft.DataColumn(ft.Text("Статус")),
-                ],
-                rows=[]
+        
+        return report_content
+    
+    def generate_sales_report(self, e):
+        """Аналитика продаж за всю историю; разделы появляются по мере готовности"""
+        self.run_sections_report("Отчет по продажам", self.build_sales_sections, export=('sales', {}))
+    
+    def build_sales_sections(self):
+        """Разделы отчета по продажам (выполняется в фоновом потоке, по одному запросу на раздел)"""
+        invoices, revenue, average, units = self.db.sales_summary()
+        yield ft.Container(
+            content=ft.Column([
+                ft.Text("ОТЧЕТ ПО ПРОДАЖАМ", size=20, weight=ft.FontWeight.BOLD),
+                ft.Text("Период: вся история", size=14),
+                ft.Text(f"Дата формирования: {date.today()}", size=14),
+                ft.Divider()
+            ]),
+            padding=10
+        )
+        
+        def stat_card(value, label, color):
+            return ft.Container(
+                content=ft.Column([
+                    ft.Text(value, size=20, weight=ft.FontWeight.BOLD, color=color),
+                    ft.Text(label, size=12)
+                ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                padding=10,
+                bgcolor=ft.Colors.BLACK,
+                border_radius=10,
+                col=3
             )
-            
-            for product in products:
-                status_color = ft.Colors.RED if product[5] == 1 else ft.Colors.GREEN
-                status_text = "Низкий запас!" if product[5] == 1 else "В норме"
-                
+        
+        yield ft.Container(
+            content=ft.ResponsiveRow([
+                stat_card(str(invoices), "Всего накладных", ft.Colors.BLUE_400),
+                stat_card(f"{revenue:.2f} руб.", "Выручка", ft.Colors.GREEN_400),
+                stat_card(f"{average:.2f} руб.", "Средний чек", ft.Colors.ORANGE_400),
+                stat_card(str(units), "Продано единиц", ft.Colors.PURPLE_400),
+            ]),
+            padding=10
+        )
+        if not invoices:
+            yield ft.Container(
+                content=ft.Text("Нет данных о продажах", style=ft.TextStyle(italic=True)),
+                padding=20,
+                alignment=ft.alignment.center
+            )
+            return
+        
+        def section(title, columns, rows):
+            return ft.Container(
+                content=ft.Column([
+                    ft.Text(title, size=16, weight=ft.FontWeight.BOLD),
+                    ft.DataTable(
+                        columns=[ft.DataColumn(ft.Text(column)) for column in columns],
+                        rows=[ft.DataRow(cells=[ft.DataCell(ft.Text(value)) for value in row]) for row in rows]
+                    ),
+                ]),
+                padding=10
+            )
+        
+        yield section(
+            "Выручка по месяцам",
+            ["Месяц", "Накладных", "Выручка", "Средний чек"],
+            [
+                (period, str(count), f"{total:.2f} руб.", f"{avg:.2f} руб.")
+                for period, count, total, avg in self.db.sales_by_period_cursor('month')
+            ]
+        )
+        yield section(
+            "Лучшие товары",
+            ["Товар", "Продано", "Выручка"],
+            [(name, str(quantity), f"{total:.2f} руб.") for name, quantity, total in self.db.top_products_cursor()]
+        )
+        yield section(
+            "Категории",
+            ["Категория", "Продано", "Выручка"],
+            [(name, str(quantity), f"{total:.2f} руб.") for name, quantity, total in self.db.top_categories_cursor()]
+        )
+        yield self.build_sales_invoices_section()
+    
+    def build_sales_invoices_section(self):
+        """Список накладных с постраничной подгрузкой по (дата, номер)"""
+        data_table = ft.DataTable(
+            columns=[
+                ft.DataColumn(ft.Text("Накладная")),
+                ft.DataColumn(ft.Text("Дата")),
+                ft.DataColumn(ft.Text("Клиент")),
+                ft.DataColumn(ft.Text("Сумма")),
+            ],
+            rows=[]
+        )
+        more_button = ft.TextButton("Показать еще", icon=ft.Icons.EXPAND_MORE)
+        
+        def load_page():
+            before = data_table.rows[-1].data if data_table.rows else None
+            sales = self.db.sales_report_cursor(before=before, limit=self.SALES_PAGE_SIZE).fetchall()
+            for sale in sales:
                 data_table.rows.append(
                     ft.DataRow(
                         cells=[
-                            ft.DataCell(ft.Text(product[0])),
-                            ft.DataCell(ft.Text(product[1])),
-                            ft.DataCell(ft.Text(str(product[2]))),
-                            ft.DataCell(ft.Text(str(product[3]))),
-                            ft.DataCell(ft.Text(f"{product[4]:.2f} руб.")),
-                            ft.DataCell(ft.Text(status_text, color=status_color, weight=ft.FontWeight.BOLD)),
-                        ]
+                            ft.DataCell(ft.Text(sale[0])),
+                            ft.DataCell(ft.Text(sale[1])),
+                            ft.DataCell(ft.Text(sale[2] or "Не указан")),
+                            ft.DataCell(ft.Text(f"{sale[3] or 0:.2f} руб.", color=ft.Colors.GREEN_400)),
+                        ],
+                        data=(sale[1], sale[0])
                     )
                 )
-            
-            report_content.controls.append(ft.Container(content=data_table, padding=10))
-            
-            self.show_report_dialog("Отчет по остаткам", report_content)
-            
-        except Exception as ex:
-            self.show_snack_bar(f"Ошибка генерации отчета: {ex}")
+            more_button.visible = len(sales) == self.SALES_PAGE_SIZE
+        
+        more_button.on_click = lambda e: self.run_in_background(load_page, lambda _: self.page.update())
+        load_page()
+        return ft.Container(
+            content=ft.Column([
+                ft.Text("Накладные", size=16, weight=ft.FontWeight.BOLD),
+                data_table,
+                more_button,
+            ]),
+            padding=10
+        )
     
-    def generate_sales_report(self, e):
-        """Генерация отчета по продажам с красивым оформлением"""
+    def generate_turnover_report(self, e):
+        """Генерация оборотной ведомости с красивым оформлением"""
+        start = (self.turnover_start_field.value or "").strip()
+        end = (self.turnover_end_field.value or "").strip() or date.today().isoformat()
         try:
-            conn = sqlite3.connect('computer_store.db')
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT oi.invoice_number, oi.invoice_date, oi.customer_name, oi.total_amount
-                FROM outcome_invoices oi
-                ORDER BY oi.invoice_date DESC
-                LIMIT 20
-            ''')
-            sales = cursor.fetchall()
-            conn.close()
-            
-            report_content = ft.Column(scroll=ft.ScrollMode.ADAPTIVE)
-            
-            # Заголовок
-            report_content.controls.append(
-                ft.Container(
-                    content=ft.Column([
-                        ft.Text("ОТЧЕТ ПО ПРОДАЖАМ", size=20, weight=ft.FontWeight.BOLD),
-                        ft.Text(f"Дата формирования: {date.today()}", size=14),
-                        ft.Divider()
-                    ]),
-                    padding=10
-                )
+            if date.fromisoformat(start) > date.fromisoformat(end):
+                self.show_snack_bar("Начало периода позже его конца")
+                return
+        except ValueError:
+            self.show_snack_bar("Дата должна быть в формате ГГГГ-ММ-ДД")
+            return
+        params = {
+            'start': start,
+            'end': end,
+            'period': self.turnover_period_field.value or 'month',
+            'group_by': self.turnover_group_field.value or 'total',
+        }
+        self.run_report(
+            "Оборотная ведомость",
+            lambda: self.build_turnover_report(**params),
+            export=('turnover', params)
+        )
+    
+    def build_turnover_report(self, start, end, period, group_by):
+        """Содержимое оборотной ведомости (выполняется в фоновом потоке)"""
+        rows = self.db.turnover_report_cursor(start, end, period, group_by).fetchall()
+        
+        report_content = ft.Column(scroll=ft.ScrollMode.ADAPTIVE)
+        
+        # Заголовок
+        report_content.controls.append(
+            ft.Container(
+                content=ft.Column([
+                    ft.Text("ОБОРОТНАЯ ВЕДОМОСТЬ", size=20, weight=ft.FontWeight.BOLD),
+                    ft.Text(f"Период: {start} - {end}", size=14),
+                    ft.Text(f"{REPORT_PERIODS[period][0]}, {TURNOVER_GROUPS[group_by][0].lower()}", size=14),
+                    ft.Text(f"Дата формирования: {date.today()}", size=14),
+                    ft.Divider()
+                ]),
+                padding=10
             )
-            
-            # Статистика
-            total_sales = sum(sale[3] or 0 for sale in sales)
-            total_invoices = len(sales)
-            
-            stats_row = ft.ResponsiveRow([
-                ft.Container(
-                    content=ft.Column([
-                        ft.Text(str(total_invoices), size=24, weight=ft.FontWeight.BOLD, color=ft.Colors.BLUE_400),
-                        ft.Text("Всего накладных", size=12)
-                    ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-                    padding=10,
-                    bgcolor=ft.Colors.BLACK,
-                    border_radius=10,
-                    col=6
-                ),
-                ft.Container(
-                    content=ft.Column([
-                        ft.Text(f"{total_sales:.2f} руб.", size=24, weight=ft.FontWeight.BOLD, color=ft.Colors.GREEN_400),
-                        ft.Text("Общая сумма", size=12)
-                    ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-                    padding=10,
-                    bgcolor=ft.Colors.BLACK,
-                    border_radius=10,
-                    col=6
-                ),
-            ])
-            
-            report_content.controls.append(ft.Container(content=stats_row, padding=10))
-            
-            # Таблица продаж
-            if sales:
-                data_table = ft.DataTable(
-                    columns=[
-                        ft.DataColumn(ft.Text("Накладная")),
-                        ft.DataColumn(ft.Text("Дата")),
-                        ft.DataColumn(ft.Text("Клиент")),
-                        ft.DataColumn(ft.Text("Сумма")),
-                    ],
-                    rows=[]
-                )
-                
-                for sale in sales:
-                    data_table.rows.append(
-                        ft.DataRow(
-                            cells=[
-                                ft.DataCell(ft.Text(sale[0])),
-                                ft.DataCell(ft.Text(sale[1])),
-                                ft.DataCell(ft.Text(sale[2] or "Не указан")),
-                                ft.DataCell(ft.Text(f"{sale[3] or 0:.2f} руб.", color=ft.Colors.GREEN_400)),
-                            ]
-                        )
+        )
+        
+        # Статистика
+        income_total = sum(row[4] for row in rows)
+        outcome_total = sum(row[6] for row in rows)
+        turnover = income_total + outcome_total
+        
+        stats_grid = ft.ResponsiveRow([
+            # Приход
+            ft.Container(
+                content=ft.Column([
+                    ft.Icon(ft.Icons.INPUT, size=40, color=ft.Colors.GREEN_400),
+                    ft.Text(str(sum(row[3] for row in rows)), size=24, weight=ft.FontWeight.BOLD),
+                    ft.Text("Поступило, шт.", size=12),
+                    ft.Text(f"{income_total:.2f} руб.", size=16, color=ft.Colors.GREEN_400)
+                ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                padding=15,
+                bgcolor=ft.Colors.BLACK,
+                border_radius=10,
+                col=6
+            ),
+            # Расход
+            ft.Container(
+                content=ft.Column([
+                    ft.Icon(ft.Icons.OUTPUT, size=40, color=ft.Colors.RED_400),
+                    ft.Text(str(sum(row[5] for row in rows)), size=24, weight=ft.FontWeight.BOLD),
+                    ft.Text("Отгружено, шт.", size=12),
+                    ft.Text(f"{outcome_total:.2f} руб.", size=16, color=ft.Colors.RED_400)
+                ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                padding=15,
+                bgcolor=ft.Colors.BLACK,
+                border_radius=10,
+                col=6
+            ),
+            # Оборот
+            ft.Container(
+                content=ft.Column([
+                    ft.Icon(ft.Icons.AUTORENEW, size=40, color=ft.Colors.BLUE_400),
+                    ft.Text(f"{turnover:.2f} руб.", size=20, weight=ft.FontWeight.BOLD),
+                    ft.Text("Общий оборот", size=12)
+                ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                padding=15,
+                bgcolor=ft.Colors.BLACK,
+                border_radius=10,
+                col=12
+            ),
+        ])
+        
+        report_content.controls.append(ft.Container(content=stats_grid, padding=10))
+        
+        if rows:
+            data_table = ft.DataTable(
+                columns=[ft.DataColumn(ft.Text(title)) for title in REPORTS['turnover']['columns']],
+                rows=[]
+            )
+            for row in rows[:self.REPORT_TABLE_MAX_ROWS]:
+                data_table.rows.append(
+                    ft.DataRow(
+                        cells=[
+                            ft.DataCell(ft.Text(row[0])),
+                            ft.DataCell(ft.Text(row[1])),
+                            ft.DataCell(ft.Text(str(row[2]))),
+                            ft.DataCell(ft.Text(str(row[3]))),
+                            ft.DataCell(ft.Text(f"{row[4]:.2f} руб.", color=ft.Colors.GREEN_400)),
+                            ft.DataCell(ft.Text(str(row[5]))),
+                            ft.DataCell(ft.Text(f"{row[6]:.2f} руб.", color=ft.Colors.RED_400)),
+                            ft.DataCell(ft.Text(str(row[7]))),
+                            ft.DataCell(ft.Text(str(row[8]), weight=ft.FontWeight.BOLD)),
+                        ]
                     )
-                
-                report_content.controls.append(ft.Container(content=data_table, padding=10))
-            else:
+                )
+            report_content.controls.append(ft.Container(content=data_table, padding=10))
+            if len(rows) > self.REPORT_TABLE_MAX_ROWS:
                 report_content.controls.append(
-                    ft.Container(
-                        content=ft.Text("Нет данных о продажах", style=ft.TextStyle(italic=True)),
-                        padding=20,
-                        alignment=ft.alignment.center
+                    ft.Text(
+                        f"Показаны первые {self.REPORT_TABLE_MAX_ROWS} строк из {len(rows)}; полная ведомость - в экспорте",
+                        style=ft.TextStyle(italic=True)
                     )
                 )
-            
-            self.show_report_dialog("Отчет по продажам", report_content)
-            
-        except Exception as ex:
-            self.show_snack_bar(f"Ошибка генерации отчета: {ex}")
-    
-    def generate_turnover_report(self, e):
-        """Генерация оборотной ведомости с красивым оформлением"""
-        try:
-            month_start = date.today().replace(day=1)
-            
-            conn = sqlite3.connect('computer_store.db')
-            cursor = conn.cursor()
-            
-            # Приход за месяц
-            cursor.execute('''
-                SELECT COUNT(*), COALESCE(SUM(total_amount), 0)
-                FROM income_invoices 
-                WHERE invoice_date >= ?
-            ''', (month_start.isoformat(),))
-            income_data = cursor.fetchone()
-            
-            # Расход за месяц
-            cursor.execute('''
-                SELECT COUNT(*), COALESCE(SUM(total_amount), 0)
-                FROM outcome_invoices 
-                WHERE invoice_date >= ?
-            ''', (month_start.isoformat(),))
-            outcome_data = cursor.fetchone()
-            
-            conn.close()
-            
-            report_content = ft.Column(scroll=ft.ScrollMode.ADAPTIVE)
-            
-            # Заголовок
+        else:
             report_content.controls.append(
                 ft.Container(
-                    content=ft.Column([
-                        ft.Text("ОБОРОТНАЯ ВЕДОМОСТЬ", size=20, weight=ft.FontWeight.BOLD),
-                        ft.Text(f"Период: {month_start.strftime('%B %Y')}", size=14),
-                        ft.Text(f"Дата формирования: {date.today()}", size=14),
-                        ft.Divider()
-                    ]),
-                    padding=10
+                    content=ft.Text("Нет движения товаров за период", style=ft.TextStyle(italic=True)),
+                    padding=20,
+                    alignment=ft.alignment.center
                 )
             )
-            
-            # Статистика
-            income_count, income_total = income_data
-            outcome_count, outcome_total = outcome_data
-            turnover = income_total + outcome_total
-            
-            stats_grid = ft.ResponsiveRow([
-                # Приход
-                ft.Container(
-                    content=ft.Column([
-                        ft.Icon(ft.Icons.INPUT, size=40, color=ft.Colors.GREEN_400),
-                        ft.Text(str(income_count), size=24, weight=ft.FontWeight.BOLD),
-                        ft.Text("Приходных накладных", size=12),
-                        ft.Text(f"{income_total:.2f} руб.", size=16, color=ft.Colors.GREEN_400)
-                    ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-                    padding=15,
-                    bgcolor=ft.Colors.BLACK,
-                    border_radius=10,
-                    col=6
-                ),
-                # Расход
-                ft.Container(
-                    content=ft.Column([
-                        ft.Icon(ft.Icons.OUTPUT, size=40, color=ft.Colors.RED_400),
-                        ft.Text(str(outcome_count), size=24, weight=ft.FontWeight.BOLD),
-                        ft.Text("Расходных накладных", size=12),
-                        ft.Text(f"{outcome_total:.2f} руб.", size=16, color=ft.Colors.RED_400)
-                    ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-                    padding=15,
-                    bgcolor=ft.Colors.BLACK,
-                    border_radius=10,
-                    col=6
-                ),
-                # Оборот
-                ft.Container(
-                    content=ft.Column([
-                        ft.Icon(ft.Icons.AUTORENEW, size=40, color=ft.Colors.BLUE_400),
-                        ft.Text(f"{turnover:.2f} руб.", size=20, weight=ft.FontWeight.BOLD),
-                        ft.Text("Общий оборот", size=12)
-                    ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-                    padding=15,
-                    bgcolor=ft.Colors.BLACK,
-                    border_radius=10,
-                    col=12
-                ),
-            ])
-            
-            report_content.controls.append(ft.Container(content=stats_grid, padding=10))
-            
-            self.show_report_dialog("Оборотная ведомость", report_content)
-            
-        except Exception as ex:
-            self.show_snack_bar(f"Ошибка генерации отчета: {ex}")
+        
+        return report_content
     
     def generate_suppliers_report(self, e):
         """Генерация отчета по поставщикам с красивым оформлением"""
-        try:
-            conn = sqlite3.connect('computer_store.db')
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT s.name, s.contact_person, s.phone, 
-                       COUNT(ii.id) as invoice_count,
-                       COALESCE(SUM(ii.total_amount), 0) as total_amount
-                FROM suppliers s
-                LEFT JOIN income_invoices ii ON s.id = ii.supplier_id
-                GROUP BY s.id
-                ORDER BY total_amount DESC
-            ''')
-            suppliers = cursor.fetchall()
-            conn.close()
+        self.run_report("Отчет по поставщикам", self.build_suppliers_report, export=('suppliers', {}))
+    
+    def build_suppliers_report(self):
+        """Содержимое отчета по поставщикам (выполняется в фоновом потоке)"""
+        # Итоги считаются по всем поставщикам, а в таблицу попадают только первые REPORT_TABLE_MAX_ROWS строк
+        suppliers = []
+        total_suppliers = 0
+        total_invoices = 0
+        total_amount = 0
+        for supplier in iter_cursor_rows(self.db.suppliers_report_cursor(with_id=True)):
+            total_suppliers += 1
+            total_invoices += supplier[4]
+            total_amount += supplier[5]
+            if len(suppliers) < self.REPORT_TABLE_MAX_ROWS:
+                suppliers.append(supplier)
+        
+        # Последние SUPPLIER_TREND_MONTHS месяцев, от старых к новым
+        months = []
+        month = date.today().replace(day=1)
+        for _ in range(self.SUPPLIER_TREND_MONTHS):
+            months.append(month.strftime("%Y-%m"))
+            month = (month - datetime.timedelta(days=1)).replace(day=1)
+        months.reverse()
+        trends = self.db.supplier_trends(months[0])
+        
+        report_content = ft.Column(scroll=ft.ScrollMode.ADAPTIVE)
+        
+        # Заголовок
+        report_content.controls.append(
+            ft.Container(
+                content=ft.Column([
+                    ft.Text("ОТЧЕТ ПО ПОСТАВЩИКАМ", size=20, weight=ft.FontWeight.BOLD),
+                    ft.Text(f"Дата формирования: {date.today()}", size=14),
+                    ft.Divider()
+                ]),
+                padding=10
+            )
+        )
+        
+        # Статистика
+        stats_row = ft.ResponsiveRow([
+            ft.Container(
+                content=ft.Column([
+                    ft.Text(str(total_suppliers), size=24, weight=ft.FontWeight.BOLD, color=ft.Colors.BLUE_400),
+                    ft.Text("Всего поставщиков", size=12)
+                ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                padding=10,
+                bgcolor=ft.Colors.BLACK,
+                border_radius=10,
+                col=4
+            ),
+            ft.Container(
+                content=ft.Column([
+                    ft.Text(str(total_invoices), size=24, weight=ft.FontWeight.BOLD, color=ft.Colors.GREEN_400),
+                    ft.Text("Всего накладных", size=12)
+                ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                padding=10,
+                bgcolor=ft.Colors.BLACK,
+                border_radius=10,
+                col=4
+            ),
+            ft.Container(
+                content=ft.Column([
+                    ft.Text(f"{total_amount:.2f} руб.", size=20, weight=ft.FontWeight.BOLD, color=ft.Colors.ORANGE_400),
+                    ft.Text("Общая сумма", size=12)
+                ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                padding=10,
+                bgcolor=ft.Colors.BLACK,
+                border_radius=10,
+                col=4
+            ),
+        ])
+        
+        report_content.controls.append(ft.Container(content=stats_row, padding=10))
+        
+        # Таблица поставщиков
+        if suppliers:
+            data_table = ft.DataTable(
+                columns=[
+                    ft.DataColumn(ft.Text("Поставщик")),
+                    ft.DataColumn(ft.Text("Контакт")),
+                    ft.DataColumn(ft.Text("Телефон")),
+                    ft.DataColumn(ft.Text("Накладных")),
+                    ft.DataColumn(ft.Text("Сумма")),
+                    ft.DataColumn(ft.Text("Последняя поставка")),
+                    ft.DataColumn(ft.Text("Товаров")),
+                    ft.DataColumn(ft.Text(f"Поставки за {self.SUPPLIER_TREND_MONTHS} мес.")),
+                ],
+                rows=[]
+            )
             
-            report_content = ft.Column(scroll=ft.ScrollMode.ADAPTIVE)
+            for supplier in suppliers:
+                data_table.rows.append(
+                    ft.DataRow(
+                        cells=[
+                            ft.DataCell(ft.Text(supplier[1], weight=ft.FontWeight.BOLD)),
+                            ft.DataCell(ft.Text(supplier[2] or "-")),
+                            ft.DataCell(ft.Text(supplier[3] or "-")),
+                            ft.DataCell(ft.Text(str(supplier[4]))),
+                            ft.DataCell(ft.Text(f"{supplier[5]:.2f} руб.", color=ft.Colors.GREEN_400)),
+                            ft.DataCell(ft.Text(supplier[6] or "-")),
+                            ft.DataCell(ft.Text(str(supplier[7]))),
+                            ft.DataCell(self.build_trend_chart(months, trends.get(supplier[0], {}))),
+                        ]
+                    )
+                )
             
-            # Заголовок
+            report_content.controls.append(ft.Container(content=data_table, padding=10))
+            if total_suppliers > self.REPORT_TABLE_MAX_ROWS:
+                report_content.controls.append(
+                    ft.Text(
+                        f"Показаны первые {self.REPORT_TABLE_MAX_ROWS} строк из {total_suppliers}; полный отчет - в экспорте",
+                        style=ft.TextStyle(italic=True)
+                    )
+                )
+        else:
             report_content.controls.append(
                 ft.Container(
-                    content=ft.Column([
-                        ft.Text("ОТЧЕТ ПО ПОСТАВЩИКАМ", size=20, weight=ft.FontWeight.BOLD),
-                        ft.Text(f"Дата формирования: {date.today()}", size=14),
-                        ft.Divider()
-                    ]),
-                    padding=10
+                    content=ft.Text("Нет данных о поставщиках", style=ft.TextStyle(italic=True)),
+                    padding=20,
+                    alignment=ft.alignment.center
                 )
             )
-            
-            # Статистика
-            total_suppliers = len(suppliers)
-            total_invoices = sum(s[3] for s in suppliers)
-            total_amount = sum(s[4] for s in suppliers)
-            
-            stats_row = ft.ResponsiveRow([
-                ft.Container(
-                    content=ft.Column([
-                        ft.Text(str(total_suppliers), size=24, weight=ft.FontWeight.BOLD, color=ft.Colors.BLUE_400),
-                        ft.Text("Всего поставщиков", size=12)
-                    ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-                    padding=10,
-                    bgcolor=ft.Colors.BLACK,
-                    border_radius=10,
-                    col=4
-                ),
-                ft.Container(
-                    content=ft.Column([
-                        ft.Text(str(total_invoices), size=24, weight=ft.FontWeight.BOLD, color=ft.Colors.GREEN_400),
-                        ft.Text("Всего накладных", size=12)
-                    ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-                    padding=10,
-                    bgcolor=ft.Colors.BLACK,
-                    border_radius=10,
-                    col=4
-                ),
+        
+        return report_content
+    
+    def build_trend_chart(self, months, amounts):
+        """Мини-диаграмма сумм по месяцам: столбик на месяц, подробности во всплывающей подсказке"""
+        peak = max(amounts.values(), default=0) or 1
+        return ft.Row(
+            [
                 ft.Container(
-                    content=ft.Column([
-                        ft.Text(f"{total_amount:.2f} руб.", size=20, weight=ft.FontWeight.BOLD, color=ft.Colors.ORANGE_400),
-                        ft.Text("Общая сумма", size=12)
-                    ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-                    padding=10,
-                    bgcolor=ft.Colors.BLACK,
-                    border_radius=10,
-                    col=4
-                ),
-            ])
-            
-            report_content.controls.append(ft.Container(content=stats_row, padding=10))
-            
-            # Таблица поставщиков
-            if suppliers:
-                data_table = ft.DataTable(
-                    columns=[
-                        ft.DataColumn(ft.Text("Поставщик")),
-                        ft.DataColumn(ft.Text("Контакт")),
-                        ft.DataColumn(ft.Text("Телефон")),
-                        ft.DataColumn(ft.Text("Накладных")),
-                        ft.DataColumn(ft.Text("Сумма")),
-                    ],
-                    rows=[]
-                )
-                
-                for supplier in suppliers:
-                    data_table.rows.append(
-                        ft.DataRow(
-                            cells=[
-                                ft.DataCell(ft.Text(supplier[0], weight=ft.FontWeight.BOLD)),
-                                ft.DataCell(ft.Text(supplier[1] or "-")),
-                                ft.DataCell(ft.Text(supplier[2] or "-")),
-                                ft.DataCell(ft.Text(str(supplier[3]))),
-                                ft.DataCell(ft.Text(f"{supplier[4]:.2f} руб.", color=ft.Colors.GREEN_400)),
-                            ]
-                        )
-                    )
-                
-                report_content.controls.append(ft.Container(content=data_table, padding=10))
-            else:
-                report_content.controls.append(
-                    ft.Container(
-                        content=ft.Text("Нет данных о поставщиках", style=ft.TextStyle(italic=True)),
-                        padding=20,
-                        alignment=ft.alignment.center
-                    )
+                    width=8,
+                    height=max(2, 24 * amounts.get(month, 0) / peak),
+                    bgcolor=ft.Colors.BLUE_400 if amounts.get(month) else ft.Colors.GREY_700,
+                    tooltip=f"{month}: {amounts.get(month, 0):.2f} руб."
                 )
+                for month in months
+            ],
+            spacing=2,
+            vertical_alignment=ft.CrossAxisAlignment.END
+        )
+    
+    def run_in_background(self, work, on_done, on_error=None):
+        """Выполнить work() в пуле потоков и передать результат в on_done, ошибку - в on_error"""
+        task = BackgroundTask()
+        
+        def run():
+            if task.cancelled:
+                return None
+            # Соединение потока запоминается, чтобы cancel() мог прервать его запрос
+            task.connection = self.db.connection()
+            try:
+                return work()
+            finally:
+                task.connection = None
+        
+        def finished(future):
+            if task.cancelled:
+                return
+            try:
+                result = future.result()
+            except Exception as ex:
+                if on_error:
+                    on_error(ex)
+                else:
+                    self.show_snack_bar(f"Ошибка: {ex}")
+                return
+            try:
+                on_done(result)
+            except Exception as ex:
+                self.show_snack_bar(f"Ошибка: {ex}")
+        
+        task.future = self.executor.submit(run)
+        task.future.add_done_callback(finished)
+        return task
+    
+    def run_report(self, title, build, export=None):
+        """Сформировать отчет в фоне: индикатор с кнопкой отмены, затем диалог с результатом"""
+        def work():
+            if export is None:
+                return build()
+            report_name, params = export
+            # Версия читается до построения: если данные изменятся во время запроса, запись просто устареет.
+            # Дата входит в ключ, потому что в отчетах печатается дата формирования
+            version = (self.db.data_version(), date.today().isoformat())
+            return self.report_cache.get_or_build(report_name, params, version, build)
+        
+        def done(content):
+            self.page.close(progress_dialog)
+            self.update_report_cache_status()
+            self.show_report_dialog(title, content, export=export)
+        
+        def failed(ex):
+            self.page.close(progress_dialog)
+            self.show_snack_bar(f"Ошибка генерации отчета: {ex}")
+        
+        def cancel(e):
+            task.cancel()
+            self.page.close(progress_dialog)
+            self.show_snack_bar("Формирование отчета отменено")
+        
+        progress_dialog = ft.AlertDialog(
+            title=ft.Text(title),
+            content=ft.Row([ft.ProgressRing(width=24, height=24), ft.Text("Формирование отчета...")], tight=True),
+            actions=[ft.TextButton("Отмена", on_click=cancel)],
+            modal=True
+        )
+        self.page.open(progress_dialog)
+        task = self.run_in_background(work, done, failed)
+    
+    def run_sections_report(self, title, build_sections, export):
+        """Отчет из разделов: диалог открывается сразу, разделы добавляются по мере готовности"""
+        report_name, params = export
+        loading = ft.Row([ft.ProgressRing(width=20, height=20), ft.Text("Формирование отчета...")])
+        dialog = self.show_report_dialog(title, ft.Column([loading]), export=export)
+        holder = dialog.content
+        dismissed = threading.Event()
+        
+        def work():
+            version = (self.db.data_version(), date.today().isoformat())
+            cached = self.report_cache.get(report_name, params, version)
+            self.update_report_cache_status()
+            if cached is not None:
+                holder.content = cached
+                self.page.update()
+                return
             
-            self.show_report_dialog("Отчет по поставщикам", report_content)
-            
-        except Exception as ex:
+            report_content = ft.Column([loading], scroll=ft.ScrollMode.ADAPTIVE)
+            holder.content = report_content
+            for section in build_sections():
+                if dismissed.is_set():
+                    return
+                report_content.controls.insert(len(report_content.controls) - 1, section)
+                self.page.update()
+            report_content.controls.remove(loading)
+            self.page.update()
+            self.report_cache.put(report_name, params, version, report_content)
+        
+        def failed(ex):
+            self.page.close(dialog)
             self.show_snack_bar(f"Ошибка генерации отчета: {ex}")
+        
+        def dismiss(e):
+            dismissed.set()
+            task.cancel()
+        
+        # Закрытие диалога до окончания прерывает текущий запрос
+        dialog.on_dismiss = dismiss
+        task = self.run_in_background(work, lambda _: None, failed)
     
-    def show_report_dialog(self, title, content):
-        """Показать диалог с красивым отчетом"""
+    def show_report_dialog(self, title, content, export=None):
+        """Показать диалог с красивым отчетом; export = (имя отчета, параметры) добавляет выгрузку"""
+        actions = []
+        if export:
+            report_name, params = export
+            actions.extend([
+                ft.TextButton("Экспорт CSV", icon=ft.Icons.DOWNLOAD,
+                              on_click=lambda e: self.export_report(report_name, 'csv', params)),
+                ft.TextButton("Экспорт JSON", icon=ft.Icons.DATA_OBJECT,
+                              on_click=lambda e: self.export_report(report_name, 'json', params)),
+            ])
+        actions.append(ft.TextButton("Закрыть", on_click=lambda e: self.page.close(dialog)))
         dialog = ft.AlertDialog(
             title=ft.Text(title, size=18, weight=ft.FontWeight.BOLD),
             content=ft.Container(
@@ -1616,28 +2476,67 @@ class ComputerStoreApp:
                 width=700,
                 height=500
             ),
-            actions=[
-                ft.TextButton("Закрыть", on_click=lambda e: self.page.close(dialog)),
-            ]
+            actions=actions
         )
         self.page.open(dialog)
+        return dialog
+    
+    def export_report(self, report_name, fmt, params):
+        """Выгрузить отчет в файл в пуле потоков данных"""
+        def run_export(path):
+            try:
+                count = self.db.export_report(report_name, path, fmt, **params)
+                self.show_snack_bar(f"Отчет выгружен: {Path(path).name} (строк: {count})")
+            except Exception as ex:
+                self.show_snack_bar(f"Ошибка экспорта отчета: {ex}")
+        
+        def path_selected(e):
+            if not e.path:
+                return
+            path = e.path if e.path.lower().endswith(f".{fmt}") else f"{e.path}.{fmt}"
+            # Пул потоков данных: его потоки переиспользуют свои соединения с базой
+            self.executor.submit(run_export, path)
+        
+        self.get_file_picker(path_selected).save_file(
+            dialog_title="Сохранить отчет",
+            file_name=f"{report_name}_{date.today().isoformat()}.{fmt}",
+            allowed_extensions=[fmt]
+        )
     
     def show_backup(self):
         """Показать раздел резервного копирования с рабочими кнопками"""
-        self.main_content.controls.clear()
-        self.main_content.controls.append(ft.Text("Резервное копирование", size=28, weight=ft.FontWeight.BOLD))
-        self.main_content.controls.append(ft.Divider())
+        self.open_section('backup', self.build_backup_view)
+    
+    def build_backup_view(self, view):
+        """Построить раздел резервного копирования"""
+        view.controls.append(ft.Text("Резервное копирование", size=28, weight=ft.FontWeight.BOLD))
+        view.controls.append(ft.Divider())
+        
+        self.backup_button = ft.ElevatedButton(
+            "Создать резервную копию",
+            icon=ft.Icons.BACKUP,
+            on_click=self.create_backup,
+            col=6,
+            style=ft.ButtonStyle(padding=15)
+        )
+        self.backup_progress = ft.ProgressBar(value=0, visible=False)
+        self.backup_status = ft.Text("", size=12)
+        self.rebuild_button = ft.ElevatedButton(
+            "Пересчитать счетчики",
+            icon=ft.Icons.CALCULATE,
+            on_click=self.rebuild_stats,
+            col=6,
+            style=ft.ButtonStyle(padding=15)
+        )
+        self.rebuild_progress = ft.Row(
+            [ft.ProgressRing(width=20, height=20), ft.Text("Пересчет счетчиков и сводок...", size=12)],
+            visible=False
+        )
         
         backup_controls = ft.Column([
             ft.Text("Управление резервными копиями базы данных", size=16),
             ft.ResponsiveRow([
-                ft.ElevatedButton(
-                    "Создать резервную копию",
-                    icon=ft.Icons.BACKUP,
-                    on_click=self.create_backup,
-                    col=6,
-                    style=ft.ButtonStyle(padding=15)
-                ),
+                self.backup_button,
                 ft.ElevatedButton(
                     "Восстановить из копии",
                     icon=ft.Icons.RESTORE,
@@ -1645,55 +2544,160 @@ class ComputerStoreApp:
                     col=6,
                     style=ft.ButtonStyle(padding=15)
                 ),
-            ])
+            ]),
+            self.backup_progress,
+            self.backup_status,
+            ft.Container(
+                content=ft.Text("Обслуживание базы данных", size=16),
+                margin=ft.margin.only(top=20)
+            ),
+            ft.ResponsiveRow([self.rebuild_button]),
+            self.rebuild_progress,
         ])
         
-        self.main_content.controls.append(backup_controls)
+        view.controls.append(backup_controls)
+    
+    def rebuild_stats(self, e):
+        """Пересчитать счетчики главной страницы и сводки по поставщикам в фоне - пересчет идет по всей базе"""
+        def finish():
+            self.rebuild_button.disabled = False
+            self.rebuild_progress.visible = False
+        
+        def done(result):
+            finish()
+            self.show_snack_bar("Счетчики и сводки по поставщикам пересчитаны")
+        
+        def failed(ex):
+            finish()
+            self.show_snack_bar(f"Ошибка пересчета счетчиков: {ex}")
+        
+        self.rebuild_button.disabled = True
+        self.rebuild_progress.visible = True
         self.page.update()
+        self.run_in_background(self.db.rebuild_stats, done, failed)
     
     def create_backup(self, e):
-        """Создать резервную копию - РАБОЧАЯ ВЕРСИЯ"""
+        """Создать инкрементную резервную копию в фоновом потоке, не останавливая работу с базой"""
+        def on_progress(stage, done, total):
+            self.backup_progress.value = done / total if total else 1
+            if stage == 'snapshot':
+                self.backup_status.value = f"Скопировано страниц: {done} из {total}"
+            else:
+                self.backup_status.value = f"Обработано блоков: {done} из {total}"
+            self.page.update()
+        
+        def run_backup():
+            try:
+                manifest = self.backups.create(progress=on_progress)
+                message = (
+                    f"Резервная копия создана: {manifest['id']} "
+                    f"(новых данных: {manifest['stored_bytes'] // 1024} КиБ"
+                    + (f", удалено старых копий: {manifest['pruned']})" if manifest['pruned'] else ")")
+                )
+                self.backup_status.value = message
+                self.show_snack_bar(message)
+            except Exception as ex:
+                self.backup_status.value = ""
+                self.show_snack_bar(f"Ошибка создания резервной копии: {ex}")
+            finally:
+                self.backup_progress.visible = False
+                self.backup_button.disabled = False
+                self.page.update()
+        
         try:
-            backup_dir = Path("backups")
-            backup_dir.mkdir(exist_ok=True)
-            
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = backup_dir / f"computer_store_backup_{timestamp}.db"
-            
-            shutil.copy2("computer_store.db", backup_file)
-            
-            self.show_snack_bar(f"Резервная копия создана: {backup_file.name}")
+            self.backup_button.disabled = True
+            self.backup_progress.value = 0
+            self.backup_progress.visible = True
+            self.backup_status.value = "Создание резервной копии..."
+            self.page.update()
+            self.executor.submit(run_backup)
             
         except Exception as ex:
             self.show_snack_bar(f"Ошибка создания резервной копии: {ex}")
     
     def restore_backup(self, e):
-        """Восстановить из резервной копии - РАБОЧАЯ ВЕРСИЯ"""
+        """Восстановить из резервной копии в фоновом потоке с проверкой файла"""
+        stage_titles = {
+            'check': "Проверка целостности копии...",
+            'stage': "Подготовка копии",
+            'swap': "Загрузка в рабочую базу",
+        }
+        
+        def on_progress(stage, copied, total):
+            progress_bar.value = copied / total if total else None
+            progress_text.value = stage_titles[stage] + (f": {copied} из {total} страниц" if total else "")
+            self.page.update()
+        
+        def run_restore(restore):
+            try:
+                restore(progress=on_progress)
+            except Exception as ex:
+                self.page.close(progress_dialog)
+                self.show_snack_bar(f"Ошибка восстановления: {ex}")
+                return
+            self.page.close(progress_dialog)
+            # Журнал изменений восстановленной базы не продолжает текущий - остальные разделы строятся заново
+            self.discard_other_sections()
+            self.show_snack_bar("База данных восстановлена из резервной копии")
+        
+        def start_restore(restore):
+            self.page.close(dialog)
+            self.page.open(progress_dialog)
+            self.executor.submit(run_restore, restore)
+        
+        def restore_point_selected(e):
+            if not point_field.value:
+                self.show_snack_bar("Выберите точку восстановления")
+                return
+            start_restore(lambda progress: self.backups.restore(point_field.value, progress=progress))
+        
         def restore_selected(e):
-            if file_picker.result is not None and file_picker.result.files is not None:
-                selected_file = file_picker.result.files[0].path
-                try:
-                    shutil.copy2(selected_file, "computer_store.db")
-                    self.page.close(dialog)
-                    self.show_snack_bar("База данных восстановлена из резервной копии")
-                except Exception as ex:
-                    self.show_snack_bar(f"Ошибка восстановления: {ex}")
+            if e.files:
+                selected_file = e.files[0].path
+                start_restore(lambda progress: self.db.restore_from(selected_file, progress=progress))
+        
+        try:
+            restore_points = self.backups.list_backups()
+        except Exception as ex:
+            restore_points = []
+            self.show_snack_bar(f"Ошибка чтения списка резервных копий: {ex}")
+        point_field = ft.Dropdown(
+            label="Точка восстановления",
+            width=400,
+            options=[
+                ft.dropdown.Option(
+                    m['id'],
+                    f"{m['created'].replace('T', ' ')} ({m['size'] // 1024} КиБ)"
+                )
+                for m in restore_points
+            ],
+            value=restore_points[0]['id'] if restore_points else None
+        )
         
-        file_picker = ft.FilePicker(on_result=restore_selected)
-        self.page.overlay.append(file_picker)
+        progress_bar = ft.ProgressBar(width=400)
+        progress_text = ft.Text(stage_titles['check'])
+        progress_dialog = ft.AlertDialog(
+            title=ft.Text("Восстановление из резервной копии"),
+            content=ft.Column([progress_bar, progress_text], tight=True),
+            modal=True
+        )
         
         dialog = ft.AlertDialog(
             title=ft.Text("Восстановление из резервной копии"),
-            content=ft.Text("Выберите файл резервной копии для восстановления:"),
+            content=ft.Column([
+                ft.Text("Выберите точку восстановления или файл резервной копии (.db):"),
+                point_field,
+            ], tight=True),
             actions=[
                 ft.TextButton("Отмена", on_click=lambda e: self.page.close(dialog)),
-                ft.ElevatedButton(
+                ft.TextButton(
                     "Выбрать файл",
-                    on_click=lambda _: file_picker.pick_files(
+                    on_click=lambda _: self.get_file_picker(restore_selected).pick_files(
                         allowed_extensions=["db"],
                         dialog_title="Выберите файл резервной копии"
                     )
                 ),
+                ft.ElevatedButton("Восстановить", on_click=restore_point_selected),
             ]
         )
         self.page.open(dialog)